@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # simplejwt and dj-rest-auth build their tokens from this module
+        # level backend, so replacing it gives every token the key ids
+        from rest_framework_simplejwt import state
+        from .tokens import build_token_backend
+        state.token_backend = build_token_backend()
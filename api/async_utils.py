@@ -0,0 +1,210 @@
+import asyncio
+from functools import wraps
+from typing import Any, Awaitable, Callable, Tuple
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import close_old_connections
+from django.http import Http404, HttpRequest, HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .utils import (
+    cache_rendered_response, get_cached_response, get_or_compute,
+    get_response_cache_key
+)
+
+
+def _run_isolated(func: Callable[[], Any]) -> Any:
+    """Run a blocking ORM call on the current worker thread's connection."""
+    close_old_connections()
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+async def gather_queries(*funcs: Callable[[], Any]) -> list:
+    """
+    Run independent blocking ORM calls concurrently.
+    Each call gets its own worker thread and database connection, so the
+    queries overlap instead of queueing behind each other.
+    """
+    return await asyncio.gather(*(
+        sync_to_async(_run_isolated, thread_sensitive=False)(func)
+        for func in funcs
+    ))
+
+
+async def aget_or_compute(
+        get_key: Callable[[], str], compute: Callable[[], Awaitable[Any]],
+        ttl: int, stale_ttl: int = 0) -> Any:
+    """
+    Async version of get_or_compute. The cache lookups and locking run
+    on a worker thread, and on a miss the computation runs back on the
+    event loop, so it can still gather its queries.
+    Args:
+        get_key: Blocking function returning the cache key
+        compute: Coroutine function returning a cacheable value
+        ttl: Seconds the value is fresh
+        stale_ttl: Seconds an expired value may still be served
+    """
+    def lookup():
+        return get_or_compute(
+            get_key(), async_to_sync(compute), ttl, stale_ttl)
+
+    return await sync_to_async(lookup)()
+
+
+def render(request: HttpRequest, data: Any, status: int = 200) -> HttpResponse:
+    """
+    Render data with the configured DRF renderer the request's Accept
+    header asks for, or the first one
+    """
+    renderers = [
+        renderer() for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+        # The browsable API needs a view to render
+        if renderer.format != 'api'
+    ]
+    try:
+        renderer, _ = api_settings.DEFAULT_CONTENT_NEGOTIATION_CLASS(
+        ).select_renderer(Request(request), renderers)
+    except exceptions.NotAcceptable:
+        renderer = renderers[0]
+    response = HttpResponse(
+        renderer.render(data),
+        content_type=renderer.media_type,
+        status=status,
+    )
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def _get_view(fallback: Callable, request: HttpRequest, args, kwargs):
+    """Set up the viewset behind a view as its dispatch would."""
+    view = fallback.cls(**fallback.initkwargs)
+    view.action_map = fallback.actions
+    view.args, view.kwargs = args, kwargs
+    view.request = view.initialize_request(request, *args, **kwargs)
+    view.headers = view.default_response_headers
+    return view
+
+
+def async_read_view(fallback: Callable) -> Callable:
+    """
+    Serve GET requests with the decorated coroutine and every other method
+    with the synchronous DRF view it shadows. GET requests first pass the
+    shadowed view's authentication, permission and throttle checks, and
+    the coroutine gets the DRF request.
+    Args:
+        fallback: View to dispatch non-GET requests to
+    """
+    def decorator(func: Callable) -> Callable:
+        @csrf_exempt
+        @wraps(func)
+        async def view(request, *args, **kwargs):
+            if request.method != 'GET':
+                return await sync_to_async(fallback)(
+                    request, *args, **kwargs)
+
+            viewset = _get_view(fallback, request, args, kwargs)
+            try:
+                await sync_to_async(viewset.initial)(
+                    viewset.request, *args, **kwargs)
+                data = await func(viewset.request, *args, **kwargs)
+            except (exceptions.APIException, Http404) as exc:
+                error = viewset.handle_exception(exc)
+                response = render(request, error.data, error.status_code)
+                # WWW-Authenticate and Retry-After
+                for header, value in error.items():
+                    if header != 'Content-Type':
+                        response[header] = value
+                return response
+
+            if isinstance(data, HttpResponse):
+                return data
+            return render(request, data)
+        return view
+    return decorator
+
+
+def acache_response(timeout: int = 300, key_prefix: str = '',
+                    tags: Callable = None, depends_on: Callable = None):
+    """
+    cache_response for async_read_view coroutines. Entries are shared
+    with the synchronous view using the same arguments.
+    Args:
+        timeout: Cache timeout in seconds
+        key_prefix: Prefix for cache key
+        tags: Function of the view's arguments returning the tags that
+            expire the response
+        depends_on: Function of the response data returning further tags
+            that expire it
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(request, *args, **kwargs):
+            # render never uses the browsable API
+            if request.accepted_renderer.format == 'api':
+                return await func(request, *args, **kwargs)
+
+            def lookup():
+                cache_key, encoding = get_response_cache_key(
+                    request, key_prefix,
+                    tags(request, *args, **kwargs)
+                    if tags is not None else ())
+                return cache_key, encoding, get_cached_response(
+                    cache_key, encoding)
+
+            cache_key, encoding, response = await sync_to_async(lookup)()
+            if response is not None:
+                return response
+
+            data = await func(request, *args, **kwargs)
+            response = render(request._request, data)
+            return await sync_to_async(cache_rendered_response)(
+                cache_key, response, encoding, timeout,
+                depends_on(data) if depends_on is not None else ())
+        return wrapper
+    return decorator
+
+
+async def apaginate(request: HttpRequest, queryset) -> Tuple[list, dict]:
+    """
+    Fetch one page of a queryset, issuing the count and the page query
+    concurrently.
+    Returns:
+        The page items and the PageNumberPagination envelope without results
+    """
+    page_size = api_settings.PAGE_SIZE
+    try:
+        page = int(request.GET.get('page', 1))
+        if page < 1:
+            raise ValueError
+    except ValueError:
+        raise Http404('Invalid page.')
+
+    offset = (page - 1) * page_size
+    count, items = await gather_queries(
+        queryset.count,
+        lambda: list(queryset[offset:offset + page_size]),
+    )
+    if page > 1 and not items:
+        raise Http404('Invalid page.')
+
+    url = request.build_absolute_uri()
+    next_url = None
+    if offset + page_size < count:
+        next_url = replace_query_param(url, 'page', page + 1)
+    previous_url = None
+    if page == 2:
+        previous_url = remove_query_param(url, 'page')
+    elif page > 2:
+        previous_url = replace_query_param(url, 'page', page - 1)
+
+    return items, {
+        'count': count,
+        'next': next_url,
+        'previous': previous_url,
+    }
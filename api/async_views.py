@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.shortcuts import aget_object_or_404
+from workouts.models import Workout
+from .async_utils import aget_or_compute, async_read_view, gather_queries
+from .models import UserProfile
+from .stats import (
+    build_workout_stats, get_profile_stats_key, get_week_start,
+    get_workout_days_by_type, get_workout_totals, with_follow_counts,
+    with_follow_stats
+)
+from .views import UserProfileViewSet
+
+
+@async_read_view(UserProfileViewSet.as_view({'get': 'stats'}))
+async def profile_stats(request, pk):
+    """
+    Async version of UserProfileViewSet.stats.
+    On a cache miss the totals and the per type and day counts are
+    fetched concurrently.
+    """
+    profile = await aget_object_or_404(
+        with_follow_counts(UserProfile.objects.all()), pk=pk)
+
+    week_start = get_week_start()
+    workouts = Workout.objects.filter(owner_id=profile.user_id)
+
+    async def compute():
+        totals, days_by_type = await gather_queries(
+            lambda: get_workout_totals(workouts, week_start),
+            lambda: get_workout_days_by_type(workouts),
+        )
+        return build_workout_stats(totals, days_by_type)
+
+    stats = await aget_or_compute(
+        lambda: get_profile_stats_key(profile.user_id, week_start),
+        compute, settings.CACHE_TTL, settings.CACHE_STALE_TTL)
+    return with_follow_stats(stats, profile)
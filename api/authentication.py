@@ -0,0 +1,179 @@
+import hashlib
+from typing import List, Optional
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from .utils import LocalTTLCache
+
+# Users are cached as their concrete field values, so every request
+# builds its own instance and nothing mutable is shared between threads.
+# The password hash is never cached: sessions are checked against the
+# session auth hash cached instead, and anything else reading the
+# password loads it from the database.
+USER_FIELDS = [
+    field for field in User._meta.concrete_fields
+    if field.attname != 'password'
+]
+USER_FIELD_NAMES = [field.attname for field in USER_FIELDS]
+
+local_auth_cache = LocalTTLCache(
+    settings.AUTH_LOCAL_CACHE_SIZE, settings.AUTH_LOCAL_CACHE_TTL)
+
+
+def _token_key(key: str) -> str:
+    # Raw tokens never appear in cache keys
+    return f'auth:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def _user_key(user_id: int) -> str:
+    return f'auth:user:{user_id}'
+
+
+def _dump_user(user: User) -> List:
+    values = []
+    for field in USER_FIELDS:
+        value = field.value_from_object(user)
+        values.append(
+            value.isoformat() if hasattr(value, 'isoformat') else value)
+    values.append(user.get_session_auth_hash())
+    return values
+
+
+def _load_user(values: List) -> Optional[User]:
+    if len(values) != len(USER_FIELDS) + 1:
+        # Written with other fields, before a deploy
+        return None
+    *values, session_auth_hash = values
+    user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELD_NAMES, [
+        field.to_python(value) for field, value in zip(USER_FIELDS, values)
+    ])
+    # Lets SessionMiddleware verify the session without the password
+    user.get_session_auth_hash = lambda: session_auth_hash
+    return user
+
+
+def _remember_user(user: User) -> None:
+    values = _dump_user(user)
+    cache.set(_user_key(user.pk), values, settings.AUTH_CACHE_TTL)
+    local_auth_cache.set(_user_key(user.pk), values)
+
+
+def get_cached_user(user_id: int) -> Optional[User]:
+    """
+    Get a user from the in-process cache, then Redis, then the database
+    Args:
+        user_id: Primary key of the user
+    """
+    key = _user_key(user_id)
+    values = local_auth_cache.get(key)
+    if values is None:
+        values = cache.get(key)
+        user = _load_user(values) if values is not None else None
+        if user is None:
+            user = User.objects.filter(pk=user_id).first()
+            if user is not None:
+                _remember_user(user)
+            return user
+        local_auth_cache.set(key, values)
+        return user
+    return _load_user(values)
+
+
+def get_token_user(key: str) -> Optional[User]:
+    """
+    Get the user a token belongs to, without a query once cached
+    Args:
+        key: Token key from the Authorization header
+    """
+    cache_key = _token_key(key)
+    user_id = local_auth_cache.get(cache_key)
+    if user_id is None:
+        user_id = cache.get(cache_key)
+        if user_id is None:
+            token = Token.objects.select_related('user').filter(
+                key=key).first()
+            if token is None:
+                return None
+            cache.set(cache_key, token.user_id, settings.AUTH_CACHE_TTL)
+            local_auth_cache.set(cache_key, token.user_id)
+            _remember_user(token.user)
+            return token.user
+        local_auth_cache.set(cache_key, user_id)
+    return get_cached_user(user_id)
+
+
+def remember_users(users: List[User]) -> None:
+    """
+    Cache users and their tokens in one write, so their first requests
+    after a deploy or a cache flush authenticate without a query
+    Args:
+        users: Users to cache
+    """
+    tokens = Token.objects.filter(user__in=users).values_list('key', 'user')
+    cache.set_many({
+        **{_user_key(user.pk): _dump_user(user) for user in users},
+        **{_token_key(key): user_id for key, user_id in tokens},
+    }, settings.AUTH_CACHE_TTL)
+
+
+def _delete(key: str) -> None:
+    local_auth_cache.delete(key)
+    cache.delete(key)
+    # Again after commit, in case a concurrent request re-cached the
+    # row this transaction is changing
+    transaction.on_commit(lambda: (
+        local_auth_cache.delete(key), cache.delete(key)))
+
+
+def invalidate_token(key: str) -> None:
+    """
+    Forget a cached token
+    Args:
+        key: Token key that was deleted
+    """
+    _delete(_token_key(key))
+
+
+def invalidate_user(user_id: int) -> None:
+    """
+    Forget a cached user
+    Args:
+        user_id: Primary key of the changed user
+    """
+    _delete(_user_key(user_id))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that serves the token to user lookup from
+    cache instead of joining Token and User on every request.
+    Other workers keep a revoked token for at most
+    AUTH_LOCAL_CACHE_TTL seconds.
+    """
+
+    def authenticate_credentials(self, key):
+        user = get_token_user(key)
+        if user is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+
+        return (user, Token(key=key, user=user))
+
+
+class CachedModelBackend(ModelBackend):
+    """Model backend that loads session users through the user cache."""
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        if user is not None and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,285 @@
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from uuid import uuid4
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis.cache import RedisCache
+from .metrics import CACHE_TIER_LOOKUPS
+from .timing import TimedCacheMixin
+from .utils import LocalTTLCache
+
+logger = logging.getLogger(__name__)
+
+# Options of the local tier, removed before the rest reach the backend
+LOCAL_OPTIONS = ('LOCAL_PREFIXES', 'LOCAL_MAXSIZE', 'LOCAL_TTL')
+# Values that can be handed out without copying
+IMMUTABLE_TYPES = (int, float, str, bytes, bool, type(None))
+
+_MISSING = object()
+
+
+class LocalTier:
+    """
+    The in-process tier of one cache, shared by the backend instances
+    Django creates per thread. It is only read while subscribed to the
+    invalidation channel, so a lost connection cannot serve stale values
+    past the next write.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.cache = LocalTTLCache(maxsize, ttl)
+        # Lets a process skip its own broadcasts
+        self.sender = uuid4().hex
+        self.subscribed = False
+        self.listener = None
+        # Bumped by every invalidation, so a value read from the shared
+        # tier before one is not kept afterwards
+        self.generation = 0
+
+    def drop(self, keys) -> None:
+        """Drop keys, or everything when keys is None."""
+        self.generation += 1
+        if keys is None:
+            self.cache.clear()
+        else:
+            for key in keys:
+                self.cache.delete(key)
+
+    def apply(self, message) -> None:
+        """Drop the keys named in an invalidation broadcast."""
+        try:
+            message = json.loads(message)
+        except (TypeError, ValueError):
+            return
+        if message.get('sender') != self.sender:
+            self.drop(message.get('keys'))
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # The listener thread did not survive the fork, and the parent's
+    # entries were not being invalidated while the child was starting
+    _tiers.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class TwoTierCacheMixin:
+    """
+    Cache backend mixin keeping keys that start with one of the
+    LOCAL_PREFIXES in a bounded in-process LRU for LOCAL_TTL seconds,
+    in front of the shared cache. Writes to those keys are broadcast so
+    every other process drops its copy.
+    """
+
+    def __init__(self, server, params):
+        options = params.get('OPTIONS', {})
+        super().__init__(server, {**params, 'OPTIONS': {
+            name: value for name, value in options.items()
+            if name not in LOCAL_OPTIONS
+        }})
+        self.local_prefixes = tuple(options.get('LOCAL_PREFIXES', ()))
+        self.local_maxsize = options.get('LOCAL_MAXSIZE', 1024)
+        self.local_ttl = options.get('LOCAL_TTL', 5)
+        self.channel = f"{params.get('KEY_PREFIX', '')}:invalidate"
+        self._tier_key = (self.channel, str(server))
+
+    @property
+    def tier(self) -> LocalTier:
+        """This process' local tier, listening for invalidations."""
+        tier = _tiers.get(self._tier_key)
+        if tier is None:
+            with _tiers_lock:
+                tier = _tiers.get(self._tier_key)
+                if tier is None:
+                    tier = _tiers[self._tier_key] = LocalTier(
+                        self.local_maxsize, self.local_ttl)
+                    self._start_listener(tier)
+        return tier
+
+    def _is_local(self, key) -> bool:
+        return bool(self.local_prefixes) and key.startswith(
+            self.local_prefixes)
+
+    def _local_get(self, made_key):
+        tier = self.tier
+        if not tier.subscribed:
+            return _MISSING
+        entry = tier.cache.get(made_key)
+        CACHE_TIER_LOOKUPS.labels(
+            'local', 'miss' if entry is None else 'hit').inc()
+        if entry is None:
+            return _MISSING
+        value = entry[0]
+        # Callers may mutate what they get, as they would a fresh copy
+        return value if isinstance(value, IMMUTABLE_TYPES) \
+            else copy.deepcopy(value)
+
+    def _local_set(self, made_key, value, generation):
+        tier = self.tier
+        if tier.subscribed and tier.generation == generation:
+            tier.cache.set(made_key, (copy.deepcopy(value),))
+
+    def _invalidate(self, keys, version=None) -> None:
+        """Drop written keys here and in every other process."""
+        made_keys = [
+            self.make_key(key, version) for key in keys
+            if self._is_local(key)
+        ]
+        if not made_keys:
+            return
+        tier = self.tier
+        tier.drop(made_keys)
+        self._broadcast({'sender': tier.sender, 'keys': made_keys})
+
+    def get(self, key, default=None, version=None, **kwargs):
+        if not self._is_local(key):
+            return super().get(key, default, version, **kwargs)
+
+        made_key = self.make_key(key, version)
+        value = self._local_get(made_key)
+        if value is not _MISSING:
+            return value
+        generation = self.tier.generation
+        value = super().get(key, _MISSING, version, **kwargs)
+        CACHE_TIER_LOOKUPS.labels(
+            'shared', 'miss' if value is _MISSING else 'hit').inc()
+        if value is _MISSING:
+            return default
+        self._local_set(made_key, value, generation)
+        return value
+
+    def get_many(self, keys, version=None, **kwargs):
+        found, remote = {}, []
+        for key in keys:
+            if self._is_local(key):
+                value = self._local_get(self.make_key(key, version))
+                if value is not _MISSING:
+                    found[key] = value
+                    continue
+            remote.append(key)
+
+        if remote:
+            generation = self.tier.generation
+            values = super().get_many(remote, version, **kwargs)
+            for key in remote:
+                if self._is_local(key):
+                    CACHE_TIER_LOOKUPS.labels(
+                        'shared', 'hit' if key in values else 'miss').inc()
+                    if key in values:
+                        self._local_set(
+                            self.make_key(key, version), values[key],
+                            generation)
+            found.update(values)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None,
+            **kwargs):
+        try:
+            return super().set(key, value, timeout, version, **kwargs)
+        finally:
+            self._invalidate([key], version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None,
+            **kwargs):
+        added = super().add(key, value, timeout, version, **kwargs)
+        if added:
+            self._invalidate([key], version)
+        return added
+
+    def delete(self, key, version=None, **kwargs):
+        try:
+            return super().delete(key, version, **kwargs)
+        finally:
+            self._invalidate([key], version)
+
+    def incr(self, key, delta=1, version=None, **kwargs):
+        try:
+            return super().incr(key, delta, version, **kwargs)
+        finally:
+            self._invalidate([key], version)
+
+    def decr(self, key, delta=1, version=None, **kwargs):
+        try:
+            return super().decr(key, delta, version, **kwargs)
+        finally:
+            self._invalidate([key], version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None,
+                 **kwargs):
+        try:
+            return super().set_many(data, timeout, version, **kwargs)
+        finally:
+            self._invalidate(list(data), version)
+
+    def delete_many(self, keys, version=None, **kwargs):
+        keys = list(keys)
+        try:
+            return super().delete_many(keys, version, **kwargs)
+        finally:
+            self._invalidate(keys, version)
+
+    def clear(self):
+        try:
+            return super().clear()
+        finally:
+            tier = self.tier
+            tier.drop(None)
+            self._broadcast({'sender': tier.sender, 'keys': None})
+
+    def _broadcast(self, message) -> None:
+        raise NotImplementedError
+
+    def _start_listener(self, tier: LocalTier) -> None:
+        raise NotImplementedError
+
+
+class TwoTierRedisCache(TimedCacheMixin, TwoTierCacheMixin, RedisCache):
+    """
+    TimedRedisCache with an in-process tier for hot keys, such as cache
+    versions, invalidated over Redis pub/sub.
+    """
+
+    def _broadcast(self, message) -> None:
+        try:
+            self.client.get_client(write=True).publish(
+                self.channel, json.dumps(message))
+        except Exception:
+            # Other processes keep their copy until LOCAL_TTL expires it
+            logger.warning(
+                'Could not broadcast a cache invalidation', exc_info=True)
+
+    def _start_listener(self, tier: LocalTier) -> None:
+        tier.listener = threading.Thread(
+            target=self._listen, args=(tier,), daemon=True,
+            name='cache-invalidation')
+        tier.listener.start()
+
+    def _listen(self, tier: LocalTier) -> None:
+        backoff = 1
+        while True:
+            try:
+                pubsub = self.client.get_client(write=False).pubsub(
+                    ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Broadcasts sent while unsubscribed were missed
+                tier.drop(None)
+                tier.subscribed = True
+                backoff = 1
+                for message in pubsub.listen():
+                    tier.apply(message['data'])
+            except Exception:
+                logger.warning(
+                    'Cache invalidation listener disconnected',
+                    exc_info=True)
+            tier.subscribed = False
+            tier.drop(None)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
@@ -0,0 +1,74 @@
+import gzip
+from typing import Optional
+from django.http import HttpResponse
+from django.utils.cache import cc_delim_re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Supported encodings, in order of preference when the client accepts
+# several equally
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+# Levels for responses compressed on every request, and for cached ones
+# compressed once and then served many times
+LEVELS = {'br': (4, 9), 'gzip': (6, 9)}
+# API payloads only. HTML pages, such as the admin and the browsable
+# API, carry CSRF tokens that compression would expose to BREACH.
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/msgpack', 'application/vnd.oai.openapi',
+)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the response encoding from an Accept-Encoding header
+    Args:
+        accept_encoding: Header value, e.g. 'gzip, br;q=0.8'
+    Returns None when the response should not be compressed.
+    """
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                continue
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(data: bytes, encoding: str, cached: bool = False) -> bytes:
+    """
+    Compress a response body
+    Args:
+        data: Body to compress
+        encoding: One of ENCODINGS
+        cached: Compress harder, for bodies served many times
+    """
+    level = LEVELS[encoding][cached]
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    # A fixed mtime keeps the output identical for identical bodies
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def is_compressible(response: HttpResponse) -> bool:
+    """
+    Whether a response is an API payload that may be compressed, which
+    Cache-Control: no-transform forbids.
+    """
+    content_type = response.get('Content-Type', '').lower()
+    directives = cc_delim_re.split(response.get('Cache-Control', '').lower())
+    return (content_type.startswith(COMPRESSIBLE_TYPES)
+            and 'no-transform' not in directives)
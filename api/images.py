@@ -0,0 +1,116 @@
+import logging
+from functools import lru_cache
+from io import BytesIO
+from typing import Dict, List, Tuple
+from uuid import uuid4
+from cloudinary.utils import cloudinary_url
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Square edge lengths, in pixels, of the stored profile image variants
+PROFILE_IMAGE_SIZES = (720, 240, 64)
+DEFAULT_PROFILE_IMAGE_SIZE = 240
+DEFAULT_PROFILE_IMAGE = 'default_profile_ylwpgw'
+WEBP_QUALITY = 80
+# Largest upload accepted, in pixels, so decoding one stays cheap
+MAX_PROFILE_IMAGE_PIXELS = 4096 * 4096
+
+
+def is_oversized(image: Image.Image) -> bool:
+    """Whether an opened image has more pixels than are accepted"""
+    return image.width * image.height > MAX_PROFILE_IMAGE_PIXELS
+
+
+def build_variants(image_file) -> Dict[int, bytes]:
+    """
+    Decode an uploaded image once and re-encode it as square WebP variants
+    Args:
+        image_file: Uploaded image file
+    Returns:
+        WebP bytes keyed by edge length. EXIF metadata is dropped after
+        applying its orientation.
+    Raises:
+        ValueError: The image has more than MAX_PROFILE_IMAGE_PIXELS
+    """
+    image_file.seek(0)
+    with Image.open(image_file) as image:
+        # Read from the header, before anything is decoded
+        if is_oversized(image):
+            raise ValueError(f'Image of {image.width}x{image.height} pixels')
+        # JPEGs are decoded straight at a fraction of their size, no
+        # smaller than the largest variant
+        largest = max(PROFILE_IMAGE_SIZES)
+        image.draft(None, (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    variants = {}
+    # Each variant is downscaled from the previous, larger one
+    for size in sorted(PROFILE_IMAGE_SIZES, reverse=True):
+        edge = min(size, image.width, image.height)
+        image = ImageOps.fit(image, (edge, edge), Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY)
+        variants[size] = buffer.getvalue()
+    return variants
+
+
+def store_profile_image(
+        profile, image_file) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Resize an uploaded profile image and save every variant
+    Args:
+        profile: UserProfile the image belongs to
+        image_file: Uploaded image file
+    Returns:
+        Variant URLs keyed by edge length, and the variants' storage
+        names, as stored on the profile
+    """
+    storage = storages['profile_images']
+    token = uuid4().hex[:12]
+    urls = {}
+    names = []
+    for size, data in build_variants(image_file).items():
+        name = storage.save(
+            f'profile_images/{profile.user_id}/{token}_{size}.webp',
+            ContentFile(data)
+        )
+        urls[str(size)] = storage.url(name)
+        names.append(name)
+    return urls, names
+
+
+def delete_profile_image_files(names: List[str]) -> None:
+    """
+    Delete replaced variants. A failure is logged, since the new image
+    is already in place.
+    Args:
+        names: Storage names from store_profile_image
+    """
+    storage = storages['profile_images']
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception:
+            logger.warning(
+                'Could not delete profile image %s', name, exc_info=True)
+
+
+@lru_cache(maxsize=1)
+def default_profile_image_url() -> str:
+    """URL of the placeholder image, built once per process"""
+    url, _ = cloudinary_url(
+        DEFAULT_PROFILE_IMAGE,
+        format="webp",
+        transformation=[
+            {'width': DEFAULT_PROFILE_IMAGE_SIZE,
+                'height': DEFAULT_PROFILE_IMAGE_SIZE,
+                'crop': 'fill', 'gravity': 'face'},
+            {'quality': 'auto:eco'},
+            {'fetch_format': 'auto'}
+        ]
+    )
+    return url
@@ -0,0 +1,113 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+from .metrics import LOG_RECORDS_DROPPED
+
+# Attributes every LogRecord has; anything else was passed as `extra`
+RECORD_ATTRS = frozenset(vars(logging.LogRecord(
+    '', logging.INFO, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One compact JSON object per record, including its extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': datetime.fromtimestamp(
+                record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update(
+            (key, value) for key, value in vars(record).items()
+            if key not in RECORD_ATTRS and not key.startswith('_'))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc_info'] = record.exc_text
+        return json.dumps(data, separators=(',', ':'), default=str)
+
+
+class BackgroundHandler(QueueHandler):
+    """
+    Hand records to a background thread that formats and writes them,
+    so a slow stdout never blocks a request. When the bounded queue is
+    full, records are dropped instead of waiting, counted in the
+    log_records_dropped_total metric and reported when the thread stops.
+    """
+
+    def __init__(self, stream=None, maxsize: int = 10000):
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0
+        self._start()
+        # Threads do not survive fork, so each gunicorn worker restarts it
+        os.register_at_fork(after_in_child=self._start)
+        atexit.register(self.flush_and_stop)
+
+    def _start(self):
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def flush_and_stop(self):
+        """Write out everything queued, then stop the thread"""
+        if self.listener._thread is not None:
+            self.listener.stop()
+            if self.dropped:
+                self.target.handle(logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.WARNING,
+                    'levelname': 'WARNING',
+                    'msg': f'Dropped {self.dropped} log records',
+                    'dropped': self.dropped,
+                }))
+
+    def setFormatter(self, fmt: Optional[logging.Formatter]) -> None:
+        # Formatting happens on the listener thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Resolve what may change after this call returns: the message
+        arguments and the exception, whose frames are still live.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of the successful request log lines per view name.
+    Records without a view, and failed requests, always pass.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rates = rates or {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        view = getattr(record, 'view', None)
+        if view is None or getattr(record, 'status_code', 500) >= 400:
+            return True
+        rate = self.rates.get(view, self.rates.get('default', 1.0))
+        return rate >= 1 or random.random() < rate
@@ -0,0 +1,273 @@
+import json
+import math
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from io import StringIO
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from api.renderers import FastJSONRenderer
+from api.stats import count_current_streak
+from api.testing import percentile
+from api.utils import invalidate_tags
+from social.serializers import WorkoutPostSerializer
+from social.views import get_feed_queryset
+from workouts.models import Workout
+from workouts.serializers import WorkoutSerializer
+from workouts.views import WorkoutViewSet
+
+# Seeded dataset per scale: users, workouts and feed posts
+SCALES = {
+    '1k': (50, 1000, 200),
+    '100k': (2000, 100000, 10000),
+    '1m': (20000, 1000000, 100000),
+}
+# Workouts in the list rendered by the renderer cases, a large response
+RENDERED_WORKOUTS = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the hot paths (serializers, streaks, statistics, summary and '
+        'feed pages) against a seeded dataset in a throwaway test '
+        'database, and report p50/p95, queries and peak memory per case.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=SCALES, default='1k',
+            help='Dataset size, by number of workouts')
+        parser.add_argument(
+            '--iterations', type=int, default=30,
+            help='Timed runs per case')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Keep cached results between runs instead of expiring '
+                 'them, to time the cache hit path')
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Keep the seeded test database for the next run')
+        parser.add_argument(
+            '--in-place', action='store_true',
+            help='Seed and time the configured database instead of a '
+                 'throwaway test database')
+        parser.add_argument(
+            '--output', help='Also write the results as JSON to this file')
+        parser.add_argument(
+            '--compare', help='JSON results of an earlier run to compare to')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+
+        old_config = None
+        overrides = {}
+        if not options['in_place']:
+            old_config = setup_databases(
+                verbosity=0, interactive=False, keepdb=options['keepdb'])
+            # The test database reuses the configured database's ids, so
+            # its entries must not land in the configured cache
+            overrides['CACHES'] = {
+                'default': {
+                    'BACKEND': 'api.timing.TimedLocMemCache',
+                    'TIMEOUT': settings.CACHES['default'].get('TIMEOUT', 300),
+                }
+            }
+        try:
+            # Requests go through the in-process test client, and time
+            # what production runs, without the debug query log
+            with override_settings(
+                    ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                    RATE_LIMIT_ENABLED=False, DEBUG=False, **overrides):
+                user = self._seed(options['scale'], options['seed'])
+                results = self._run(user, options)
+        finally:
+            if old_config is not None:
+                teardown_databases(
+                    old_config, verbosity=0, keepdb=options['keepdb'])
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+        self._report(results, baseline)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def _seed(self, scale, seed):
+        """
+        Generate the dataset unless a kept database already has it, and
+        return the user with the most workouts, the worst case.
+        """
+        prefix = f'bench{scale}-'
+        users, workouts, posts = SCALES[scale]
+        if not User.objects.filter(username__startswith=prefix).exists():
+            self.stdout.write(f'Seeding {workouts} workouts...')
+            call_command(
+                'generate_dataset', users=users, workouts=workouts,
+                posts=posts, prefix=prefix, seed=seed, stdout=StringIO())
+
+        return User.objects.filter(username__startswith=prefix).annotate(
+            workout_count=Count('workouts')
+        ).order_by('-workout_count').first()
+
+    def _cases(self, user):
+        """The timed callables, with their inputs loaded up front."""
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        queryset = Workout.objects.filter(owner=user)
+        workouts = list(queryset.select_related('owner')[:page_size])
+        posts = list(get_feed_queryset()[:page_size])
+        dates = list(
+            queryset.order_by('-date_logged')
+            .values_list('date_logged', flat=True).distinct()
+        )
+        factory = RequestFactory()
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        def render_posts():
+            # A new request per run, so profiles are loaded every time
+            request = factory.get('/')
+            request.user = user
+            return WorkoutPostSerializer(
+                posts, many=True, context={'request': request}).data
+
+        def fetch(path):
+            def get():
+                response = client.get(path, secure=True)
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'GET {path} returned {response.status_code}')
+                return response
+            return get
+
+        # The same payloads rendered by the stock and the orjson renderer
+        workout_data = WorkoutSerializer(
+            queryset.select_related('owner')[:RENDERED_WORKOUTS],
+            many=True).data
+        feed_data = render_posts()
+        stdlib, fast = JSONRenderer(), FastJSONRenderer()
+
+        feed = reverse('social:feed-list')
+        last_page = max(math.ceil(
+            get_feed_queryset().count() / page_size), 1)
+        return {
+            'workout_serializer':
+                lambda: WorkoutSerializer(workouts, many=True).data,
+            'workout_post_serializer': render_posts,
+            'calculate_streaks':
+                lambda: WorkoutViewSet()._calculate_streaks(queryset),
+            'current_streak': lambda: count_current_streak(dates),
+            'statistics': fetch(reverse('workouts:workout-statistics')),
+            'summary': fetch(reverse('workouts:workout-summary')),
+            'feed_first_page': fetch(feed),
+            'feed_last_page': fetch(f'{feed}?page={last_page}'),
+            'render_workouts_stdlib': lambda: stdlib.render(workout_data),
+            'render_workouts_orjson': lambda: fast.render(workout_data),
+            'render_feed_stdlib': lambda: stdlib.render(feed_data),
+            'render_feed_orjson': lambda: fast.render(feed_data),
+        }
+
+    def _run(self, user, options):
+        cases = {}
+        for name, func in self._cases(user).items():
+            cases[name] = self._measure(func, user, options)
+
+        return {
+            'scale': options['scale'],
+            'workouts': Workout.objects.count(),
+            'user_workouts': user.workout_count,
+            'iterations': options['iterations'],
+            'warm': options['warm'],
+            'revision': self._revision(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'created_at': timezone.now().isoformat(),
+            'cases': cases,
+        }
+
+    def _measure(self, func, user, options):
+        """Time one case, then count its queries and trace its memory."""
+        def prepare():
+            if not options['warm']:
+                invalidate_tags(f'user:{user.pk}', 'feed')
+
+        # Warm up connections and lazily built state before timing
+        prepare()
+        func()
+
+        durations = []
+        for _ in range(options['iterations']):
+            prepare()
+            start = time.perf_counter()
+            func()
+            durations.append(time.perf_counter() - start)
+        durations.sort()
+
+        prepare()
+        queries = []
+        with connection.execute_wrapper(
+                lambda execute, sql, *args: (
+                    queries.append(sql) or execute(sql, *args))):
+            func()
+
+        # Tracing slows everything down, so it gets a run of its own
+        prepare()
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'p50_ms': percentile(durations, 0.5),
+            'p95_ms': percentile(durations, 0.95),
+            'mean_ms': round(statistics.mean(durations) * 1000, 3),
+            'queries': len(queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def _revision(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _report(self, results, baseline=None):
+        self.stdout.write(
+            f"{results['scale']}: {results['workouts']} workouts, "
+            f"{results['user_workouts']} for the benchmarked user, "
+            f"{results['iterations']} runs per case "
+            f"({'warm' if results['warm'] else 'cold'} cache)"
+        )
+        previous = (baseline or {}).get('cases', {})
+        for name, case in results['cases'].items():
+            line = (
+                f"  {name:<24} p50 {case['p50_ms']:>9} ms  "
+                f"p95 {case['p95_ms']:>9} ms  "
+                f"{case['queries']:>3} queries  "
+                f"{case['peak_memory_kb']:>9} KiB"
+            )
+            if name in previous and previous[name]['p50_ms']:
+                change = case['p50_ms'] / previous[name]['p50_ms'] - 1
+                line += f'  p50 {change:+.0%}'
+            self.stdout.write(line)
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from api.testing import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Load the hot read endpoints concurrently in-process and report '
+        'throughput and latency. Run once as is and once with ASGI_MODE '
+        'set to compare the WSGI and ASGI setups.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'username', help='Existing user whose data is requested')
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Total number of requests to send')
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Requests in flight at once (Procfile WSGI: 2 x 4 = 8)')
+        parser.add_argument(
+            '--db-latency', type=float, default=0.0,
+            help='Simulated database round trip per query, in ms')
+        parser.add_argument(
+            '--output', help='Also write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.select_related('profile').get(
+                username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist")
+
+        token, _ = Token.objects.get_or_create(user=user)
+        paths = [
+            reverse('workouts:workout-list'),
+            reverse('workouts:workout-statistics'),
+            reverse('workouts:workout-summary'),
+            reverse('social:feed-list'),
+            reverse('api:profile-stats', kwargs={'pk': user.profile.pk}),
+        ]
+        if options['requests'] < len(paths):
+            raise CommandError(
+                f'--requests must be at least {len(paths)}, one per path')
+        schedule = [
+            paths[i % len(paths)] for i in range(options['requests'])]
+        headers = {'Authorization': f'Token {token.key}'}
+        # The in-process test clients always send Host: testserver
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        # A single user at full speed would exhaust any sane quota
+        settings.RATE_LIMIT_ENABLED = False
+
+        if options['db_latency']:
+            self._simulate_db_latency(options['db_latency'] / 1000)
+
+        mode = 'asgi' if settings.ASGI_MODE else 'wsgi'
+        runner = self._run_asgi if settings.ASGI_MODE else self._run_wsgi
+        started = time.perf_counter()
+        samples = runner(schedule, headers, options['concurrency'])
+        elapsed = time.perf_counter() - started
+
+        results = {
+            'mode': mode,
+            'concurrency': options['concurrency'],
+            'requests': len(samples),
+            'db_latency_ms': options['db_latency'],
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(samples) / elapsed, 1),
+            'errors': sum(1 for _, status, _ in samples if status >= 400),
+            'paths': {},
+        }
+        for path in paths:
+            latencies = sorted(
+                duration for p, _, duration in samples if p == path)
+            results['paths'][path] = {
+                'p50_ms': percentile(latencies, 0.5),
+                'p95_ms': percentile(latencies, 0.95),
+            }
+
+        self._report(results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def _simulate_db_latency(self, seconds):
+        """Sleep before every query to model the network hop to Postgres."""
+        def wrapper(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def install(sender, connection, **kwargs):
+            connection.execute_wrappers.append(wrapper)
+
+        connection_created.connect(install, weak=False)
+        connection.execute_wrappers.append(wrapper)
+
+    def _run_wsgi(self, schedule, headers, concurrency):
+        """Drive the WSGI handler from a pool of threads."""
+        def fetch(path):
+            client = Client(raise_request_exception=False)
+            start = time.perf_counter()
+            response = client.get(path, headers=headers, secure=True)
+            return path, response.status_code, time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(fetch, schedule))
+
+    def _run_asgi(self, schedule, headers, concurrency):
+        """Drive the ASGI handler from a single event loop."""
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+            client = AsyncClient(raise_request_exception=False)
+
+            async def fetch(path):
+                # ASGIHandler gives each request its own thread for
+                # thread-sensitive sync code; the test client does not
+                async with semaphore, ThreadSensitiveContext():
+                    start = time.perf_counter()
+                    response = await client.get(
+                        path, headers=headers, secure=True)
+                    return (
+                        path, response.status_code,
+                        time.perf_counter() - start
+                    )
+
+            return await asyncio.gather(*(fetch(p) for p in schedule))
+
+        return asyncio.run(run())
+
+    def _report(self, results):
+        self.stdout.write(
+            f"{results['mode'].upper()}: {results['requests']} requests, "
+            f"concurrency {results['concurrency']}, "
+            f"{results['throughput_rps']} req/s, "
+            f"{results['errors']} errors"
+        )
+        for path, latency in results['paths'].items():
+            self.stdout.write(
+                f"  {path:<40} p50 {latency['p50_ms']:>8} ms  "
+                f"p95 {latency['p95_ms']:>8} ms"
+            )
@@ -0,0 +1,289 @@
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timedelta, timezone as tz
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from api.models import UserProfile
+from social.models import Comment, Like, WorkoutPost
+from workouts.models import Workout
+
+# Share of workouts per type, with the typical duration in minutes,
+# intensity weights (low, moderate, high) and titles for each
+WORKOUT_TYPES = {
+    Workout.CARDIO: (
+        35, 40, (3, 5, 2), ['Morning run', 'Bike ride', 'Rowing']),
+    Workout.STRENGTH: (
+        30, 55, (1, 5, 4), ['Leg day', 'Upper body', 'Full body lift']),
+    Workout.FLEXIBILITY: (
+        10, 30, (6, 3, 1), ['Yoga flow', 'Mobility', 'Stretching']),
+    Workout.SPORTS: (
+        15, 75, (2, 4, 4), ['Football', 'Tennis match', 'Climbing']),
+    Workout.OTHER: (
+        10, 45, (3, 5, 2), ['Hike', 'Dance class', 'Swim']),
+}
+INTENSITIES = [Workout.LOW, Workout.MODERATE, Workout.HIGH]
+COMMENTS = [
+    'Great workout!', 'Nice pace', 'Keep it up!', 'Impressive streak',
+    'See you at the gym', 'That looks tough', 'Well done',
+]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the given created_at/updated_at values."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic users, profiles, workout histories, posts, '
+        'likes and comments with bulk inserts, for load and benchmark '
+        'environments. For a production sized database: --users 20000 '
+        '--workouts 1000000 --posts 100000'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--workouts', type=int, default=20000,
+            help='Total workouts, spread unevenly across the users')
+        parser.add_argument(
+            '--posts', type=int, default=2000,
+            help='Number of workouts shared to the feed')
+        parser.add_argument(
+            '--likes', type=float, default=5.0,
+            help='Average likes per post')
+        parser.add_argument(
+            '--comments', type=float, default=1.5,
+            help='Average comments per post')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='Length of the workout history, in days')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix', default='loadtest',
+            help='Username prefix of the generated users')
+        parser.add_argument(
+            '--password', default='loadtest-password',
+            help='Password shared by every generated user')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options['posts'] > options['workouts']:
+            raise CommandError('--posts cannot exceed --workouts')
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.today = timezone.now().date()
+        started = time.perf_counter()
+
+        with explicit_timestamps(Workout, WorkoutPost, Comment):
+            user_ids = self._timed('users', self._create_users, options)
+            self._timed(
+                'workouts', self._create_workouts, user_ids, options)
+            posts = self._timed('posts', self._create_posts)
+            self._timed(
+                'likes', self._create_likes, posts, user_ids,
+                options['likes'])
+            self._timed(
+                'comments', self._create_comments, posts, user_ids,
+                options['comments'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done in {time.perf_counter() - started:.1f}s'))
+
+    def _timed(self, label, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        count = result if isinstance(result, int) else len(result)
+        self.stdout.write(
+            f'{label:<10} {count:>10,} in '
+            f'{time.perf_counter() - start:6.1f}s')
+        return result
+
+    def _bulk_create(self, model, objects, **kwargs):
+        with transaction.atomic():
+            return model.objects.bulk_create(
+                objects, batch_size=self.batch_size, **kwargs)
+
+    def _create_users(self, options):
+        """Users and their profiles, without the per user post_save."""
+        prefix = options['prefix']
+        offset = User.objects.filter(username__startswith=prefix).count()
+        # Hashing is deliberately slow, so every user shares one hash
+        password = make_password(options['password'])
+
+        user_ids = []
+        for start in range(0, options['users'], self.batch_size):
+            stop = min(start + self.batch_size, options['users'])
+            users = self._bulk_create(User, [
+                User(
+                    username=f'{prefix}{offset + i}',
+                    email=f'{prefix}{offset + i}@example.com',
+                    password=password,
+                    date_joined=self._moment(
+                        self.rng.randrange(options['days']))
+                )
+                for i in range(start, stop)
+            ])
+            self._bulk_create(
+                UserProfile, [UserProfile(user=user) for user in users])
+            user_ids.extend(user.pk for user in users)
+        return user_ids
+
+    def _create_workouts(self, user_ids, options):
+        """
+        Workout histories, heavy tailed across users, made of streaks and
+        gaps. Keeps the unsaved posts for the workouts picked to share.
+        """
+        counts = self._spread(options['workouts'], len(user_ids))
+        # Oversample slightly, the surplus is cut once the total is known
+        post_chance = 1.1 * options['posts'] / max(options['workouts'], 1)
+        types = list(WORKOUT_TYPES)
+        type_weights = [WORKOUT_TYPES[t][0] for t in types]
+
+        batch, posts = [], []
+        for user_id, count in zip(user_ids, counts):
+            for days_ago in self._history(count, options['days']):
+                workout_type = self.rng.choices(types, type_weights)[0]
+                _, duration, intensity_weights, titles = (
+                    WORKOUT_TYPES[workout_type])
+                logged_at = self._moment(days_ago)
+                workout = Workout(
+                    owner_id=user_id,
+                    title=self.rng.choice(titles),
+                    workout_type=workout_type,
+                    intensity=self.rng.choices(
+                        INTENSITIES, intensity_weights)[0],
+                    duration=max(5, min(
+                        240, int(self.rng.gauss(duration, duration / 3)))),
+                    date_logged=logged_at.date(),
+                    created_at=logged_at,
+                    updated_at=logged_at,
+                )
+                batch.append(workout)
+                if self.rng.random() < post_chance:
+                    posts.append(WorkoutPost(
+                        user_id=user_id, workout=workout,
+                        created_at=logged_at, updated_at=logged_at))
+                if len(batch) >= self.batch_size:
+                    self._bulk_create(Workout, batch)
+                    batch = []
+        self._bulk_create(Workout, batch)
+
+        self.posts = self.rng.sample(
+            posts, min(len(posts), options['posts']))
+        return sum(counts)
+
+    def _create_posts(self):
+        # The workouts are saved by now, so the posts pick up their pks
+        created = []
+        posts = self.posts
+        for start in range(0, len(posts), self.batch_size):
+            created.extend(self._bulk_create(
+                WorkoutPost, posts[start:start + self.batch_size]))
+        return created
+
+    def _create_likes(self, posts, user_ids, average):
+        total = 0
+        batch = []
+        for post in posts:
+            count = min(len(user_ids), self._poisson(average))
+            for user_id in self.rng.sample(user_ids, count):
+                batch.append(Like(user_id=user_id, post_id=post.pk))
+            if len(batch) >= self.batch_size:
+                total += len(batch)
+                self._bulk_create(Like, batch, ignore_conflicts=True)
+                batch = []
+        self._bulk_create(Like, batch, ignore_conflicts=True)
+        return total + len(batch)
+
+    def _create_comments(self, posts, user_ids, average):
+        total = 0
+        batch = []
+        now = timezone.now()
+        for post in posts:
+            for _ in range(self._poisson(average)):
+                commented_at = min(now, post.created_at + timedelta(
+                    minutes=self.rng.randrange(1, 60 * 48)))
+                batch.append(Comment(
+                    user_id=self.rng.choice(user_ids),
+                    post_id=post.pk,
+                    content=self.rng.choice(COMMENTS),
+                    created_at=commented_at,
+                    updated_at=commented_at,
+                ))
+            if len(batch) >= self.batch_size:
+                total += len(batch)
+                self._bulk_create(Comment, batch)
+                batch = []
+        self._bulk_create(Comment, batch)
+        return total + len(batch)
+
+    def _spread(self, total, users):
+        """Split a total across users with a heavy tail of active ones."""
+        if not users:
+            return []
+        weights = [self.rng.paretovariate(1.5) for _ in range(users)]
+        scale = total / sum(weights)
+        counts = [int(weight * scale) for weight in weights]
+        remainder = min(users, total - sum(counts))
+        for i in self.rng.sample(range(users), remainder):
+            counts[i] += 1
+        return counts
+
+    def _history(self, count, days):
+        """
+        Days ago of a user's workouts, walking back from today through
+        streaks of consecutive days separated by rest gaps.
+        """
+        if not count:
+            return []
+        keep_streak = self.rng.uniform(0.3, 0.8)
+        mean_gap = max(1.0, days / count)
+        day = self.rng.randrange(min(days, 7))
+        history = []
+        for _ in range(count):
+            history.append(day)
+            if self.rng.random() < 0.1:
+                continue  # A second session on the same day
+            if self.rng.random() < keep_streak:
+                day += 1
+            else:
+                day += 1 + int(self.rng.expovariate(1 / mean_gap))
+            if day >= days:
+                day = self.rng.randrange(days)
+        return history
+
+    def _moment(self, days_ago):
+        """A random time of day, a given number of days ago."""
+        return datetime.combine(
+            self.today - timedelta(days=days_ago),
+            dt_time(self.rng.randrange(6, 22), self.rng.randrange(60)),
+            tzinfo=tz.utc)
+
+    def _poisson(self, mean):
+        """Poisson sample by inversion, fine for the small means used."""
+        limit, count, product = math.exp(-mean), 0, 1.0
+        while True:
+            product *= self.rng.random()
+            if product <= limit:
+                return count
+            count += 1
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from config.schema import write_schema
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate the OpenAPI schema served at /swagger.json and '
+        '/swagger.yaml, with gzip and brotli copies, so web processes '
+        'never introspect the API. Run at build time (bin/post_compile).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output-dir', default=settings.OPENAPI_SCHEMA_DIR,
+            help='Directory to write the schema files to '
+                 '(default: OPENAPI_SCHEMA_DIR)')
+
+    def handle(self, *args, **options):
+        paths = write_schema(options['output_dir'])
+        self.stdout.write(
+            f"Wrote {len(paths)} schema files to {options['output_dir']}")
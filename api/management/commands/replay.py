@@ -0,0 +1,267 @@
+import json
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import Resolver404, resolve
+from rest_framework.authtoken.models import Token
+from api.testing import percentile
+
+METHODS = {'GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE'}
+
+
+def read_trace(lines):
+    """
+    Parse a JSONL trace, one request per line. Each request has a
+    `method` and a `path`, and optionally a `body` and the `user` it is
+    sent as. Returns the requests and the number of lines skipped.
+    """
+    requests, skipped = [], 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+            method = entry['method'].upper()
+            path = entry['path']
+        except (ValueError, KeyError, TypeError, AttributeError):
+            skipped += 1
+            continue
+        if method not in METHODS or not path.startswith('/'):
+            skipped += 1
+            continue
+        requests.append({
+            'method': method,
+            'path': path,
+            'body': entry.get('body'),
+            'user': entry.get('user'),
+        })
+    return requests, skipped
+
+
+def route_of(method, path):
+    """Group requests by method and URL name, falling back to the path."""
+    try:
+        name = resolve(urlsplit(path).path).view_name
+    except Resolver404:
+        name = urlsplit(path).path
+    return f'{method} {name}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay a JSONL request trace against the app in-process or a '
+        'running server, with a fixed concurrency and an optional rate, '
+        'and report throughput, latency percentiles and errors per route.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'trace', help="JSONL trace to replay, or '-' for stdin")
+        parser.add_argument(
+            '--target',
+            help='Base URL of a running server, e.g. http://127.0.0.1:8000. '
+                 'Requests are handled in-process when omitted')
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Requests in flight at once (Procfile WSGI: 2 x 4 = 8)')
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Requests started per second; as fast as possible if 0')
+        parser.add_argument(
+            '--repeat', type=int, default=1,
+            help='Number of times to replay the trace')
+        parser.add_argument(
+            '--output', help='Also write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['repeat'] < 1:
+            raise CommandError('--concurrency and --repeat must be positive')
+
+        if options['trace'] == '-':
+            requests, skipped = read_trace(sys.stdin)
+        else:
+            try:
+                with open(options['trace']) as f:
+                    requests, skipped = read_trace(f)
+            except OSError as e:
+                raise CommandError(f'Cannot read the trace: {e}')
+        if not requests:
+            raise CommandError(
+                f'The trace has no requests ({skipped} lines skipped)')
+        requests *= options['repeat']
+
+        tokens = self._get_tokens(requests)
+        send = (
+            self._remote_sender(options['target'].rstrip('/'), tokens)
+            if options['target'] else self._local_sender(tokens)
+        )
+
+        # The in-process client always sends Host: testserver, and a few
+        # users at full speed would exhaust any sane quota
+        with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                RATE_LIMIT_ENABLED=False):
+            started = time.perf_counter()
+            samples = self._replay(
+                requests, send, options['concurrency'], options['rate'])
+            elapsed = time.perf_counter() - started
+
+        results = self._summarize(samples, elapsed, options)
+        results['skipped_lines'] = skipped
+        self._report(results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def _get_tokens(self, requests):
+        """Auth tokens of every user named in the trace."""
+        usernames = {r['user'] for r in requests if r['user']}
+        users = User.objects.filter(username__in=usernames)
+        missing = usernames - {user.username for user in users}
+        if missing:
+            raise CommandError(
+                f"Unknown users in the trace: {', '.join(sorted(missing))}")
+        return {
+            user.username: Token.objects.get_or_create(user=user)[0].key
+            for user in users
+        }
+
+    def _headers(self, tokens, request):
+        if request['user']:
+            return {'Authorization': f"Token {tokens[request['user']]}"}
+        return {}
+
+    def _local_sender(self, tokens):
+        """Send requests through the WSGI handler, one client per thread."""
+        local = threading.local()
+
+        def send(request):
+            if not hasattr(local, 'client'):
+                local.client = Client(raise_request_exception=False)
+            body = request['body']
+            kwargs = {}
+            if body is not None:
+                kwargs = {
+                    'data': body if isinstance(body, str)
+                    else json.dumps(body),
+                    'content_type': 'application/json',
+                }
+            response = local.client.generic(
+                request['method'], request['path'],
+                headers=self._headers(tokens, request), secure=True,
+                **kwargs)
+            return response.status_code
+
+        return send
+
+    def _remote_sender(self, target, tokens):
+        """Send requests over HTTP to a running server."""
+        def send(request):
+            body = request['body']
+            headers = self._headers(tokens, request)
+            if body is not None:
+                body = (
+                    body if isinstance(body, str) else json.dumps(body)
+                ).encode()
+                headers['Content-Type'] = 'application/json'
+            try:
+                with urlopen(Request(
+                        target + request['path'], data=body,
+                        headers=headers, method=request['method']),
+                        timeout=30) as response:
+                    response.read()
+                    return response.status
+            except HTTPError as e:
+                return e.code
+            except (URLError, OSError):
+                return None
+
+        return send
+
+    def _replay(self, requests, send, concurrency, rate):
+        """
+        Send every request and return (route, status, latency) samples.
+        With a rate, latency counts from the scheduled start, so time
+        spent waiting for a free worker shows up as it would for users.
+        """
+        started = time.perf_counter()
+
+        def run(index, request):
+            scheduled = started + index / rate if rate else None
+            if scheduled is not None:
+                time.sleep(max(scheduled - time.perf_counter(), 0))
+            start = time.perf_counter()
+            status = send(request)
+            latency = time.perf_counter() - (scheduled or start)
+            return (
+                route_of(request['method'], request['path']),
+                status, latency,
+            )
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(run, range(len(requests)), requests))
+
+    def _summarize(self, samples, elapsed, options):
+        def is_error(status):
+            return status is None or status >= 500
+
+        routes = defaultdict(list)
+        for route, status, latency in samples:
+            routes[route].append((status, latency))
+
+        results = {
+            'target': options['target'] or 'in-process',
+            'concurrency': options['concurrency'],
+            'rate': options['rate'],
+            'requests': len(samples),
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(samples) / elapsed, 1),
+            'error_rate': round(
+                sum(is_error(s) for _, s, _ in samples) / len(samples), 4),
+            'routes': {},
+        }
+        for route, entries in sorted(routes.items()):
+            latencies = sorted(latency for _, latency in entries)
+            statuses = defaultdict(int)
+            for status, _ in entries:
+                statuses[str(status)] += 1
+            results['routes'][route] = {
+                'requests': len(entries),
+                'p50_ms': percentile(latencies, 0.5),
+                'p95_ms': percentile(latencies, 0.95),
+                'p99_ms': percentile(latencies, 0.99),
+                'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+                'error_rate': round(
+                    sum(is_error(s) for s, _ in entries) / len(entries), 4),
+                'statuses': dict(statuses),
+            }
+        return results
+
+    def _report(self, results):
+        self.stdout.write(
+            f"{results['target']}: {results['requests']} requests in "
+            f"{results['elapsed_s']} s, concurrency "
+            f"{results['concurrency']}, {results['throughput_rps']} req/s, "
+            f"{results['error_rate']:.1%} errors"
+        )
+        if results['skipped_lines']:
+            self.stdout.write(
+                f"  {results['skipped_lines']} trace lines skipped")
+        for route, stats in results['routes'].items():
+            self.stdout.write(
+                f"  {route:<44} {stats['requests']:>6}  "
+                f"p50 {stats['p50_ms']:>9} ms  p95 {stats['p95_ms']:>9} ms  "
+                f"p99 {stats['p99_ms']:>9} ms  "
+                f"{stats['error_rate']:.1%} errors"
+            )
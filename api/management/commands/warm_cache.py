@@ -0,0 +1,121 @@
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from api.authentication import remember_users
+from api.stats import (
+    compute_workout_stats, get_profile_stats_key, get_week_start
+)
+from api.compression import ENCODINGS
+from api.utils import get_or_compute_many, resolved_tag_versions
+from social.views import WorkoutPostViewSet
+from workouts.models import Workout
+from workouts.views import (
+    WorkoutViewSet, get_statistics_key, get_summary_key
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Pre-populate the cache for recently active users after a deploy '
+        'or a Redis flush: their auth entries, profile stats, workout '
+        'statistics and summary, and with --host the first page of their '
+        'feed. Entries that are still fresh are kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=7,
+            help='Users who logged in or logged a workout this many days '
+                 'back count as active')
+        parser.add_argument(
+            '--limit', type=int, default=1000,
+            help='Most users to warm, most recently logged in first')
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Users whose entries are read and written together')
+        parser.add_argument(
+            '--host',
+            help='Host clients reach the API on, which the feed\'s page '
+                 'links point to. The feed is only warmed when given.')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--days and --batch-size must be positive')
+
+        since = timezone.now() - timedelta(days=options['days'])
+        users = list(
+            User.objects.filter(is_active=True).filter(
+                Q(last_login__gte=since) | Q(workouts__created_at__gte=since)
+            ).distinct().order_by(
+                F('last_login').desc(nulls_last=True), 'pk'
+            )[:options['limit']]
+        )
+
+        today = timezone.now().date()
+        week_start = get_week_start()
+        viewset = WorkoutViewSet()
+        computed = []
+
+        def counted(compute):
+            def run():
+                computed.append(None)
+                return compute()
+            return run
+
+        for start in range(0, len(users), options['batch_size']):
+            batch = users[start:start + options['batch_size']]
+            remember_users(batch)
+
+            computations = {}
+            with resolved_tag_versions(f'user:{user.pk}' for user in batch):
+                for user in batch:
+                    workouts = Workout.objects.filter(
+                        owner_id=user.pk).select_related('owner')
+                    computations.update({
+                        get_profile_stats_key(user.pk, week_start): counted(
+                            lambda user_id=user.pk: compute_workout_stats(
+                                user_id, week_start)),
+                        get_statistics_key(user.pk, today): counted(
+                            lambda workouts=workouts:
+                                viewset._compute_statistics(workouts, today)),
+                        get_summary_key(user.pk): counted(
+                            lambda workouts=workouts:
+                                viewset._compute_summary(workouts)),
+                    })
+            get_or_compute_many(
+                computations, settings.CACHE_TTL, settings.CACHE_STALE_TTL)
+
+        message = (
+            f'Warmed {len(users)} users: {len(computed)} entries computed, '
+            f'{len(users) * 3 - len(computed)} already cached')
+        if options['host']:
+            pages = self.warm_feeds(users, options['host'])
+            message += f', {pages} feed pages computed'
+        self.stdout.write(message)
+
+    def warm_feeds(self, users, host):
+        """
+        Cache the first feed page of each user, as requested by a client
+        taking the default format and the best encoding, and return how
+        many were computed rather than already cached
+        Args:
+            users: Users whose feed to warm
+            host: Host the cached page links point to
+        """
+        view = WorkoutPostViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+        computed = 0
+        for user in users:
+            request = factory.get(
+                reverse('social:feed-list'), HTTP_HOST=host,
+                HTTP_ACCEPT_ENCODING=', '.join(ENCODINGS))
+            force_authenticate(request, user)
+            # Pages served from the cache come back already rendered
+            computed += isinstance(view(request), Response)
+        return computed
@@ -0,0 +1,62 @@
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+    Histogram, generate_latest, multiprocess
+)
+
+# Under gunicorn, bin/web points PROMETHEUS_MULTIPROC_DIR at shared memory
+# where every worker writes its samples; a scrape sums them all.
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+REQUEST_LATENCY = Histogram(
+    'django_http_request_duration_seconds',
+    'Request latency by resolved view, method and status',
+    ['view', 'method', 'status'],
+    buckets=(
+        .005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0, 10.0),
+)
+DB_QUERIES = Histogram(
+    'django_http_request_db_queries',
+    'Database queries per request by resolved view',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+)
+CACHE_LOOKUPS = Counter(
+    'django_cache_lookups_total',
+    'Cache lookups by resolved view and result (hit or miss)',
+    ['view', 'result'],
+)
+CACHE_TIER_LOOKUPS = Counter(
+    'django_cache_tier_lookups_total',
+    'Lookups of keys kept in-process, by tier (local or shared) and '
+    'result (hit or miss)',
+    ['tier', 'result'],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'django_http_requests_in_flight',
+    'Requests currently being handled',
+    multiprocess_mode='livesum',
+)
+LOG_RECORDS_DROPPED = Counter(
+    'log_records_dropped_total',
+    'Log records dropped because the background writer fell behind',
+)
+STARTUP_DURATION = Gauge(
+    'django_startup_duration_seconds',
+    'Time the running processes spent warming up, by stage',
+    ['stage'],
+    multiprocess_mode='livemax',
+)
+
+# Anything else is bucketed so clients cannot invent label values
+METHODS = {'GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE'}
+
+
+def render_metrics():
+    """Serialize every metric, summed across workers when multiprocess"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
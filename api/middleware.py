@@ -1,11 +1,27 @@
+import math
 import time
-from typing import Callable
-from django.http import HttpRequest, HttpResponse
+from typing import Callable, Optional, Tuple
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.middleware.common import CommonMiddleware
+from django.utils.cache import patch_vary_headers
 from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from .authentication import get_token_user
+from .compression import compress, is_compressible, negotiate_encoding
+from .metrics import (
+    CACHE_LOOKUPS, DB_QUERIES, METHODS, REQUEST_LATENCY, REQUESTS_IN_FLIGHT
+)
+from .timing import RequestMetrics, current_metrics, install_query_recorder
 import logging
 
 logger = logging.getLogger(__name__)
+request_logger = logging.getLogger('api.requests')
 
 
 class CustomCommonMiddleware(CommonMiddleware):
@@ -46,70 +62,329 @@ class CustomCommonMiddleware(CommonMiddleware):
         return response
 
 
-class RateLimitMiddleware:
-    """Rate limiting middleware"""
+class ServerTimingMiddleware:
+    """
+    Break each request down into database, cache, view and render time.
+    The totals are sent as a Server-Timing header, shown by browser
+    devtools, and logged as structured fields for slow requests.
+    """
 
     def __init__(self, get_response: Callable):
         self.get_response = get_response
+        install_query_recorder()
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
-        # Get client IP
-        ip = self.get_client_ip(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        end = time.perf_counter()
+
+        timings = self.get_timings(metrics, start, end)
+        if settings.SERVER_TIMING_ENABLED:
+            response['Server-Timing'] = ', '.join(
+                f'{name};dur={duration * 1000:.1f}'
+                + (f';desc="{desc}"' if desc else '')
+                for name, duration, desc in timings
+            )
+
+        if end - start > settings.SLOW_REQUEST_THRESHOLD:
+            logger.warning(
+                f'Slow request: {request.method} {request.path} took '
+                f'{end - start:.2f}s',
+                extra={
+                    'method': request.method,
+                    'path': request.path,
+                    'status_code': response.status_code,
+                    'db_queries': metrics.db_count,
+                    'cache_hits': metrics.cache_hits,
+                    'cache_misses': metrics.cache_misses,
+                    **{
+                        f'{name}_ms': round(duration * 1000, 1)
+                        for name, duration, _ in timings
+                    },
+                }
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_metrics.get().view_start = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        """DRF responses render after the view returns; time that apart"""
+        metrics = current_metrics.get()
+        metrics.view_end = time.perf_counter()
+
+        def rendered(response):
+            metrics.render_end = time.perf_counter()
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def get_timings(self, metrics, start, end):
+        """(name, seconds, description) for each Server-Timing entry"""
+        timings = [
+            ('db', metrics.db_time, f'{metrics.db_count} queries'),
+            ('cache', metrics.cache_time, (
+                f'{metrics.cache_hits} hits {metrics.cache_misses} misses '
+                f'in {metrics.cache_count} calls'
+            )),
+        ]
+        if metrics.view_start is not None:
+            view_end = metrics.view_end or end
+            timings.append(('view', view_end - metrics.view_start, ''))
+            if metrics.render_end is not None:
+                timings.append(
+                    ('render', metrics.render_end - view_end, ''))
+        timings.append(('total', end - start, ''))
+        return timings
+
+
+class CompressionMiddleware:
+    """
+    Compress responses of at least COMPRESSION_MIN_SIZE bytes with the
+    best encoding the client accepts. Responses that already have a
+    Content-Encoding, such as pre-compressed cached ones, are sent as is.
+    """
+
+    def __init__(self, get_response: Callable):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        response = self.get_response(request)
+        if (response.streaming or response.has_header('Content-Encoding')
+                or not is_compressible(response)):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        encoding = negotiate_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        content = compress(response.content, encoding)
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        # The compressed body is no longer byte for byte the tagged one
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = f'W/{etag}'
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Record Prometheus request metrics labelled by resolved view name.
+    Installed after ServerTimingMiddleware, whose per request query and
+    cache counts it reuses.
+    """
+
+    def __init__(self, get_response: Callable):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+        duration = time.perf_counter() - start
+
+        view = self.get_view_name(request)
+        method = request.method if request.method in METHODS else 'other'
+        REQUEST_LATENCY.labels(
+            view, method, response.status_code).observe(duration)
 
-        # Check rate limit
-        if not self.check_rate_limit(ip):
-            from django.http import HttpResponseTooManyRequests
-            return HttpResponseTooManyRequests("Rate limit exceeded")
+        metrics = current_metrics.get()
+        if metrics is not None:
+            DB_QUERIES.labels(view).observe(metrics.db_count)
+            if metrics.cache_hits:
+                CACHE_LOOKUPS.labels(view, 'hit').inc(metrics.cache_hits)
+            if metrics.cache_misses:
+                CACHE_LOOKUPS.labels(view, 'miss').inc(metrics.cache_misses)
+        return response
+
+    def get_view_name(self, request: HttpRequest) -> str:
+        """URL name of the view, without unbounded path parameters"""
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return '<unresolved>'
+        return match.url_name or match._func_path
+
+
+def parse_rate(rate: str) -> Tuple[int, int]:
+    """
+    Parse a DRF style rate such as '30/min'
+    Args:
+        rate: Number of requests, a slash and s, m, h or d
+    Returns:
+        The request limit and the window length in seconds
+    """
+    num, period = rate.split('/')
+    return int(num), {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+
+
+class RateLimitMiddleware:
+    """
+    Sliding window rate limiter keyed by user, or by client IP for
+    anonymous requests. Quotas come from settings.RATE_LIMITS, looked up
+    as '<url name>:<read|write>' and then 'read' or 'write'.
+    """
+
+    # Used while the shared cache is unreachable
+    fallback_store = LocMemCache('rate-limit', {})
 
+    def __init__(self, get_response: Callable):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
         return self.get_response(request)
 
-    def get_client_ip(self, request: HttpRequest) -> str:
-        """Get client IP from request"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            return x_forwarded_for.split(',')[0]
-        return request.META.get('REMOTE_ADDR', '')
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.RATE_LIMIT_ENABLED:
+            return None
+
+        scope, rate = self.get_quota(request)
+        if rate is None:
+            return None
+
+        limit, window = parse_rate(rate)
+        key = f'ratelimit:{scope}:{self.get_ident(request)}'
+        retry_after = self.hit(key, limit, window)
+        if retry_after:
+            response = JsonResponse({
+                'detail': (
+                    'Request was throttled. Expected available in '
+                    f'{retry_after} seconds.'
+                )
+            }, status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
+        return None
 
-    def check_rate_limit(self, ip: str) -> bool:
-        """Check if request is within rate limit"""
-        cache_key = f'rate_limit:{ip}'
-        requests = cache.get(cache_key, 0)
+    def get_quota(self, request: HttpRequest) -> Tuple[str, Optional[str]]:
+        """Get the most specific configured quota for the request"""
+        kind = 'read' if request.method in SAFE_METHODS else 'write'
+        url_name = request.resolver_match.url_name
+        for scope in (f'{url_name}:{kind}', kind):
+            if scope in settings.RATE_LIMITS:
+                return scope, settings.RATE_LIMITS[scope]
+        return kind, None
 
-        if requests >= 100:  # 100 requests per minute
-            return False
+    def get_ident(self, request: HttpRequest) -> str:
+        """
+        Identify the client by user id when the request carries a valid
+        token or session, or else by the IP seen by the trusted proxies
+        """
+        user_id = None
+        auth = request.headers.get('Authorization', '').split()
+        if len(auth) == 2 and auth[0].lower() == 'token':
+            user = get_token_user(auth[1])
+            user_id = user.pk if user else None
+        elif len(auth) == 2 and auth[0].lower() == 'bearer':
+            try:
+                token = AccessToken(auth[1])
+                user_id = token[jwt_settings.USER_ID_CLAIM]
+            except (TokenError, KeyError):
+                pass
+        elif request.user.is_authenticated:
+            user_id = request.user.pk
 
-        cache.set(cache_key, requests + 1, 60)  # 60 seconds expiry
-        return True
+        if user_id is not None:
+            return f'user:{user_id}'
+        # REST_FRAMEWORK['NUM_PROXIES'] sets how many X-Forwarded-For hops
+        # were appended by our own proxies and can be trusted
+        return f'ip:{BaseThrottle().get_ident(request)}'
+
+    def hit(self, key: str, limit: int, window: int) -> int:
+        """
+        Count a request against a quota
+        Args:
+            key: Counter key for the quota and client
+            limit: Requests allowed per window
+            window: Window length in seconds
+        Returns:
+            0 if the request is allowed, else seconds until it would be
+        """
+        index, elapsed = divmod(time.time(), window)
+        current_key = f'{key}:{int(index)}'
+        previous_key = f'{key}:{int(index) - 1}'
+        try:
+            store = cache
+            current, previous = self._count(
+                store, current_key, previous_key, window)
+        except Exception:
+            logger.warning(
+                'Rate limit store unavailable, limiting in-process',
+                exc_info=True
+            )
+            store = self.fallback_store
+            current, previous = self._count(
+                store, current_key, previous_key, window)
+
+        # The previous window's count decays linearly as this one fills
+        weight = 1 - elapsed / window
+        if previous * weight + current <= limit:
+            return 0
+
+        # Rejected requests do not use up the quota
+        store.decr(current_key)
+        accepted = current - 1
+        if accepted < limit and previous:
+            wait = window * (1 - (limit - accepted - 1) / previous) - elapsed
+        else:
+            # Wait for this window to roll over and become the previous one
+            wait = window - elapsed + max(
+                0, window * (1 - (limit - 1) / max(accepted, 1)))
+        return max(1, math.ceil(wait))
+
+    def _count(self, store, current_key, previous_key, window):
+        """Atomically count a hit, then read the previous window"""
+        try:
+            current = store.incr(current_key)
+        except ValueError:
+            # add() sets the expiry once, so hits never extend it
+            if store.add(current_key, 1, window * 2):
+                current = 1
+            else:
+                current = store.incr(current_key)
+        return current, store.get(previous_key, 0)
 
 
 class RequestLoggingMiddleware:
-    """Middleware for logging requests"""
+    """
+    Log one structured line per request. Successful requests can be
+    sampled per view through api.log.SamplingFilter.
+    """
 
     def __init__(self, get_response: Callable):
         self.get_response = get_response
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
-        # Log request
-        logger.info(
-            f"Request: {request.method} {request.path}",
-            extra={
-                'method': request.method,
-                'path': request.path,
-                'user':
-                    request.user.username if request.user.is_authenticated
-                    else 'anonymous'
-            }
-        )
-
+        start = time.perf_counter()
         response = self.get_response(request)
+        duration = time.perf_counter() - start
 
-        # Log response
-        logger.info(
-            f"Response: {response.status_code}",
+        match = getattr(request, 'resolver_match', None)
+        user = getattr(request, 'user', None)
+        request_logger.info(
+            '%s %s %s', request.method, request.path, response.status_code,
             extra={
-                'status_code': response.status_code,
+                'method': request.method,
                 'path': request.path,
+                'view': match.url_name if match else None,
+                'status_code': response.status_code,
+                'duration_ms': round(duration * 1000, 1),
+                'user_id': user.pk if user is not None else None,
             }
         )
-
         return response
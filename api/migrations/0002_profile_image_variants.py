@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='profile_image_variants',
+            field=models.JSONField(blank=True, default=dict, help_text='Resized WebP image URLs keyed by edge length'),
+        ),
+    ]
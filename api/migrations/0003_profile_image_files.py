@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_profile_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='profile_image_files',
+            field=models.JSONField(blank=True, default=list, help_text='Storage names of the variants, deleted when replaced'),
+        ),
+    ]
@@ -1,10 +1,18 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from cloudinary.models import CloudinaryField
+from rest_framework.authtoken.models import Token
 from django.core.exceptions import ValidationError
+from workouts.models import Workout
+from .images import (
+    DEFAULT_PROFILE_IMAGE, DEFAULT_PROFILE_IMAGE_SIZE,
+    default_profile_image_url
+)
+from .authentication import invalidate_token, invalidate_user
+from .utils import invalidate_tags
 
 
 class UserProfile(models.Model):
@@ -25,6 +33,12 @@ class UserProfile(models.Model):
     profile_image = CloudinaryField(
         'profile_image', null=True, blank=True,
         default='default_profile_ylwpgw')
+    profile_image_variants = models.JSONField(
+        default=dict, blank=True,
+        help_text="Resized WebP image URLs keyed by edge length")
+    profile_image_files = models.JSONField(
+        default=list, blank=True,
+        help_text="Storage names of the variants, deleted when replaced")
     date_of_birth = models.DateField(null=True, blank=True)
     gender = models.CharField(
         max_length=1, choices=GENDER_CHOICES, blank=True, null=True)
@@ -37,6 +51,16 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.username}'s profile"
 
+    def get_profile_image_url(self, size=DEFAULT_PROFILE_IMAGE_SIZE):
+        """Return the stored image variant URL for the given size."""
+        if self.profile_image_variants:
+            return self.profile_image_variants.get(str(size))
+        # Profiles uploaded before image variants were stored
+        if self.profile_image and \
+                str(self.profile_image) != DEFAULT_PROFILE_IMAGE:
+            return self.profile_image.url
+        return default_profile_image_url()
+
     def clean(self):
         """Ensure that date_of_birth is not in the future."""
         if self.date_of_birth and self.date_of_birth > timezone.now().date():
@@ -50,3 +74,70 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 post_save.connect(create_user_profile, sender=User)
+
+
+def invalidate_user_stats(sender, instance, **kwargs):
+    """Signal to expire cached stats when a user's workouts change."""
+    if instance.owner_id:
+        invalidate_tags(f'user:{instance.owner_id}')
+
+
+post_save.connect(invalidate_user_stats, sender=Workout)
+post_delete.connect(invalidate_user_stats, sender=Workout)
+
+
+def invalidate_cached_user(sender, instance, update_fields=None, **kwargs):
+    """
+    Signal to drop a cached user after password, status or profile
+    changes. Login only stamps last_login, which keeps the cache.
+    """
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    invalidate_user(instance.pk)
+
+
+post_save.connect(invalidate_cached_user, sender=User)
+post_delete.connect(invalidate_cached_user, sender=User)
+
+
+def note_staff_status(sender, instance, update_fields=None, **kwargs):
+    """
+    Signal to note a user's stored staff status before a save, since
+    access tokens carry it.
+    """
+    if instance.pk is None or (
+            update_fields is not None and 'is_staff' not in update_fields):
+        return
+    instance._was_staff = User.objects.filter(
+        pk=instance.pk).values_list('is_staff', flat=True).first()
+
+
+pre_save.connect(note_staff_status, sender=User)
+
+
+def revoke_user_tokens(sender, instance, created, **kwargs):
+    """
+    Signal to sign a user out everywhere after a password change,
+    deactivation or loss of staff status: their refresh tokens are
+    blacklisted and their access tokens rejected.
+    """
+    if created:
+        return
+    # set_password() leaves the raw password on the instance until save()
+    if instance._password is not None or not instance.is_active or (
+            getattr(instance, '_was_staff', False) and not instance.is_staff):
+        # Imported here so loading the models needs no simplejwt setup
+        from .tokens import revoke_access_tokens, revoke_refresh_tokens
+        revoke_refresh_tokens(instance.pk)
+        revoke_access_tokens(instance.pk)
+
+
+post_save.connect(revoke_user_tokens, sender=User)
+
+
+def invalidate_cached_token(sender, instance, **kwargs):
+    """Signal to drop a cached token on logout or token deletion."""
+    invalidate_token(instance.key)
+
+
+post_delete.connect(invalidate_cached_token, sender=Token)
@@ -1,8 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import UserProfile
-from django.db import IntegrityError
-from cloudinary.utils import cloudinary_url
+from django.db import IntegrityError, transaction
+from .images import (
+    MAX_PROFILE_IMAGE_PIXELS, delete_profile_image_files, is_oversized,
+    store_profile_image
+)
 from django.utils import timezone
 import logging
 
@@ -12,7 +15,7 @@ logger = logging.getLogger(__name__)
 class UserProfileSerializer(serializers.ModelSerializer):
     username = serializers.ReadOnlyField(source='user.username')
     email = serializers.ReadOnlyField(source='user.email')
-    profile_image = serializers.ImageField(required=False)
+    profile_image = serializers.ImageField(required=False, write_only=True)
     age = serializers.SerializerMethodField()
     is_owner = serializers.SerializerMethodField()
     workouts_count = serializers.IntegerField(read_only=True)
@@ -21,10 +24,12 @@ class UserProfileSerializer(serializers.ModelSerializer):
         model = UserProfile
         fields = [
             'id', 'username', 'email', 'name', 'bio', 'weight', 'height',
-            'profile_image', 'date_of_birth', 'created_at', 'updated_at',
-            'gender', 'is_owner', 'workouts_count', 'age'
+            'profile_image', 'profile_image_variants', 'date_of_birth',
+            'created_at', 'updated_at', 'gender', 'is_owner',
+            'workouts_count', 'age'
         ]
-        read_only_fields = ['user', 'created_at', 'updated_at']
+        read_only_fields = [
+            'user', 'profile_image_variants', 'created_at', 'updated_at']
 
     def validate_bio(self, value):
         from django.utils.html import strip_tags
@@ -45,24 +50,38 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
     def get_profile_image(self, obj):
         try:
-            if obj.profile_image and hasattr(obj.profile_image, 'url'):
-                return obj.profile_image.url
-
-            fallback_url, _ = cloudinary_url(
-                "default_profile_ylwpgw",
-                format="webp",
-                transformation=[
-                    {'width': 240, 'height': 240,
-                        'crop': 'fill', 'gravity': 'face'},
-                    {'quality': 'auto:eco'},
-                    {'fetch_format': 'auto'}
-                ]
-            )
-            return fallback_url
+            return obj.get_profile_image_url()
         except Exception as e:
             logger.error(f"Error generating profile image URL: {e}")
             return None
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['profile_image'] = self.get_profile_image(instance)
+        return data
+
+    def create(self, validated_data):
+        image = validated_data.pop('profile_image', None)
+        profile = super().create(validated_data)
+        if image is not None:
+            (profile.profile_image_variants,
+             profile.profile_image_files) = store_profile_image(profile, image)
+            profile.save(update_fields=[
+                'profile_image_variants', 'profile_image_files'])
+        return profile
+
+    def update(self, instance, validated_data):
+        image = validated_data.pop('profile_image', None)
+        if image is not None:
+            replaced = instance.profile_image_files
+            (validated_data['profile_image_variants'],
+             validated_data['profile_image_files']) = store_profile_image(
+                instance, image)
+            # Kept until the profile points at the new ones
+            transaction.on_commit(
+                lambda: delete_profile_image_files(replaced))
+        return super().update(instance, validated_data)
+
     def get_age(self, obj):
         """Calculate age from date_of_birth."""
         if isinstance(obj, dict):
@@ -89,6 +108,11 @@ class UserProfileSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     'Only JPEG, PNG, and WebP images are allowed'
                 )
+            # Opened by the field, whose header gives the dimensions
+            if hasattr(value, 'image') and is_oversized(value.image):
+                raise serializers.ValidationError(
+                    f'Image cannot exceed {MAX_PROFILE_IMAGE_PIXELS} pixels'
+                )
         return value
 
 
@@ -0,0 +1,127 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from social.models import Follow
+from workouts.models import Workout
+from .utils import get_or_compute, tagged_key
+
+
+def with_follow_counts(queryset):
+    """Annotate a UserProfile queryset with follower and following counts."""
+    def count_follows(field):
+        return Coalesce(Subquery(
+            Follow.objects.filter(**{field: OuterRef('user_id')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('id'))
+            .values('count')
+        ), 0)
+
+    return queryset.annotate(
+        followers_count=count_follows('following'),
+        following_count=count_follows('follower'),
+    )
+
+
+def get_week_start():
+    """Return the date of this week's Monday."""
+    today = timezone.now().date()
+    return today - timedelta(days=today.weekday())
+
+
+def get_workout_totals(workouts, week_start):
+    """Aggregate every workout total in a single query."""
+    return workouts.aggregate(
+        total_workouts=Count('id'),
+        workouts_this_week=Count(
+            'id', filter=Q(date_logged__gte=week_start)),
+        total_workout_time=Sum('duration'),
+    )
+
+
+def get_workout_days_by_type(workouts):
+    """Count workouts per type and day, for the breakdown and the streak."""
+    return list(
+        workouts.order_by()
+        .values('workout_type', 'date_logged')
+        .annotate(count=Count('id'))
+    )
+
+
+def count_current_streak(workout_dates):
+    """Count consecutive days from distinct dates in descending order."""
+    if not workout_dates:
+        return 0
+
+    current_streak = 1
+    current_date = workout_dates[0]
+
+    # Check consecutive days
+    for date in workout_dates[1:]:
+        if current_date - date == timedelta(days=1):
+            current_streak += 1
+            current_date = date
+        else:
+            break
+
+    return current_streak
+
+
+def build_workout_stats(totals, days_by_type):
+    """Combine the totals and the per type and day counts into stats."""
+    by_type = {}
+    for row in days_by_type:
+        by_type[row['workout_type']] = (
+            by_type.get(row['workout_type'], 0) + row['count'])
+    dates = sorted({row['date_logged'] for row in days_by_type}, reverse=True)
+
+    return {
+        'total_workouts': totals['total_workouts'],
+        'workouts_this_week': totals['workouts_this_week'],
+        'total_workout_time': totals['total_workout_time'] or 0,
+        'current_streak': count_current_streak(dates),
+        'workouts_by_type': [
+            {'workout_type': workout_type, 'count': count}
+            for workout_type, count in sorted(by_type.items())
+        ],
+    }
+
+
+def compute_workout_stats(user_id, week_start):
+    """Compute the workout part of a user's stats, uncached."""
+    workouts = Workout.objects.filter(owner_id=user_id)
+    return build_workout_stats(
+        get_workout_totals(workouts, week_start),
+        get_workout_days_by_type(workouts)
+    )
+
+
+def get_profile_stats_key(user_id, week_start):
+    """Cache key for a user's stats, versioned by their workout changes."""
+    return tagged_key(
+        f'profile_stats:{user_id}:{week_start.isoformat()}', f'user:{user_id}')
+
+
+def with_follow_stats(stats, profile):
+    """Add the live follow counts annotated on a profile to its stats."""
+    return {
+        **stats,
+        'followers_count': profile.followers_count,
+        'following_count': profile.following_count,
+    }
+
+
+def get_profile_stats(profile):
+    """
+    Return a profile's stats. The workout part is cached until the owner's
+    workouts change; follow counts come from the profile's annotations.
+    """
+    week_start = get_week_start()
+    stats = get_or_compute(
+        get_profile_stats_key(profile.user_id, week_start),
+        lambda: compute_workout_stats(profile.user_id, week_start),
+        settings.CACHE_TTL, settings.CACHE_STALE_TTL
+    )
+    return with_follow_stats(stats, profile)
@@ -0,0 +1,191 @@
+import math
+import re
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Dict, Iterator, List
+from urllib.parse import urlsplit
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, resolve
+from django.utils import timezone
+from social.models import Comment, Like, Notification, WorkoutPost
+from workouts.models import Workout
+
+# Queries that differ only in their values share a shape
+_IN_LIST = re.compile(r'\bIN \([^()]*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# Transaction control issued by atomic blocks, not by the code under test
+_TRANSACTION = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO)')
+
+# A shape repeated this many times in one request is reported as an N+1
+REPEAT_THRESHOLD = 3
+
+
+def percentile(durations, fraction):
+    """Nearest-rank percentile of sorted durations, in milliseconds."""
+    index = max(math.ceil(len(durations) * fraction) - 1, 0)
+    return round(durations[index] * 1000, 3)
+
+
+def query_shape(sql: str) -> str:
+    """The SQL with IN lists and literal values replaced by placeholders."""
+    return _LITERAL.sub('?', _IN_LIST.sub('IN (?)', sql))
+
+
+class QueryLog:
+    """The queries captured while running a block of code."""
+
+    def __init__(self):
+        self.queries: List[str] = []
+
+    def __len__(self):
+        return len(self.queries)
+
+    def repeated(self, threshold: int = REPEAT_THRESHOLD) -> Dict[str, int]:
+        """Shapes issued at least `threshold` times, with their count."""
+        counts = Counter(query_shape(sql) for sql in self.queries)
+        return {
+            shape: count for shape, count in counts.items()
+            if count >= threshold
+        }
+
+    def describe(self) -> str:
+        return '\n'.join(
+            f'{i}. {sql}' for i, sql in enumerate(self.queries, 1))
+
+
+@contextmanager
+def query_budget(
+        budget: int, threshold: int = REPEAT_THRESHOLD,
+        label: str = 'block') -> Iterator[QueryLog]:
+    """
+    Fail when the block issues more than `budget` queries, or repeats a
+    query shape `threshold` times. Usable from pytest and unittest alike.
+
+    Args:
+        budget: Most queries the block may issue
+        threshold: Repetitions of one shape that count as an N+1
+        label: Name of the block in failure messages
+    """
+    log = QueryLog()
+    with CaptureQueriesContext(connection) as context:
+        yield log
+    log.queries = [
+        query['sql'] for query in context.captured_queries
+        if not _TRANSACTION.match(query['sql'])
+    ]
+
+    repeated = log.repeated(threshold)
+    if repeated:
+        shapes = '\n'.join(
+            f'{count}x {shape}' for shape, count in repeated.items())
+        raise AssertionError(
+            f'{label} repeats queries (N+1):\n{shapes}')
+    if len(log) > budget:
+        raise AssertionError(
+            f'{label} issued {len(log)} queries, over its budget of '
+            f'{budget}:\n{log.describe()}')
+
+
+def route_names(namespace: str) -> set:
+    """Names of every URL pattern under an application namespace."""
+    def walk(patterns, current):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(
+                    pattern.url_patterns, pattern.namespace or current)
+            elif pattern.name and current == namespace:
+                yield f'{namespace}:{pattern.name}'
+
+    return set(walk(get_resolver().url_patterns, None))
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin asserting the queries each route may issue.
+
+    `query_budgets` maps URL names to their budget. A key may be prefixed
+    with the HTTP method, as in 'POST social:feed-like', to override the
+    budget of one method.
+    """
+    query_budgets: Dict[str, int] = {}
+
+    def get_query_budget(self, method: str, view_name: str) -> int:
+        for key in (f'{method} {view_name}', view_name):
+            if key in self.query_budgets:
+                return self.query_budgets[key]
+        self.fail(f'No query budget declared for {method} {view_name}')
+
+    def assertQueryBudget(self, method: str, path: str, data=None, **extra):
+        """Request `path` and check it against the route's budget."""
+        method = method.upper()
+        view_name = resolve(urlsplit(path).path).view_name
+        budget = self.get_query_budget(method, view_name)
+        with query_budget(budget, label=f'{method} {view_name}'):
+            response = getattr(self.client, method.lower())(
+                path, data, **extra)
+        self.assertLess(
+            response.status_code, 400,
+            f'{method} {path} failed: {response.status_code}')
+        return response
+
+    def assertRoutesBudgeted(self, namespace: str):
+        """Every route of the namespace has a declared budget."""
+        budgeted = {key.split()[-1] for key in self.query_budgets}
+        missing = route_names(namespace) - budgeted
+        self.assertFalse(
+            missing, f'Routes without a query budget: {sorted(missing)}')
+
+
+def create_activity(viewer: User, size: int = 12) -> List[User]:
+    """
+    Multi-row fixture for query budget tests. Creates `size` users who,
+    like the viewer, each log `size` workouts and share one to the feed.
+    Everyone likes and comments on every post, and the viewer is notified
+    of it. `size` above the page size makes N+1 patterns show up.
+
+    Args:
+        viewer: User the requests are made as
+        size: Number of other users, and workouts per user
+
+    Returns:
+        list: The other users
+    """
+    users = []
+    for i in range(size):
+        user = User(username=f'{viewer.username}-friend{i}')
+        user.set_unusable_password()
+        user.save()
+        users.append(user)
+    everyone = [viewer] + users
+
+    today = timezone.now().date()
+    Workout.objects.bulk_create(
+        Workout(
+            owner=user,
+            title=f'Workout {day}',
+            workout_type=Workout.CARDIO,
+            duration=30,
+            intensity=Workout.MODERATE,
+            date_logged=today - timedelta(days=day),
+        )
+        for user in everyone for day in range(size)
+    )
+    posts = WorkoutPost.objects.bulk_create(
+        WorkoutPost(user=user, workout=user.workouts.first())
+        for user in everyone
+    )
+    Like.objects.bulk_create(
+        Like(user=user, post=post) for post in posts for user in everyone)
+    Comment.objects.bulk_create(
+        Comment(user=user, post=post, content='Nice work')
+        for post in posts for user in everyone)
+    Notification.objects.bulk_create(
+        Notification(
+            recipient=viewer, actor=user, post=posts[0], verb=verb)
+        for user in users
+        for verb in (Notification.LIKE, Notification.COMMENT)
+    )
+    return users
@@ -1,11 +1,77 @@
-from django.test import TestCase
+import gzip
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import jwt as pyjwt
+import msgpack
+from prometheus_client import REGISTRY
+from io import BytesIO, StringIO
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from dj_rest_auth.app_settings import api_settings as rest_auth_settings
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.utils import timezone
+from django.test import (
+    AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase
+)
+from rest_framework.exceptions import AuthenticationFailed, ParseError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth.models import User
+from social.models import Comment, Follow, Like, WorkoutPost
+from workouts.models import Workout
+from workouts import async_views as workouts_async_views
+from workouts.serializers import WorkoutSerializer
+from workouts.views import WorkoutViewSet
+from . import async_views, images
+from .authentication import get_token_user, local_auth_cache, remember_users
+from config import schema
+from .cache_backends import TwoTierCacheMixin
+from .compression import ENCODINGS, is_compressible, negotiate_encoding
+from .renderers import (
+    FastJSONParser, FastJSONRenderer, MessagePackParser, MessagePackRenderer
+)
+from .log import BackgroundHandler, JSONFormatter, SamplingFilter
+from .middleware import RateLimitMiddleware
+from .images import build_variants, default_profile_image_url
 from .models import UserProfile
+from .testing import (
+    QueryBudgetMixin, create_activity, query_budget, query_shape
+)
+from .utils import (
+    bulk_cache_update, cached_property_with_ttl, get_or_compute,
+    get_or_compute_many, invalidate_tags, tagged_key
+)
+from . import warmup
+from .tokens import (
+    RotatingTokenBackend, StatelessJWTAuthentication, TokenClaimsSerializer
+)
 from django.urls import reverse
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.storage import storages
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.exceptions import (
+    InvalidToken, TokenBackendError, TokenError
+)
+from rest_framework_simplejwt.tokens import RefreshToken
+from PIL import Image
 from unittest.mock import patch
 
 
@@ -13,7 +79,8 @@ class UserProfileModelTestCase(TestCase):
     """Tests for the UserProfile model"""
 
     def setUp(self):
-        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword")
 
     def test_user_profile_creation(self):
         profile = UserProfile.objects.get(user=self.user)
@@ -25,14 +92,16 @@ class UserProfileModelTestCase(TestCase):
         profile.date_of_birth = date.today() + timedelta(days=1)  # Future date
         with self.assertRaises(Exception) as e:
             profile.clean()
-        self.assertIn("Date of birth cannot be in the future.", str(e.exception))
+        self.assertIn(
+            "Date of birth cannot be in the future.", str(e.exception))
 
 
 class UserProfileAPITestCase(APITestCase):
     """Tests for the UserProfile API"""
 
     def setUp(self):
-        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword")
         self.client.force_authenticate(user=self.user)
         self.profile = UserProfile.objects.get(user=self.user)
 
@@ -48,3 +117,1318 @@ class UserProfileAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.profile.refresh_from_db()
         self.assertEqual(self.profile.bio, "Updated bio")
+
+
+class AsyncProfileStatsTestCase(TransactionTestCase):
+    """The async profile stats view must answer exactly like the viewset."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword")
+        self.profile = UserProfile.objects.get(user=self.user)
+        for days_ago in range(3):
+            Workout.objects.create(
+                owner=self.user, workout_type="cardio", duration=30,
+                date_logged=date.today() - timedelta(days=days_ago))
+
+    def test_stats_matches_viewset_for_anonymous_reader(self):
+        url = reverse("api:profile-stats", kwargs={"pk": self.profile.id})
+        request = AsyncRequestFactory().get(url)
+
+        async def auser():
+            return AnonymousUser()
+        request.auser = auser
+
+        response = async_to_sync(async_views.profile_stats)(
+            request, pk=self.profile.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        self.assertEqual(data, json.loads(self.client.get(url).content))
+        self.assertEqual(data["total_workouts"], 3)
+        self.assertEqual(data["current_streak"], 3)
+
+    def test_stats_negotiates_msgpack(self):
+        url = reverse("api:profile-stats", kwargs={"pk": self.profile.id})
+        request = AsyncRequestFactory().get(
+            url, headers={"Accept": "application/msgpack"})
+
+        async def auser():
+            return AnonymousUser()
+        request.auser = auser
+
+        response = async_to_sync(async_views.profile_stats)(
+            request, pk=self.profile.id)
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(
+            msgpack.unpackb(response.content),
+            json.loads(self.client.get(url).content))
+
+
+class UserProfileQueryCountTestCase(APITestCase):
+    """Profile endpoints must not issue a query per row"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+        Workout.objects.create(
+            owner=self.user, workout_type="cardio", duration=30)
+        Workout.objects.create(
+            owner=self.user, workout_type="strength", duration=45)
+
+    def _create_profiles(self, count):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user(
+                username=f"user{i}", password="testpassword")
+            Workout.objects.create(
+                owner=user, workout_type="cardio", duration=20)
+
+    def test_list_query_count_is_constant_per_page(self):
+        url = reverse("api:profile-list")
+        self._create_profiles(2)
+        with self.assertNumQueries(2):
+            small_page = self.client.get(url)
+        self._create_profiles(6)
+        with self.assertNumQueries(2):
+            full_page = self.client.get(url)
+        self.assertEqual(len(small_page.data["results"]), 3)
+        self.assertEqual(len(full_page.data["results"]), 9)
+
+    def test_list_includes_workouts_count(self):
+        response = self.client.get(reverse("api:profile-list"))
+        self.assertEqual(response.data["results"][0]["workouts_count"], 2)
+
+    def test_user_details_include_total_workouts(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("rest_user_details"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total_workouts"], 2)
+        self.assertEqual(response.data["profile"]["workouts_count"], 2)
+
+
+class ProfileImagePipelineTestCase(APITestCase):
+    """Tests for resizing profile image uploads into WebP variants"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+        self.profile = UserProfile.objects.get(user=self.user)
+
+    def _upload(self, size=(1000, 800)):
+        exif = Image.Exif()
+        exif[0x010F] = "TestCamera"  # Make
+        buffer = BytesIO()
+        Image.new("RGB", size, "red").save(buffer, "JPEG", exif=exif)
+        return SimpleUploadedFile(
+            "photo.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+    def test_upload_stores_resized_webp_variants(self):
+        url = reverse("api:profile-detail", kwargs={"pk": self.profile.id})
+        response = self.client.patch(
+            url, {"profile_image": self._upload()}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.profile.refresh_from_db()
+        variants = self.profile.profile_image_variants
+        self.assertEqual(set(variants), {"64", "240", "720"})
+        self.assertEqual(response.data["profile_image"], variants["240"])
+
+        storage = storages["profile_images"]
+        for size, variant_url in variants.items():
+            name = variant_url[len(storage.base_url):]
+            with Image.open(storage.path(name)) as image:
+                self.assertEqual(image.format, "WEBP")
+                self.assertEqual(image.size, (int(size), int(size)))
+                self.assertNotIn(0x010F, image.getexif())
+
+    def test_replaced_variants_are_deleted(self):
+        url = reverse("api:profile-detail", kwargs={"pk": self.profile.id})
+        self.client.patch(
+            url, {"profile_image": self._upload()}, format="multipart")
+        self.profile.refresh_from_db()
+        replaced = self.profile.profile_image_files
+        self.assertEqual(len(replaced), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                url, {"profile_image": self._upload()}, format="multipart")
+        self.profile.refresh_from_db()
+        storage = storages["profile_images"]
+        self.assertFalse(any(storage.exists(name) for name in replaced))
+        current = self.profile.profile_image_files
+        self.assertTrue(all(storage.exists(name) for name in current))
+
+    def test_oversized_upload_is_rejected(self):
+        url = reverse("api:profile-detail", kwargs={"pk": self.profile.id})
+        with patch.object(images, "MAX_PROFILE_IMAGE_PIXELS", 500 * 500), \
+                patch.object(images.Image.Image, "convert") as convert:
+            response = self.client.patch(
+                url, {"profile_image": self._upload()}, format="multipart")
+            with self.assertRaises(ValueError):
+                build_variants(self._upload())
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        convert.assert_not_called()
+
+    def test_small_upload_is_not_upscaled(self):
+        variants = build_variants(self._upload(size=(100, 120)))
+        with Image.open(BytesIO(variants[720])) as image:
+            self.assertEqual(image.size, (100, 100))
+
+    def test_profile_without_upload_uses_default_image(self):
+        url = reverse("api:profile-detail", kwargs={"pk": self.profile.id})
+        response = self.client.get(url)
+        self.assertEqual(
+            response.data["profile_image"], default_profile_image_url())
+
+
+class UserProfileStatsTestCase(APITestCase):
+    """Tests for the cached profile stats endpoint"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword")
+        self.other = User.objects.create_user(
+            username="otheruser", password="testpassword")
+        self.client.force_authenticate(user=self.other)
+        self.profile = UserProfile.objects.get(user=self.user)
+        self.url = reverse("api:profile-stats", kwargs={"pk": self.profile.id})
+        today = date.today()
+        for days_ago, workout_type in [
+                (0, "cardio"), (0, "strength"), (1, "cardio"), (3, "sports")]:
+            Workout.objects.create(
+                owner=self.user, workout_type=workout_type, duration=30,
+                date_logged=today - timedelta(days=days_ago))
+
+    def test_stats_values(self):
+        Follow.objects.create(follower=self.other, following=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total_workouts"], 4)
+        self.assertEqual(response.data["total_workout_time"], 120)
+        self.assertEqual(response.data["current_streak"], 2)
+        self.assertEqual(response.data["followers_count"], 1)
+        self.assertEqual(response.data["following_count"], 0)
+        self.assertEqual(response.data["workouts_by_type"], [
+            {"workout_type": "cardio", "count": 2},
+            {"workout_type": "sports", "count": 1},
+            {"workout_type": "strength", "count": 1},
+        ])
+
+    def test_cached_stats_cost_one_query(self):
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+    def test_workout_changes_invalidate_stats(self):
+        self.client.get(self.url)
+        Workout.objects.create(
+            owner=self.user, workout_type="cardio", duration=15)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["total_workouts"], 5)
+
+    def test_follow_toggle(self):
+        url = reverse("api:profile-follow", kwargs={"pk": self.profile.id})
+        self.assertEqual(self.client.post(url).data["status"], "followed")
+        self.assertEqual(self.client.get(self.url).data["followers_count"], 1)
+        self.assertEqual(self.client.post(url).data["status"], "unfollowed")
+        self.assertEqual(self.client.get(self.url).data["followers_count"], 0)
+
+    def test_cannot_follow_yourself(self):
+        own_profile = UserProfile.objects.get(user=self.other)
+        url = reverse("api:profile-follow", kwargs={"pk": own_profile.id})
+        self.assertEqual(
+            self.client.post(url).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_missing_profile_returns_404(self):
+        url = reverse("api:profile-stats", kwargs={"pk": 9999})
+        self.assertEqual(
+            self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CachedAuthenticationTestCase(APITestCase):
+    """Tests for cached token and session authentication"""
+
+    def setUp(self):
+        cache.clear()
+        local_auth_cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword")
+        self.token = Token.objects.create(user=self.user)
+        self.url = reverse("api:profile-list")
+
+    def get_auth_queries(self, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, **kwargs)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [
+            query["sql"] for query in queries
+            if "authtoken_token" in query["sql"]
+            or 'FROM "auth_user"' in query["sql"]
+        ]
+
+    def test_token_lookup_is_cached(self):
+        header = {"HTTP_AUTHORIZATION": f"Token {self.token.key}"}
+        self.assertEqual(len(self.get_auth_queries(**header)), 1)
+        self.assertEqual(self.get_auth_queries(**header), [])
+
+    def test_user_survives_the_redis_round_trip(self):
+        get_token_user(self.token.key)
+        local_auth_cache.clear()
+        user = get_token_user(self.token.key)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.date_joined, self.user.date_joined)
+        self.assertTrue(user.check_password("testpassword"))
+
+    def test_logout_revokes_cached_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.client.get(self.url)
+        self.client.post(reverse("rest_logout"))
+        self.assertEqual(
+            self.client.get(self.url).status_code,
+            status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_revokes_cached_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(
+            self.client.get(self.url).status_code,
+            status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_hash_is_not_cached(self):
+        get_token_user(self.token.key)
+        remember_users([self.user])
+        entry = cache.get(f"auth:user:{self.user.pk}")
+        self.assertIn(self.user.username, entry)
+        self.assertNotIn(self.user.password, entry)
+        self.assertNotIn(
+            self.user.password,
+            local_auth_cache.get(f"auth:user:{self.user.pk}"))
+
+    def test_password_change_refreshes_cached_user(self):
+        get_token_user(self.token.key)
+        self.user.set_password("newpassword")
+        self.user.save()
+        self.assertTrue(
+            get_token_user(self.token.key).check_password("newpassword"))
+
+    def test_session_user_is_cached(self):
+        self.client.login(username="testuser", password="testpassword")
+        self.get_auth_queries()
+        self.assertEqual(self.get_auth_queries(), [])
+
+
+class JWTAuthenticationTestCase(APITestCase):
+    """Tests for the stateless signed token mode"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword")
+
+    def test_login_issues_tokens_signed_with_key_id(self):
+        with patch.object(rest_auth_settings, "USE_JWT", True):
+            response = self.client.post(
+                reverse("rest_login"),
+                {"username": "testuser", "password": "testpassword"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["user"]["username"], "testuser")
+        header = pyjwt.get_unverified_header(response.data["access"])
+        self.assertEqual(header["kid"], next(iter(settings.JWT_SIGNING_KEYS)))
+        self.assertTrue(response.data["refresh"])
+
+    def test_access_token_is_verified_without_queries(self):
+        access = TokenClaimsSerializer.get_token(self.user).access_token
+        request = RequestFactory().get(
+            "/", HTTP_AUTHORIZATION=f"Bearer {access}")
+        with self.assertNumQueries(0):
+            user, _ = StatelessJWTAuthentication().authenticate(request)
+            self.assertEqual(
+                (user.pk, user.username), (self.user.pk, "testuser"))
+            self.assertTrue(user.is_authenticated)
+
+    def test_deactivated_and_demoted_users_are_rejected(self):
+        self.user.is_staff = True
+        self.user.save()
+        access = TokenClaimsSerializer.get_token(self.user).access_token
+        request = RequestFactory().get(
+            "/", HTTP_AUTHORIZATION=f"Bearer {access}")
+        user, _ = StatelessJWTAuthentication().authenticate(request)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.is_active and user.is_staff)
+
+        self.user.is_staff = False
+        self.user.save()
+        with self.assertRaises(InvalidToken):
+            StatelessJWTAuthentication().authenticate(request)
+
+        cache.clear()
+        self.user.is_active = False
+        inactive = TokenClaimsSerializer.get_token(self.user).access_token
+        request = RequestFactory().get(
+            "/", HTTP_AUTHORIZATION=f"Bearer {inactive}")
+        with self.assertRaises(AuthenticationFailed):
+            StatelessJWTAuthentication().authenticate(request)
+
+    def test_retired_keys_verify_until_removed(self):
+        old = RotatingTokenBackend({"old": "old-secret"}, algorithm="HS256")
+        token = old.encode({"user_id": self.user.pk})
+
+        rotated = RotatingTokenBackend(
+            {"new": "new-secret", "old": "old-secret"}, algorithm="HS256")
+        self.assertEqual(rotated.decode(token)["user_id"], self.user.pk)
+        self.assertEqual(
+            pyjwt.get_unverified_header(rotated.encode({}))["kid"], "new")
+
+        retired = RotatingTokenBackend(
+            {"new": "new-secret"}, algorithm="HS256")
+        with self.assertRaises(TokenBackendError):
+            retired.decode(token)
+
+    def test_password_change_revokes_refresh_tokens(self):
+        refresh = RefreshToken.for_user(self.user)
+        self.user.set_password("newpassword")
+        self.user.save()
+        with self.assertRaises(TokenError):
+            RefreshToken(str(refresh)).check_blacklist()
+
+    def test_profile_edits_keep_refresh_tokens(self):
+        refresh = RefreshToken.for_user(self.user)
+        self.user.email = "new@example.com"
+        self.user.save()
+        RefreshToken(str(refresh)).check_blacklist()
+
+
+class AsyncJWTAuthenticationTestCase(TransactionTestCase):
+    """The async views must accept every configured authentication"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword")
+
+    def test_async_views_accept_access_tokens(self):
+        access = TokenClaimsSerializer.get_token(self.user).access_token
+        url = reverse("workouts:workout-list")
+        jwt_classes = [
+            StatelessJWTAuthentication, *WorkoutViewSet.authentication_classes]
+        with patch.object(
+                WorkoutViewSet, "authentication_classes", jwt_classes):
+            request = AsyncRequestFactory().get(
+                url, headers={"Authorization": f"Bearer {access}"})
+            response = async_to_sync(workouts_async_views.workout_list)(
+                request)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            request = AsyncRequestFactory().get(url)
+            response = async_to_sync(workouts_async_views.workout_list)(
+                request)
+            self.assertEqual(
+                response.status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertTrue(response["WWW-Authenticate"].startswith("Bearer"))
+
+
+class GenerateDatasetTestCase(TestCase):
+    """Tests for the synthetic dataset command"""
+
+    def test_generates_related_rows_in_bulk(self):
+        call_command(
+            "generate_dataset", users=20, workouts=300, posts=40,
+            likes=3, comments=2, batch_size=50, seed=1, stdout=StringIO())
+
+        users = User.objects.filter(username__startswith="loadtest")
+        self.assertEqual(users.count(), 20)
+        self.assertEqual(
+            UserProfile.objects.filter(user__in=users).count(), 20)
+        self.assertEqual(Workout.objects.filter(owner__in=users).count(), 300)
+        posts = WorkoutPost.objects.filter(user__in=users)
+        self.assertEqual(posts.count(), 40)
+        self.assertFalse(posts.exclude(workout__owner=F("user")).exists())
+        self.assertTrue(Like.objects.filter(post__in=posts).exists())
+        self.assertTrue(Comment.objects.filter(post__in=posts).exists())
+        self.assertTrue(users[0].check_password("loadtest-password"))
+
+    def test_benchmark_writes_results(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.json")
+            call_command(
+                "benchmark", scale="1k", iterations=2, in_place=True,
+                output=path, stdout=StringIO())
+            with open(path) as f:
+                results = json.load(f)
+
+        self.assertEqual(results["workouts"], 1000)
+        self.assertEqual(set(results["cases"]), {
+            "workout_serializer", "workout_post_serializer",
+            "calculate_streaks", "current_streak", "statistics", "summary",
+            "feed_first_page", "feed_last_page", "render_workouts_stdlib",
+            "render_workouts_orjson", "render_feed_stdlib",
+            "render_feed_orjson",
+        })
+        feed = results["cases"]["feed_first_page"]
+        self.assertLessEqual(feed["p50_ms"], feed["p95_ms"])
+        self.assertEqual(feed["queries"], 5)
+        self.assertGreater(feed["peak_memory_kb"], 0)
+
+    def test_concurrency_benchmark_needs_a_request_per_path(self):
+        user = User.objects.create_user(username="loaded")
+        UserProfile.objects.get_or_create(user=user)
+        with self.assertRaisesMessage(
+                CommandError, "--requests must be at least 5"):
+            call_command(
+                "benchmark_concurrency", "loaded", requests=3,
+                stdout=StringIO())
+
+    def test_repeated_runs_add_new_users(self):
+        for _ in range(2):
+            call_command(
+                "generate_dataset", users=5, workouts=10, posts=0,
+                seed=1, stdout=StringIO())
+        self.assertEqual(
+            User.objects.filter(username__startswith="loadtest").count(), 10)
+
+
+@override_settings(
+    RATE_LIMIT_ENABLED=True,
+    RATE_LIMITS={
+        "read": "3/min", "write": "5/min", "profile-follow:write": "1/min",
+    },
+)
+class RateLimitTestCase(APITestCase):
+    """Tests for the sliding window rate limiter"""
+
+    def setUp(self):
+        cache.clear()
+        RateLimitMiddleware.fallback_store.clear()
+        self.url = reverse("api:profile-list")
+
+    def test_read_quota_returns_retry_after(self):
+        for _ in range(3):
+            self.assertEqual(
+                self.client.get(self.url).status_code, status.HTTP_200_OK)
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertTrue(1 <= int(response["Retry-After"]) <= 120)
+
+    def test_users_are_limited_separately_from_their_ip(self):
+        for _ in range(3):
+            self.client.get(self.url)
+        user = User.objects.create_user(
+            username="testuser", password="testpassword")
+        token = Token.objects.create(user=user)
+        response = self.client.get(
+            self.url, HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_route_quota_is_stricter_than_default(self):
+        user = User.objects.create_user(
+            username="testuser", password="testpassword")
+        other = User.objects.create_user(
+            username="otheruser", password="testpassword")
+        self.client.force_authenticate(user=user)
+        url = reverse("api:profile-follow", kwargs={"pk": other.profile.pk})
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.client.post(url).status_code,
+            status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_spoofed_forwarded_hops_share_the_client_quota(self):
+        rest_framework = {**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            for i in range(3):
+                self.client.get(
+                    self.url, HTTP_X_FORWARDED_FOR=f"10.0.0.{i}, 203.0.113.7")
+            response = self.client.get(
+                self.url, HTTP_X_FORWARDED_FOR="10.9.9.9, 203.0.113.7")
+            self.assertEqual(
+                response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            response = self.client.get(
+                self.url, HTTP_X_FORWARDED_FOR="203.0.113.8")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_falls_back_to_in_process_store(self):
+        with patch("api.middleware.cache") as broken_cache, \
+                self.assertLogs("api.middleware", "WARNING"):
+            broken_cache.incr.side_effect = ConnectionError
+            for _ in range(3):
+                self.assertEqual(
+                    self.client.get(self.url).status_code, status.HTTP_200_OK)
+            response = self.client.get(self.url)
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_previous_window_decays(self):
+        limiter = RateLimitMiddleware(lambda request: None)
+        with patch("api.middleware.time.time", return_value=60 * 1000 + 59):
+            for _ in range(3):
+                self.assertEqual(limiter.hit("ratelimit:test", 3, 60), 0)
+            self.assertGreater(limiter.hit("ratelimit:test", 3, 60), 0)
+        # Early in the next window most of the previous count still applies
+        with patch("api.middleware.time.time", return_value=60 * 1001 + 5):
+            self.assertGreater(limiter.hit("ratelimit:test", 3, 60), 0)
+        with patch("api.middleware.time.time", return_value=60 * 1001 + 30):
+            self.assertEqual(limiter.hit("ratelimit:test", 3, 60), 0)
+
+
+class ServerTimingTestCase(APITestCase):
+    """Tests for the Server-Timing breakdown"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse(
+            "api:profile-stats", kwargs={"pk": self.user.profile.pk})
+
+    def get_timings(self, response):
+        timings = {}
+        for entry in response["Server-Timing"].split(", "):
+            name, *params = entry.split(";")
+            timings[name] = dict(param.split("=", 1) for param in params)
+        return timings
+
+    def test_breakdown_counts_queries_and_cache_calls(self):
+        with CaptureQueriesContext(connection) as queries:
+            timings = self.get_timings(self.client.get(self.url))
+        self.assertEqual(
+            set(timings), {"db", "cache", "view", "render", "total"})
+        self.assertEqual(timings["db"]["desc"], f'"{len(queries)} queries"')
+        self.assertNotIn(" 0 misses", timings["cache"]["desc"])
+
+        timings = self.get_timings(self.client.get(self.url))
+        self.assertIn(" 0 misses", timings["cache"]["desc"])
+        self.assertGreater(float(timings["total"]["dur"]), 0)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_requests_are_logged_with_fields(self):
+        with self.assertLogs("api.middleware", "WARNING") as logs:
+            self.client.get(self.url)
+        record = logs.records[0]
+        self.assertGreater(record.db_queries, 0)
+        self.assertIn("view_ms", record.__dict__)
+        self.assertEqual(record.status_code, status.HTTP_200_OK)
+
+
+class MetricsEndpointTestCase(APITestCase):
+    """Tests for the Prometheus metrics endpoint"""
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_requests_are_labelled_by_view(self):
+        self.client.get(reverse("api:profile-list"))
+        self.client.get("/no-such-page/")
+        response = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape-secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn(
+            'django_http_request_duration_seconds_count'
+            '{method="GET",status="200",view="profile-list"}',
+            body)
+        self.assertIn('view="<unresolved>"', body)
+        self.assertIn(
+            'django_http_request_db_queries_bucket'
+            '{le="2.0",view="profile-list"}',
+            body)
+        self.assertIn("django_http_requests_in_flight", body)
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(
+            self.client.get(reverse("metrics")).status_code,
+            status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape-secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_TOKEN=None, DEBUG=False)
+    def test_hidden_without_a_token_outside_development(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(METRICS_TOKEN=None, DEBUG=True)
+    def test_open_without_a_token_in_development(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class LoggingPipelineTestCase(APITestCase):
+    """Tests for the background JSON logging pipeline"""
+
+    def make_record(self, **extra):
+        record = logging.LogRecord(
+            "api", logging.INFO, __file__, 1, "hello %s", ("world",), None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter_includes_extra_fields(self):
+        record = self.make_record(status_code=200, path="/api/")
+        data = json.loads(JSONFormatter().format(record))
+        self.assertEqual(data["message"], "hello world")
+        self.assertEqual(data["status_code"], 200)
+        self.assertEqual(data["path"], "/api/")
+        self.assertEqual(data["level"], "INFO")
+
+    def test_background_handler_writes_from_its_thread(self):
+        stream = StringIO()
+        handler = BackgroundHandler(stream)
+        handler.setFormatter(JSONFormatter())
+        handler.handle(self.make_record(view="feed-list"))
+        handler.flush_and_stop()
+        self.assertEqual(json.loads(stream.getvalue())["view"], "feed-list")
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        stream = StringIO()
+        handler = BackgroundHandler(stream, maxsize=1)
+        handler.setFormatter(JSONFormatter())
+        handler.flush_and_stop()
+        dropped = REGISTRY.get_sample_value("log_records_dropped_total") or 0
+        for _ in range(3):
+            handler.handle(self.make_record())
+        self.assertEqual(handler.dropped, 2)
+        self.assertEqual(
+            REGISTRY.get_sample_value("log_records_dropped_total"),
+            dropped + 2)
+
+        handler._start()
+        handler.flush_and_stop()
+        self.assertEqual(
+            json.loads(stream.getvalue().splitlines()[-1])["dropped"], 2)
+
+    def test_sampling_keeps_failures(self):
+        sampler = SamplingFilter({"feed-list": 0.0})
+        self.assertFalse(sampler.filter(
+            self.make_record(view="feed-list", status_code=200)))
+        self.assertTrue(sampler.filter(
+            self.make_record(view="feed-list", status_code=500)))
+        self.assertTrue(sampler.filter(
+            self.make_record(view="profile-list", status_code=200)))
+
+    def test_one_structured_line_per_request(self):
+        with self.assertLogs("api.requests", "INFO") as logs:
+            self.client.get(reverse("api:profile-list"))
+        self.assertEqual(len(logs.records), 1)
+        record = logs.records[0]
+        self.assertEqual(
+            (record.view, record.status_code), ("profile-list", 200))
+        self.assertGreaterEqual(record.duration_ms, 0)
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, APITestCase):
+    """Query budgets of the profile routes, and the budget helpers"""
+
+    query_budgets = {
+        "api:api-root": 0,
+        "api:profile-list": 2,
+        "api:profile-detail": 1,
+        "PATCH api:profile-detail": 2,
+        "api:profile-stats": 3,
+        "api:profile-follow": 3,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="testuser", password="testpassword")
+        cls.friends = create_activity(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+
+    def test_every_route_has_a_budget(self):
+        self.assertRoutesBudgeted("api")
+
+    def test_profiles(self):
+        url = reverse("api:profile-list")
+        response = self.assertQueryBudget("GET", url)
+        self.assertEqual(response.data["count"], 13)
+        self.assertQueryBudget("GET", f"{url}?page=2")
+        self.assertQueryBudget("GET", reverse("api:api-root"))
+
+        profile = self.user.profile
+        url = reverse("api:profile-detail", args=[profile.pk])
+        self.assertQueryBudget("GET", url)
+        self.assertQueryBudget("PATCH", url, {"bio": "Runner"})
+        self.assertQueryBudget(
+            "GET", reverse("api:profile-stats", args=[profile.pk]))
+
+        friend = self.friends[0].profile
+        self.assertQueryBudget(
+            "POST", reverse("api:profile-follow", args=[friend.pk]))
+
+    def test_query_shape_ignores_values(self):
+        self.assertEqual(
+            query_shape(
+                "SELECT * FROM t "
+                "WHERE id = 12 AND name = 'it''s' AND x IN (1, 2)"),
+            "SELECT * FROM t WHERE id = ? AND name = ? AND x IN (?)",
+        )
+
+    def test_repeated_shapes_fail_the_budget(self):
+        with self.assertRaisesMessage(AssertionError, "3x SELECT"):
+            with query_budget(10):
+                for friend in self.friends[:3]:
+                    User.objects.get(pk=friend.pk)
+        with self.assertRaisesMessage(AssertionError, "over its budget of 1"):
+            with query_budget(1):
+                list(User.objects.all())
+                list(Workout.objects.all())
+
+
+class ReplayTestCase(TransactionTestCase):
+    """Tests for replaying a JSONL request trace in-process"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword")
+        Workout.objects.create(
+            owner=self.user, workout_type="cardio", duration=30)
+
+    def test_replays_trace_and_reports_per_route(self):
+        lines = [
+            {"method": "get", "path": "/api/workouts/", "user": "testuser"},
+            {
+                "method": "GET", "path": "/api/workouts/summary/",
+                "user": "testuser",
+            },
+            {"method": "GET", "path": "/api/workouts/"},
+            {"request_id": "not a request"},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            trace = os.path.join(directory, "trace.jsonl")
+            output = os.path.join(directory, "results.json")
+            with open(trace, "w") as f:
+                f.write("\n".join(json.dumps(line) for line in lines))
+            call_command(
+                "replay", trace, concurrency=2, rate=200, repeat=3,
+                output=output, stdout=StringIO())
+            with open(output) as f:
+                results = json.load(f)
+
+        self.assertEqual(results["requests"], 9)
+        self.assertEqual(results["skipped_lines"], 1)
+        self.assertEqual(results["error_rate"], 0)
+        workouts = results["routes"]["GET workouts:workout-list"]
+        self.assertEqual(workouts["requests"], 6)
+        self.assertEqual(workouts["statuses"], {"200": 3, "401": 3})
+        self.assertEqual(
+            results["routes"]["GET workouts:workout-summary"]["requests"], 3)
+
+    def test_unknown_users_are_rejected(self):
+        trace = StringIO(
+            json.dumps({"method": "GET", "path": "/", "user": "nobody"}))
+        with patch("sys.stdin", trace):
+            with self.assertRaisesMessage(CommandError, "nobody"):
+                call_command("replay", "-", stdout=StringIO())
+
+
+class CachedComputationTestCase(TestCase):
+    """Tests for the stampede-safe cache helper"""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value=0):
+        self.calls += 1
+        return value
+
+    def test_falsy_values_are_hits(self):
+        for value in (None, 0):
+            cache.clear()
+            self.calls = 0
+            for _ in range(3):
+                self.assertEqual(
+                    get_or_compute("key", lambda: self.compute(value), 60),
+                    value)
+            self.assertEqual(self.calls, 1)
+
+    def test_cached_property_keeps_zero(self):
+        class Counter:
+            id = 1
+            runs = 0
+
+            @cached_property_with_ttl(60)
+            def total(self):
+                Counter.runs += 1
+                return 0
+
+        counter = Counter()
+        self.assertEqual((counter.total, counter.total), (0, 0))
+        self.assertEqual(Counter.runs, 1)
+
+    def test_expired_value_is_served_while_locked(self):
+        cache.set("key", ["stale", time.time() - 1, 0.1], 60)
+        cache.add("lock:key", 1, 30)
+        self.assertEqual(
+            get_or_compute("key", lambda: self.compute("new"), 60, 30),
+            "stale")
+        self.assertEqual(self.calls, 0)
+
+        cache.delete("lock:key")
+        self.assertEqual(
+            get_or_compute("key", lambda: self.compute("new"), 60, 30), "new")
+        self.assertEqual(
+            get_or_compute("key", lambda: self.compute("newer"), 60, 30),
+            "new")
+        self.assertEqual(self.calls, 1)
+        self.assertFalse(cache.has_key("lock:key"))
+
+    def test_concurrent_misses_compute_once(self):
+        def slow():
+            time.sleep(0.1)
+            return self.compute("value")
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            results = list(
+                pool.map(lambda _: get_or_compute("key", slow, 60), range(5)))
+        self.assertEqual(results, ["value"] * 5)
+        self.assertEqual(self.calls, 1)
+
+    def test_waits_for_another_process(self):
+        cache.add("lock:key", 1, 30)
+        threading.Timer(0.1, lambda: cache.set(
+            "key", ["theirs", time.time() + 60, 0.1], 60)).start()
+        self.assertEqual(
+            get_or_compute("key", lambda: self.compute("mine"), 60), "theirs")
+        self.assertEqual(self.calls, 0)
+
+
+class CacheTagsTestCase(TestCase):
+    """Tests for tag-versioned cache keys"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidating_a_tag_expires_its_keys(self):
+        key = tagged_key("post_stats:7", "user:42", "post:7")
+        cache.set(key, "cached")
+        self.assertEqual(tagged_key("post_stats:7", "user:42", "post:7"), key)
+        unrelated = tagged_key("profile", "user:43")
+
+        invalidate_tags("post:7")
+        self.assertNotEqual(
+            tagged_key("post_stats:7", "user:42", "post:7"), key)
+        self.assertEqual(tagged_key("profile", "user:43"), unrelated)
+
+    def test_versions_survive_eviction(self):
+        key = tagged_key("profile", "user:42")
+        cache.delete("version:user:42")
+        invalidate_tags("user:42")
+        self.assertNotEqual(tagged_key("profile", "user:42"), key)
+
+    def test_workout_changes_expire_stats(self):
+        user = User.objects.create_user(username="tagged", password="pass")
+        key = tagged_key("profile_stats", f"user:{user.pk}")
+        Workout.objects.create(
+            owner=user, workout_type="cardio", duration=30,
+            date_logged=date.today())
+        self.assertNotEqual(
+            tagged_key("profile_stats", f"user:{user.pk}"), key)
+
+
+class WarmCacheTestCase(APITestCase):
+    """Tests for bulk cache writes and the cache warm-up command"""
+
+    def setUp(self):
+        cache.clear()
+        local_auth_cache.clear()
+        self.user = User.objects.create_user(
+            username="active", password="pass")
+        self.token = Token.objects.create(user=self.user)
+        for days_ago in range(3):
+            Workout.objects.create(
+                owner=self.user, workout_type="cardio", duration=30,
+                date_logged=date.today() - timedelta(days=days_ago))
+
+    def test_bulk_cache_update_writes_once(self):
+        workouts = list(Workout.objects.select_related("owner"))
+        bulk_cache_update(workouts, WorkoutSerializer)
+        cached = cache.get_many(
+            [f"Workout_{workout.id}" for workout in workouts])
+        self.assertEqual(len(cached), 3)
+        self.assertEqual(cached[f"Workout_{workouts[0].id}"]["duration"], 30)
+
+    def test_compute_many_keeps_fresh_entries(self):
+        get_or_compute("fresh", lambda: "cached", 60)
+        values = get_or_compute_many(
+            {"fresh": lambda: "new", "missing": lambda: 0}, 60)
+        self.assertEqual(values, {"fresh": "cached", "missing": 0})
+        self.assertEqual(get_or_compute("missing", lambda: 1, 60), 0)
+
+    def test_warmed_requests_skip_the_database(self):
+        out = StringIO()
+        call_command("warm_cache", stdout=out)
+        self.assertIn("Warmed 1 users: 3 entries computed", out.getvalue())
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        for name in (
+                "workouts:workout-statistics", "workouts:workout-summary"):
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        call_command("warm_cache", stdout=out)
+        self.assertIn("0 entries computed, 3 already cached", out.getvalue())
+
+    def test_warmed_feed_is_served_from_the_cache(self):
+        WorkoutPost.objects.create(
+            user=self.user, workout=Workout.objects.first())
+        out = StringIO()
+        call_command("warm_cache", host="testserver", stdout=out)
+        self.assertIn("1 feed pages computed", out.getvalue())
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                reverse("social:feed-list"),
+                HTTP_ACCEPT_ENCODING=", ".join(ENCODINGS))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], ENCODINGS[0])
+
+        call_command("warm_cache", host="testserver", stdout=out)
+        self.assertIn("0 feed pages computed", out.getvalue())
+
+    def test_batches_read_tag_versions_once(self):
+        call_command("warm_cache", stdout=StringIO())
+        with patch.object(cache, "get_many", wraps=cache.get_many) as get_many:
+            call_command("warm_cache", stdout=StringIO())
+        # The users' tag versions, then their entries
+        self.assertEqual(get_many.call_count, 2)
+
+    def test_inactive_users_are_skipped(self):
+        Workout.objects.update(created_at=timezone.now() - timedelta(days=30))
+        out = StringIO()
+        call_command("warm_cache", days=7, stdout=out)
+        self.assertIn("Warmed 0 users", out.getvalue())
+
+
+class CompressionTestCase(APITestCase):
+    """Tests for response compression"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="reader", password="pass")
+        self.client.force_authenticate(user=self.user)
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding("gzip, deflate"), "gzip")
+        self.assertEqual(negotiate_encoding("*;q=0.5"), "gzip")
+        self.assertIsNone(negotiate_encoding("gzip;q=0, identity"))
+        self.assertIsNone(negotiate_encoding(""))
+
+    def test_large_responses_are_compressed_once(self):
+        Workout.objects.bulk_create(
+            Workout(
+                owner=self.user, workout_type="cardio", duration=30,
+                title=f"Run {i}")
+            for i in range(10))
+        url = reverse("workouts:workout-list")
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(
+            response["Content-Length"], str(len(response.content)))
+        self.assertEqual(
+            json.loads(gzip.decompress(response.content)),
+            self.client.get(url).json())
+
+    def test_html_and_no_transform_responses_are_sent_as_is(self):
+        response = self.client.get(
+            reverse("workouts:workout-list"), HTTP_ACCEPT="text/html",
+            HTTP_ACCEPT_ENCODING="gzip")
+        self.assertGreater(
+            len(response.content), settings.COMPRESSION_MIN_SIZE)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+        response = HttpResponse(b"{}" * 1024, content_type="application/json")
+        self.assertTrue(is_compressible(response))
+        response["Cache-Control"] = "private, no-transform"
+        self.assertFalse(is_compressible(response))
+
+    @override_settings(COMPRESSION_MIN_SIZE=10 ** 6)
+    def test_small_responses_are_sent_as_is(self):
+        response = self.client.get(
+            reverse("workouts:workout-list"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+
+class FastJSONTestCase(TestCase):
+    """Tests for the orjson renderer and parser"""
+
+    def test_renders_like_the_stock_renderer(self):
+        data = {
+            "created_at": datetime(2024, 5, 1, 12, 30, tzinfo=dt_timezone.utc),
+            "updated_at": datetime(
+                2024, 5, 1, 12, 30, 5, 123456, tzinfo=dt_timezone.utc),
+            "date_logged": date(2024, 5, 1),
+            "avg_duration": Decimal("42.50"),
+            "title": "Run \u2028 ☀",
+            "by_day": {1: [1, 2.5, None, True]},
+        }
+        self.assertEqual(
+            FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_non_finite_floats_are_written_as_null(self):
+        self.assertEqual(
+            FastJSONRenderer().render({"calories": float("nan")}),
+            b'{"calories":null}')
+
+    def test_indented_output_falls_back(self):
+        rendered = FastJSONRenderer().render(
+            {"a": 1}, "application/json; indent=2")
+        self.assertEqual(rendered, b'{\n  "a": 1\n}')
+
+    def test_parses_json(self):
+        parser = FastJSONParser()
+        self.assertEqual(
+            parser.parse(BytesIO('{"title": "☀"}'.encode())), {"title": "☀"})
+        with self.assertRaises(ParseError):
+            parser.parse(BytesIO(b"{"))
+
+
+class MessagePackTestCase(APITestCase):
+    """Tests for the MessagePack renderer and parser"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="mobile", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("workouts:workout-list")
+
+    def test_responses_match_json(self):
+        Workout.objects.create(
+            owner=self.user, workout_type="cardio", duration=30,
+            date_logged=date(2024, 5, 1))
+        response = self.client.get(self.url, HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        data = msgpack.unpackb(response.content)
+        self.assertEqual(data, self.client.get(self.url).json())
+        self.assertEqual(data["results"][0]["date_logged"], "2024-05-01")
+
+    def test_requests_are_parsed(self):
+        body = msgpack.packb({
+            "title": "Run", "workout_type": "cardio", "duration": 30,
+            "intensity": "moderate", "date_logged": "2024-05-01",
+        })
+        response = self.client.post(
+            self.url, body, content_type="application/msgpack")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(
+            Workout.objects.filter(owner=self.user, title="Run").exists())
+
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(BytesIO(b"\xc1"))
+
+    def test_values_are_encoded_like_json(self):
+        data = {
+            "created_at": datetime(
+                2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            "date_logged": date(2024, 5, 1),
+            "avg_duration": Decimal("42.50"),
+        }
+        self.assertEqual(msgpack.unpackb(MessagePackRenderer().render(data)), {
+            "created_at": "2024-05-01T12:30:15.123456Z",
+            "date_logged": "2024-05-01",
+            "avg_duration": 42.5,
+        })
+        self.assertEqual(
+            msgpack.unpackb(MessagePackRenderer().render(data)),
+            json.loads(JSONRenderer().render(data)))
+
+    def test_serialized_datetimes_pass_through(self):
+        workout = Workout.objects.create(
+            owner=self.user, workout_type="cardio", duration=30,
+            date_logged=date(2024, 5, 1))
+        url = reverse("workouts:workout-detail", kwargs={"pk": workout.pk})
+        data = msgpack.unpackb(
+            self.client.get(url, HTTP_ACCEPT="application/msgpack").content)
+        self.assertEqual(
+            data["created_at"], WorkoutSerializer(workout).data["created_at"])
+        self.assertEqual(data["date_logged"], "2024-05-01")
+
+
+class SchemaTestCase(TestCase):
+    """Tests for the pre-generated OpenAPI schema"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(OPENAPI_SCHEMA_DIR=self.directory)
+        self.settings.enable()
+        schema._documents.clear()
+        call_command("generate_schema", stdout=StringIO())
+
+    def tearDown(self):
+        self.settings.disable()
+        schema._documents.clear()
+
+    def test_schema_is_served_from_files(self):
+        with open(os.path.join(self.directory, "swagger.json"), "rb") as f:
+            generated = f.read()
+        url = reverse("schema-json", kwargs={"format": ".json"})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, generated)
+        self.assertIn("/api/workouts/", json.loads(response.content)["paths"])
+
+        etag = response["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), generated)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_docs_pages_load_the_served_schema(self):
+        response = self.client.get(reverse("swagger-ui"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(
+            reverse("schema-json", kwargs={"format": ".json"}),
+            response.content.decode())
+        self.assertEqual(
+            self.client.get(reverse("redoc")).status_code, status.HTTP_200_OK)
+
+    def test_api_requests_do_not_import_drf_yasg(self):
+        code = (
+            "import sys, django; django.setup();"
+            "from django.test import Client;"
+            "Client().get('/api/workouts/');"
+            "print(sorted("
+            "m for m in sys.modules if m.startswith('drf_yasg.')))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "config.settings"})
+        self.assertEqual(result.stdout.strip(), "[]", result.stderr)
+
+    def test_warm_up_never_generates_the_schema(self):
+        os.remove(os.path.join(self.directory, "swagger.yaml"))
+        schema._documents.clear()
+        self.addCleanup(setattr, warmup, "_process_warmed", True)
+        warmup._process_warmed = False
+        with patch.object(schema, "_generate_in_process") as generate, \
+                self.assertLogs("api.warmup", "WARNING"):
+            warmup.warm_process()
+        generate.assert_not_called()
+        self.assertIn((".json", None), schema._documents)
+
+
+class BrokerCache(TwoTierCacheMixin, LocMemCache):
+    """Two-tier cache over a shared LocMemCache, broadcasting in memory"""
+    subscribers = []
+
+    def _broadcast(self, message):
+        for tier in self.subscribers:
+            tier.apply(json.dumps(message))
+
+    def _start_listener(self, tier):
+        self.subscribers.append(tier)
+        tier.subscribed = True
+
+
+class TwoTierCacheTestCase(TestCase):
+    """Tests for the in-process cache tier"""
+
+    def setUp(self):
+        # Two processes sharing one cache: same location, separate tiers
+        self.caches = [
+            BrokerCache("two-tier-tests", {
+                "KEY_PREFIX": f"process{index}",
+                "OPTIONS": {"LOCAL_PREFIXES": ["version:"], "LOCAL_TTL": 60},
+            })
+            for index in range(2)
+        ]
+        for instance in self.caches:
+            instance.key_prefix = ""
+            instance.clear()
+
+    def test_writes_invalidate_other_processes(self):
+        first, second = self.caches
+        first.set("version:user:1", 1)
+        self.assertEqual(second.get("version:user:1"), 1)
+
+        first.incr("version:user:1")
+        self.assertEqual(second.get("version:user:1"), 2)
+        first.delete("version:user:1")
+        self.assertIsNone(second.get("version:user:1"))
+
+    def test_local_tier_serves_reads(self):
+        first, second = self.caches
+        first.set("version:user:1", 0)
+        self.assertEqual(second.get("version:user:1"), 0)
+
+        # Written behind the tier's back, as by a missed broadcast
+        LocMemCache.set(first, "version:user:1", 5)
+        self.assertEqual(second.get("version:user:1"), 0)
+        self.assertEqual(
+            second.get_many(["version:user:1", "other"]),
+            {"version:user:1": 0})
+
+    def test_other_keys_bypass_local_tier(self):
+        first, second = self.caches
+        first.set("other", [1])
+        self.assertEqual(second.get("other"), [1])
+        LocMemCache.set(first, "other", [2])
+        self.assertEqual(second.get("other"), [2])
+
+    def test_mutable_values_are_copied(self):
+        first, second = self.caches
+        first.set("version:list", [1])
+        second.get("version:list").append(2)
+        self.assertEqual(second.get("version:list"), [1])
+
+
+class WarmupTestCase(TestCase):
+    """Tests for the worker warm-up and the readiness probe"""
+
+    def setUp(self):
+        self.addCleanup(warmup.READY.set)
+        warmup.READY.clear()
+
+    def test_ready_once_warmed_up(self):
+        response = self.client.get(reverse("ready"))
+        self.assertEqual(
+            response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        with self.assertLogs("api.warmup", "INFO"):
+            warmup.warm_worker()
+        response = self.client.get(reverse("ready"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(response.json()["startup_ms"]),
+            {"urls", "caches", "serializers", "schema", "connections"})
+
+    def test_ready_without_a_worker_warm_up(self):
+        warmup.warm_process()
+        self.assertEqual(
+            self.client.get(reverse("ready")).status_code, status.HTTP_200_OK)
+
+    def test_each_request_thread_opens_connections(self):
+        threads = set()
+        with ThreadPoolExecutor(max_workers=3) as executor, patch.object(
+                warmup, "open_connections",
+                lambda: threads.add(threading.get_ident())), \
+                self.assertLogs("api.warmup", "INFO"):
+            warmup.warm_worker(executor, 3)
+        self.assertEqual(len(threads), 3)
+
+    def test_failing_stage_does_not_block_readiness(self):
+        with patch.object(
+                warmup, "open_connections", side_effect=OSError), \
+                self.assertLogs("api.warmup", "WARNING"):
+            warmup.warm_worker()
+        self.assertTrue(warmup.READY.is_set())
+
+    def test_routed_serializers_are_found(self):
+        serializers = {
+            view.serializer_class for view in warmup.iter_views()
+            if hasattr(view, "serializer_class")
+        }
+        self.assertIn(WorkoutSerializer, serializers)
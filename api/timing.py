@@ -0,0 +1,125 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django_redis.cache import RedisCache
+
+
+class RequestMetrics:
+    """Time spent in each layer while handling one request, in seconds"""
+
+    __slots__ = (
+        'db_count', 'db_time', 'cache_hits', 'cache_misses', 'cache_count',
+        'cache_time', 'view_start', 'view_end', 'render_end',
+    )
+
+    def __init__(self):
+        self.db_count = self.cache_hits = self.cache_misses = 0
+        self.cache_count = 0
+        self.db_time = self.cache_time = 0.0
+        self.view_start = self.view_end = self.render_end = None
+
+
+# Set by ServerTimingMiddleware for the duration of a request. Worker
+# threads started through asgiref inherit it, so concurrent queries of
+# the async views are counted too.
+current_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar(
+    'current_metrics', default=None)
+_in_cache_call: ContextVar[bool] = ContextVar('in_cache_call', default=False)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper counting queries against the current request"""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_count += 1
+        metrics.db_time += time.perf_counter() - start
+
+
+def _install_query_recorder(sender=None, connection=None, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install_query_recorder() -> None:
+    """Record queries on every connection, including ones opened later"""
+    connection_created.connect(
+        _install_query_recorder, dispatch_uid='api.timing.record_query')
+    for connection in connections.all(initialized_only=True):
+        _install_query_recorder(connection=connection)
+
+
+@contextmanager
+def _timed_cache_call():
+    """Time the outermost cache call; backends may call themselves"""
+    metrics = current_metrics.get()
+    if metrics is None or _in_cache_call.get():
+        yield None
+        return
+
+    token = _in_cache_call.set(True)
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics.cache_count += 1
+        metrics.cache_time += time.perf_counter() - start
+        _in_cache_call.reset(token)
+
+
+_MISSING = object()
+
+
+class TimedCacheMixin:
+    """Cache backend mixin reporting calls, hits and misses per request"""
+
+    def get(self, key, default=None, version=None, **kwargs):
+        with _timed_cache_call() as metrics:
+            value = super().get(key, _MISSING, version, **kwargs)
+            if metrics is not None:
+                if value is _MISSING:
+                    metrics.cache_misses += 1
+                else:
+                    metrics.cache_hits += 1
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None, **kwargs):
+        keys = list(keys)
+        with _timed_cache_call() as metrics:
+            values = super().get_many(keys, version, **kwargs)
+            if metrics is not None:
+                metrics.cache_hits += len(values)
+                metrics.cache_misses += len(keys) - len(values)
+        return values
+
+
+def _timed_method(name):
+    def method(self, *args, **kwargs):
+        with _timed_cache_call():
+            return getattr(super(TimedCacheMixin, self), name)(
+                *args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+for _name in (
+        'set', 'add', 'incr', 'decr', 'delete', 'set_many', 'delete_many',
+        'has_key', 'touch'):
+    setattr(TimedCacheMixin, _name, _timed_method(_name))
+
+
+class TimedRedisCache(TimedCacheMixin, RedisCache):
+    pass
+
+
+class TimedLocMemCache(TimedCacheMixin, LocMemCache):
+    pass
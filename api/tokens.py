@@ -0,0 +1,144 @@
+import math
+import time
+from typing import Any, Dict
+import jwt
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import (
+    InvalidToken, TokenBackendError
+)
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken, OutstandingToken
+)
+
+
+class RotatingTokenBackend(TokenBackend):
+    """
+    Token backend that signs with the newest key and names it in the
+    ``kid`` header. Tokens signed with any key still listed keep
+    verifying, so a key can be retired once its tokens have expired.
+    """
+
+    def __init__(self, keys: Dict[str, str], **kwargs):
+        self.keys = keys
+        self.kid = next(iter(keys))
+        super().__init__(signing_key=keys[self.kid], **kwargs)
+
+    def encode(self, payload: Dict[str, Any]) -> str:
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload['aud'] = self.audience
+        if self.issuer is not None:
+            jwt_payload['iss'] = self.issuer
+
+        return jwt.encode(
+            jwt_payload,
+            self.signing_key,
+            algorithm=self.algorithm,
+            headers={'kid': self.kid},
+            json_encoder=self.json_encoder,
+        )
+
+    def get_verifying_key(self, token: str) -> str:
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+        except jwt.InvalidTokenError as ex:
+            raise TokenBackendError(_('Token is invalid or expired')) from ex
+        if kid not in self.keys:
+            raise TokenBackendError(_('Token is invalid or expired'))
+        return self.keys[kid]
+
+
+def build_token_backend() -> RotatingTokenBackend:
+    """Token backend for the keys in settings.JWT_SIGNING_KEYS"""
+    return RotatingTokenBackend(
+        settings.JWT_SIGNING_KEYS,
+        algorithm=api_settings.ALGORITHM,
+        audience=api_settings.AUDIENCE,
+        issuer=api_settings.ISSUER,
+        leeway=api_settings.LEEWAY,
+        json_encoder=api_settings.JSON_ENCODER,
+    )
+
+
+# User fields carried in access tokens, which permissions read
+USER_CLAIMS = ('username', 'is_active', 'is_staff')
+
+
+def _revoked_key(user_id):
+    return f'jwt_revoked:{user_id}'
+
+
+class TokenClaimsSerializer(TokenObtainPairSerializer):
+    """Adds the claims stateless authentication builds the user from."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the signed claims instead of loading
+    the user, after one cache read for revoked tokens. Fields not carried
+    in the token load on first access.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification'))
+
+        claims = {'id': user_id}
+        for claim in USER_CLAIMS:
+            if claim in validated_token:
+                claims[claim] = validated_token[claim]
+        if not claims.get('is_active', True):
+            raise AuthenticationFailed(
+                _('User is inactive'), code='user_inactive')
+        revoked_at = cache.get(_revoked_key(user_id))
+        if revoked_at is not None and \
+                validated_token.get('iat', 0) < revoked_at:
+            raise InvalidToken(_('Token is invalid or expired'))
+        return User.from_db(
+            DEFAULT_DB_ALIAS, list(claims), list(claims.values()))
+
+
+def revoke_access_tokens(user_id: int) -> None:
+    """
+    Reject the access tokens a user was issued until now. Remembered for
+    as long as those tokens would stay valid.
+    Args:
+        user_id: Primary key of the user to sign out everywhere
+    """
+    # Tokens carry whole seconds, so the current one is included
+    cache.set(
+        _revoked_key(user_id), math.ceil(time.time()),
+        int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()))
+
+
+def revoke_refresh_tokens(user_id: int) -> None:
+    """
+    Blacklist every outstanding refresh token of a user
+    Args:
+        user_id: Primary key of the user to sign out everywhere
+    """
+    outstanding = OutstandingToken.objects.filter(
+        user_id=user_id, blacklistedtoken__isnull=True)
+    BlacklistedToken.objects.bulk_create(
+        [BlacklistedToken(token=token) for token in outstanding],
+        ignore_conflicts=True
+    )
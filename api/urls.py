@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import UserProfileViewSet
@@ -7,6 +8,19 @@ router.register(r'profiles', UserProfileViewSet, basename='profile')
 
 app_name = 'api'
 
-urlpatterns = [
+urlpatterns = []
+
+if settings.ASGI_MODE:
+    from . import async_views
+
+    # Shadow the profile stats endpoint with its async version, under the
+    # same name
+    urlpatterns += [
+        path(
+            'profiles/<int:pk>/stats/', async_views.profile_stats,
+            name='profile-stats'),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
@@ -1,9 +1,19 @@
+import base64
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
 from functools import wraps
 from django.core.cache import cache
-from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
 import logging
+import math
+import random
+import threading
 import time
 from typing import Any, Callable, TypeVar, cast
+from .compression import compress, negotiate_encoding
 
 logger = logging.getLogger(__name__)
 
@@ -20,13 +30,8 @@ def cached_property_with_ttl(ttl: int = 300):
         @wraps(func)
         def wrapper(self, *args, **kwargs) -> Any:
             cache_key = f'{self.__class__.__name__}_{self.id}_{func.__name__}'
-            result = cache.get(cache_key)
-
-            if result is None:
-                result = func(self, *args, **kwargs)
-                cache.set(cache_key, result, ttl)
-
-            return result
+            return get_or_compute(
+                cache_key, lambda: func(self, *args, **kwargs), ttl)
         return property(wrapper)
     return decorator
 
@@ -50,51 +55,390 @@ def measure_execution_time(func: Callable) -> Callable:
     return wrapper
 
 
-def bulk_cache_update(objects: list, serializer_class: Any) -> None:
+def bulk_cache_update(objects: list, serializer_class: Any,
+                      timeout: int = 60 * 15) -> None:
     """
-    Bulk update cache for multiple objects
+    Bulk update cache for multiple objects, serializing them together
+    and writing them in one round trip
     Args:
         objects: List of objects to cache
         serializer_class: Serializer class to use for serialization
+        timeout: Cache timeout in seconds
+    """
+    data = serializer_class(objects, many=True).data
+    cache.set_many({
+        f'{obj.__class__.__name__}_{obj.id}': item
+        for obj, item in zip(objects, data)
+    }, timeout=timeout)
+
+
+# Tag versions resolved by resolved_tag_versions, by tag
+_resolved_versions: ContextVar[dict] = ContextVar(
+    'resolved_tag_versions', default={})
+
+
+def get_tag_versions(tags: list) -> list:
+    """
+    Get the current versions of cache tags in one round trip
+    Args:
+        tags: Tags the cached values depend on, e.g. ['user:42', 'post:7']
+    """
+    keys = [f'version:{tag}' for tag in tags]
+    versions = cache.get_many(keys)
+    # Seeded from the clock so an evicted version never resurrects old keys
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        for key, version in missing.items():
+            cache.add(key, version, None)
+        # Another process may have seeded the same tags first
+        versions.update(cache.get_many(list(missing)))
+    return [versions.get(key, missing.get(key)) for key in keys]
+
+
+@contextmanager
+def resolved_tag_versions(tags):
+    """
+    Get the versions of many tags in one round trip, for the keys that
+    tagged_key builds inside the block
+    Args:
+        tags: Tags the keys depend on, e.g. ['user:42', 'user:43']
+    """
+    tags = list(tags)
+    token = _resolved_versions.set(dict(zip(tags, get_tag_versions(tags))))
+    try:
+        yield
+    finally:
+        _resolved_versions.reset(token)
+
+
+def tagged_key(key: str, *tags: str) -> str:
+    """
+    Build a cache key that expires when any of its tags is invalidated
+    Args:
+        key: Cache key identifying the value
+        tags: Tags the value depends on, e.g. 'user:42'
     """
-    with transaction.atomic():
-        for obj in objects:
-            cache_key = f'{obj.__class__.__name__}_{obj.id}'
-            serializer = serializer_class(obj)
-            cache.set(cache_key, serializer.data, timeout=60*15)
+    resolved = _resolved_versions.get()
+    unresolved = [tag for tag in tags if tag not in resolved]
+    if unresolved:
+        resolved = {
+            **resolved, **dict(zip(unresolved, get_tag_versions(unresolved)))
+        }
+    versions = '.'.join(str(resolved[tag]) for tag in tags)
+    return f'{key}:{versions}'
 
 
-def clear_cache_pattern(pattern: str) -> None:
+def invalidate_tags(*tags: str) -> None:
     """
-    Clear all cache keys matching a pattern
+    Expire every key built with the current version of any of the tags,
+    in one write per tag and without looking the keys up
     Args:
-        pattern: Pattern to match cache keys
+        tags: Tags to invalidate, e.g. 'user:42'
+    """
+    for tag in tags:
+        try:
+            cache.incr(f'version:{tag}')
+        except ValueError:
+            cache.set(f'version:{tag}', time.time_ns(), None)
+
+
+# Computations in progress in this process, by cache key
+_in_flight: dict = {}
+_in_flight_lock = threading.Lock()
+
+# How often a process waiting for another one's computation checks for it
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _single_flight(key: str, func: Callable[[], T]) -> T:
+    """
+    Run func once per key at a time in this process. Threads asking for
+    the same key meanwhile wait and share its result or exception.
+    """
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+    if not leader:
+        return future.result()
+
+    try:
+        result = func()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+
+
+def _compute_entry(compute: Callable[[], T], ttl: int) -> list:
+    # The value, when it stops being fresh and how long it took
+    start = time.perf_counter()
+    value = compute()
+    elapsed = time.perf_counter() - start
+    return [value, time.time() + ttl, round(elapsed, 4)]
+
+
+def _is_entry(entry: Any) -> bool:
+    # Anything else is a value cached before this format, so a miss
+    return isinstance(entry, list) and len(entry) == 3
+
+
+def _compute_and_store(
+        key: str, compute: Callable[[], T], ttl: int, stale_ttl: int) -> T:
+    entry = _compute_entry(compute, ttl)
+    cache.set(key, entry, ttl + stale_ttl)
+    return entry[0]
+
+
+def _fill(key: str, compute: Callable[[], T], ttl: int, stale_ttl: int,
+          lock_timeout: int) -> T:
+    """Compute a missing value, or wait for the process computing it."""
+    lock_key = f'lock:{key}'
+    if cache.add(lock_key, 1, lock_timeout):
+        try:
+            return _compute_and_store(key, compute, ttl, stale_ttl)
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if isinstance(entry, list):
+            return entry[0]
+        if not cache.has_key(lock_key):
+            # The other computation failed, so do it here
+            break
+    return _compute_and_store(key, compute, ttl, stale_ttl)
+
+
+def get_or_compute(
+        key: str, compute: Callable[[], T], ttl: int, stale_ttl: int = 0,
+        lock_timeout: int = 30, beta: float = 1.0) -> T:
+    """
+    Get a cached computation, computing it once however many requests
+    ask for it at the same time. A cached None or 0 is a hit.
+
+    Fresh values are recomputed early with a probability that grows as
+    they near expiry and with how long they take to compute. Expired
+    values are served for another stale_ttl seconds while the one caller
+    holding the key's lock recomputes. On a miss, threads of this
+    process share one computation and other processes wait for it.
+    Args:
+        key: Cache key, versioned by the caller
+        compute: Function returning a cacheable value
+        ttl: Seconds the value is fresh
+        stale_ttl: Seconds an expired value may still be served
+        lock_timeout: Longest a computation may hold the key's lock
+        beta: Eagerness of early recomputation; 0 disables it
+    """
+    entry = cache.get(key)
+    if _is_entry(entry):
+        value, fresh_until, compute_time = entry
+        # -log(U) is exponentially distributed, so few callers go early
+        early = -compute_time * beta * math.log(1 - random.random())
+        if time.time() + early < fresh_until:
+            return value
+        if not cache.add(f'lock:{key}', 1, lock_timeout):
+            return value
+        try:
+            return _single_flight(
+                key,
+                lambda: _compute_and_store(key, compute, ttl, stale_ttl))
+        finally:
+            cache.delete(f'lock:{key}')
+
+    return _single_flight(
+        key, lambda: _fill(key, compute, ttl, stale_ttl, lock_timeout))
+
+
+def get_or_compute_many(
+        computations: dict, ttl: int, stale_ttl: int = 0) -> dict:
+    """
+    Get many cached computations in one read, computing the missing and
+    expired ones and storing them in one write. Nothing is locked, so
+    it suits jobs that run alone, such as warming the cache.
+    Args:
+        computations: Functions returning cacheable values, by cache key
+        ttl: Seconds the values are fresh
+        stale_ttl: Seconds expired values may still be served
+    """
+    entries = cache.get_many(list(computations))
+    now = time.time()
+    values, computed = {}, {}
+    for key, compute in computations.items():
+        entry = entries.get(key)
+        if not (_is_entry(entry) and entry[1] > now):
+            entry = computed[key] = _compute_entry(compute, ttl)
+        values[key] = entry[0]
+    if computed:
+        cache.set_many(computed, ttl + stale_ttl)
+    return values
+
+
+class LocalTTLCache:
+    """
+    Small thread-safe in-process LRU whose entries also expire
+    Args:
+        maxsize: Number of entries kept before evicting the oldest
+        ttl: Seconds an entry stays valid
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+def get_response_cache_key(request, key_prefix: str, tags=()):
+    """
+    Key of the cached response to a request, and the encoding its body
+    is stored in
+    Args:
+        request: DRF request, after content negotiation
+        key_prefix: Prefix for cache key
+        tags: Tags that expire the response
+    """
+    encoding = negotiate_encoding(
+        request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    cache_key = (
+        f"{key_prefix}:{request.path}:"
+        f"{request.query_params.urlencode()}:{request.user.id}:"
+        f"{request.accepted_media_type}:{encoding or 'identity'}"
+    )
+    if tags:
+        cache_key = tagged_key(cache_key, *tags)
+    return cache_key, encoding
+
+
+def _encoded(response: HttpResponse, encoding) -> HttpResponse:
+    if encoding is not None:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def get_cached_response(cache_key: str, encoding):
+    """
+    The cached response stored under a key, or None, also when a tag it
+    depends on was invalidated since it was stored
+    Args:
+        cache_key: Key from get_response_cache_key
+        encoding: Encoding from get_response_cache_key
+    """
+    entry = cache.get(cache_key)
+    if entry is None:
+        return None
+    content_type, body, *dependencies = entry
+    if dependencies and dependencies[0]:
+        versions = dependencies[0]
+        if get_tag_versions(list(versions)) != list(versions.values()):
+            return None
+    return _encoded(
+        HttpResponse(base64.b64decode(body), content_type=content_type),
+        encoding)
+
+
+def cache_rendered_response(
+        cache_key: str, response: HttpResponse, encoding, timeout: int,
+        dependencies=()) -> HttpResponse:
+    """
+    Compress a rendered response once, cache it and return it
+    Args:
+        cache_key: Key from get_response_cache_key
+        response: Rendered response
+        encoding: Encoding from get_response_cache_key
+        timeout: Cache timeout in seconds
+        dependencies: Further tags that expire the response, only known
+            once it was computed
     """
-    keys = cache.keys(pattern)
-    if keys:
-        cache.delete_many(keys)
+    if encoding is not None:
+        response.content = compress(response.content, encoding, cached=True)
+    entry = [
+        response['Content-Type'],
+        base64.b64encode(response.content).decode(),
+    ]
+    if dependencies:
+        # Read after computing, so an invalidation in between goes
+        # unnoticed until the entry times out
+        dependencies = list(dependencies)
+        entry.append(dict(zip(dependencies, get_tag_versions(dependencies))))
+    cache.set(cache_key, entry, timeout)
+    return _encoded(response, encoding)
 
 
-def cache_response(timeout: int = 300, key_prefix: str = ''):
+def cache_response(timeout: int = 300, key_prefix: str = '',
+                   tags: Callable = None, depends_on: Callable = None):
     """
-    Decorator to cache view responses
+    Decorator to cache the rendered responses of viewset actions. Bodies
+    are stored compressed in the encoding negotiated with the client,
+    one entry per encoding, and served as stored without recompressing
     Args:
         timeout: Cache timeout in seconds
         key_prefix: Prefix for cache key
+        tags: Function of the view's arguments returning the tags that
+            expire the response, e.g. lambda request, pk: [f'post:{pk}']
+        depends_on: Function of the response data returning further tags
+            that expire it, e.g. those of the posts on a page. Entries
+            are checked against them when read.
     """
     def decorator(func):
         @wraps(func)
         def wrapper(self, request, *args, **kwargs):
-            cache_key = (
-                f"{key_prefix}:{request.path}:"
-                f"{request.query_params}:{request.user.id}"
-            )
-            response = cache.get(cache_key)
+            # The browsable API embeds a per-user CSRF token
+            if request.accepted_renderer.format == 'api':
+                return func(self, request, *args, **kwargs)
 
-            if response is None:
-                response = func(self, request, *args, **kwargs)
-                cache.set(cache_key, response, timeout)
+            cache_key, encoding = get_response_cache_key(
+                request, key_prefix,
+                tags(request, *args, **kwargs) if tags is not None else ())
+            response = get_cached_response(cache_key, encoding)
+            if response is not None:
+                return response
 
-            return response
+            response = func(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            response.render()
+            return cache_rendered_response(
+                cache_key, response, encoding, timeout,
+                depends_on(response.data) if depends_on is not None else ())
         return wrapper
     return decorator
@@ -1,17 +1,24 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Count, Sum
-from django.utils import timezone
-from datetime import timedelta
+from dj_rest_auth.views import UserDetailsView
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.contrib.auth.models import User
+from django.db.models import Count
+from .metrics import render_metrics
 from .models import UserProfile
 from .serializers import UserProfileSerializer
-from workouts.models import Workout
+from .stats import get_profile_stats, with_follow_counts
+from .warmup import READY, timings
+from social.models import Follow
 from config.permissions import IsOwnerOrReadOnly
 
 
 class UserProfileViewSet(viewsets.ModelViewSet):
-    queryset = UserProfile.objects.all()
+    queryset = UserProfile.objects.select_related('user').annotate(
+        workouts_count=Count('user__workouts')).order_by('-created_at')
     serializer_class = UserProfileSerializer
     permission_classes = [
             permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
@@ -25,78 +32,82 @@ class UserProfileViewSet(viewsets.ModelViewSet):
             )
         serializer.save(user=self.request.user)
 
+    def get_queryset(self):
+        if self.action == 'stats':
+            return with_follow_counts(UserProfile.objects.all())
+        return super().get_queryset()
+
     @action(detail=True, methods=['GET'])
     def stats(self, request, pk=None):
         """Get user profile statistics."""
-        try:
-            profile = self.get_object()
-
-            # Get the start of the current week
-            today = timezone.now().date()
-            week_start = today - timedelta(days=today.weekday())
-
-            # Get user's workouts
-            user_workouts = Workout.objects.filter(owner=profile.user)
-
-            # Calculate weekly workouts
-            weekly_workouts = user_workouts.filter(
-                date_logged__gte=week_start
-            ).count()
-
-            # Calculate total workout time
-            total_time = user_workouts.aggregate(
-                total=Sum('duration')
-            )['total'] or 0
-
-            # Calculate streak
-            streak = self.calculate_streak(user_workouts)
-
-            stats = {
-                'total_workouts': user_workouts.count(),
-                'workouts_this_week': weekly_workouts,
-                'total_workout_time': total_time,
-                'current_streak': streak,
-                'workouts_by_type': self.get_workouts_by_type(user_workouts),
-                'followers_count': 0,  # Implement if needed
-                'following_count': 0,  # Implement if needed
-            }
-
-            return Response(stats)
-        except UserProfile.DoesNotExist:
-            return Response(
-                {'error': 'Profile not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        except Exception as e:
+        profile = self.get_object()
+        return Response(get_profile_stats(profile))
+
+    @action(
+        detail=True, methods=['POST'],
+        permission_classes=[permissions.IsAuthenticated])
+    def follow(self, request, pk=None):
+        """Toggle following the profile's user."""
+        profile = self.get_object()
+        if profile.user_id == request.user.id:
             return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'You cannot follow yourself'},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-    def calculate_streak(self, workouts):
-        """Calculate the current workout streak."""
-        if not workouts.exists():
-            return 0
-
-        # Get dates of workouts in descending order
-        workout_dates = workouts.order_by('-date_logged') \
-            .values_list('date_logged', flat=True)
-
-        current_streak = 1
-        current_date = workout_dates[0]
-
-        # Check consecutive days
-        for date in workout_dates[1:]:
-            if current_date - date == timedelta(days=1):
-                current_streak += 1
-                current_date = date
-            else:
-                break
-
-        return current_streak
-
-    def get_workouts_by_type(self, workouts):
-        """Get workout count by type."""
-        return workouts.values('workout_type') \
-            .annotate(count=Count('id')) \
-            .order_by('workout_type')
+        follow, created = Follow.objects.get_or_create(
+            follower=request.user,
+            following_id=profile.user_id
+        )
+        if not created:
+            follow.delete()
+            return Response({'status': 'unfollowed'})
+
+        return Response({'status': 'followed'})
+
+
+class UserInfoView(UserDetailsView):
+    """dj-rest-auth user endpoint, loaded with its profile in one query."""
+
+    def get_object(self):
+        user = User.objects.select_related('profile').annotate(
+            total_workouts=Count('workouts')
+        ).get(pk=self.request.user.pk)
+
+        # The nested profile shares the user's workout count
+        if hasattr(user, 'profile'):
+            user.profile.workouts_count = user.total_workouts
+        return user
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint, behind METRICS_TOKEN. Without a token it is
+    only served in development, and is a 404 everywhere else.
+    """
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            raise Http404
+    elif not constant_time_compare(
+            request.headers.get('Authorization', ''),
+            f'Bearer {settings.METRICS_TOKEN}'):
+        return HttpResponse(status=401)
+
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
+
+
+def ready(request):
+    """
+    Readiness probe: 503 while this process warms up, then 200 with the
+    time each warm-up stage took.
+    """
+    if not READY.is_set():
+        return JsonResponse({'status': 'starting'}, status=503)
+    return JsonResponse({
+        'status': 'ready',
+        'startup_ms': {
+            name: round(duration * 1000, 1)
+            for name, duration in timings.items()
+        },
+    })
@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.urls import URLResolver, get_resolver, reverse
+from .compression import ENCODINGS
+from .metrics import STARTUP_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Cleared while this process warms up. A process whose server runs no
+# warm-up, such as runserver or a bare uvicorn, is ready from the start.
+READY = threading.Event()
+READY.set()
+# Seconds spent in each stage, in order
+timings = {}
+
+# Longest a request thread waits for the others to pick up their share
+THREAD_TIMEOUT = 30
+
+_process_warmed = False
+_lock = threading.Lock()
+
+
+@contextmanager
+def _stage(name):
+    """Time a warm-up stage. A failing stage is logged and skipped."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        logger.warning('Warm-up stage %s failed', name, exc_info=True)
+    duration = time.perf_counter() - start
+    timings[name] = duration
+    STARTUP_DURATION.labels(name).set(duration)
+
+
+def iter_views(patterns=None):
+    """Every view class routed by the URLconf, with duplicates."""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_views(pattern.url_patterns)
+        else:
+            view = getattr(pattern.callback, 'cls', None)
+            if view is not None:
+                yield view
+
+
+def build_fields(serializer):
+    """Build a serializer's fields and those of the ones it nests."""
+    for field in serializer.fields.values():
+        field = getattr(field, 'child', field)
+        if hasattr(field, 'fields'):
+            build_fields(field)
+
+
+def warm_process():
+    """
+    Do the work every process pays for on its first requests: populate
+    the URL resolvers, which imports every view, create the cache
+    backends, build every routed serializer's fields and load the
+    generated API schema. Opens no connection, so it can run in the
+    gunicorn master before workers fork and share its result. The
+    process is ready once it returns.
+    """
+    READY.clear()
+    _warm_process()
+    READY.set()
+
+
+def _warm_process():
+    global _process_warmed
+    with _lock:
+        if _process_warmed:
+            return
+        _process_warmed = True
+
+        with _stage('urls'):
+            reverse('api-root')
+        with _stage('caches'):
+            for alias in settings.CACHES:
+                caches[alias]
+        with _stage('serializers'):
+            for serializer_class in {
+                    getattr(view, 'serializer_class', None)
+                    for view in iter_views()} - {None}:
+                build_fields(serializer_class())
+        with _stage('schema'):
+            # Only the generated files: generating would import drf_yasg
+            from config.schema import FORMATS, get_document
+            if None in [
+                    get_document(format, encoding, generate=False)
+                    for format in FORMATS
+                    for encoding in (None, *ENCODINGS)]:
+                logger.warning(
+                    'OpenAPI schema files missing from %s, run '
+                    'generate_schema. The first schema request generates '
+                    'them in process.', settings.OPENAPI_SCHEMA_DIR)
+
+        # Forked workers must not share a connection
+        connections.close_all()
+
+
+def open_connections():
+    """
+    Open the calling thread's database connections and the cache
+    connection pools, and subscribe two-tier caches to invalidations.
+    """
+    for connection in connections.all():
+        connection.ensure_connection()
+    for alias in settings.CACHES:
+        cache = caches[alias]
+        cache.get('warmup')
+        getattr(cache, 'tier', None)
+
+
+def warm_worker(executor=None, threads=1):
+    """
+    Warm a worker once it has forked, then mark it ready. Database
+    connections belong to a thread, so each request thread opens its own.
+    Args:
+        executor: Thread pool requests run on, if not the calling thread
+        threads: Threads of that pool
+    """
+    start = time.perf_counter()
+    READY.clear()
+    _warm_process()
+
+    with _stage('connections'):
+        if executor is None:
+            open_connections()
+        else:
+            # Each task holds its thread until all have started, so the
+            # pool runs them on as many threads
+            barrier = threading.Barrier(threads)
+
+            def open_thread_connections():
+                barrier.wait(THREAD_TIMEOUT)
+                open_connections()
+
+            for future in [
+                    executor.submit(open_thread_connections)
+                    for _ in range(threads)]:
+                future.result()
+
+    READY.set()
+    logger.info(
+        'Ready in %.0f ms (%s)', (time.perf_counter() - start) * 1000,
+        ', '.join(
+            f'{name} {duration * 1000:.0f} ms'
+            for name, duration in timings.items()),
+        extra={
+            f'{name}_ms': round(duration * 1000, 1)
+            for name, duration in timings.items()
+        }
+    )
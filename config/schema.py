@@ -0,0 +1,167 @@
+import hashlib
+import os
+import threading
+from functools import lru_cache
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from api.compression import ENCODINGS, compress, negotiate_encoding
+
+# The OpenAPI schema is generated once per build by `manage.py
+# generate_schema` instead of introspecting every viewset per request.
+# drf_yasg is only imported to generate it or render the docs pages.
+
+# Served formats, by URL suffix
+FORMATS = {
+    '.json': 'application/json',
+    '.yaml': 'application/yaml',
+}
+# File suffixes of the pre-compressed copies
+ENCODING_SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+
+_documents = {}
+_documents_lock = threading.Lock()
+
+
+def get_info():
+    """The API description shown in the schema and the UI."""
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="FitPro API",
+        default_version='v1',
+        description=(
+            "API for FitPro fitness tracking application"
+        ),
+        terms_of_service=(
+            "https://www.google.com/policies/terms/"
+        ),
+        contact=openapi.Contact(email="contact@example.com"),
+        license=openapi.License(name="BSD License"),
+    )
+
+
+def generate_schema():
+    """
+    Introspect the API and render its schema in every served format.
+    Returns the documents by format.
+    """
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    schema = OpenAPISchemaGenerator(get_info()).get_schema(public=True)
+    return {
+        '.json': OpenAPICodecJson(validators=[]).encode(schema),
+        '.yaml': OpenAPICodecYaml(validators=[]).encode(schema),
+    }
+
+
+# Used when the build did not generate the files
+_generate_in_process = lru_cache(maxsize=1)(generate_schema)
+
+
+def write_schema(directory):
+    """
+    Generate the schema into a directory, with a pre-compressed copy of
+    each format for every supported encoding.
+    Returns the paths written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for format, document in generate_schema().items():
+        variants = {'': document}
+        for encoding in ENCODINGS:
+            variants[ENCODING_SUFFIXES[encoding]] = compress(
+                document, encoding, cached=True)
+        for suffix, content in variants.items():
+            path = os.path.join(directory, f'swagger{format}{suffix}')
+            with open(path, 'wb') as f:
+                f.write(content)
+            paths.append(path)
+    return paths
+
+
+def _load(format, encoding):
+    """Read a schema variant from disk, or None if not generated."""
+    suffix = ENCODING_SUFFIXES.get(encoding, '')
+    path = os.path.join(
+        settings.OPENAPI_SCHEMA_DIR, f'swagger{format}{suffix}')
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def get_document(format, encoding=None, generate=True):
+    """
+    A schema format in an encoding, with its strong ETag. Read from the
+    generated files, or generated once per process when they are missing.
+    Args:
+        format: One of FORMATS
+        encoding: One of ENCODINGS, or None
+        generate: Whether to generate a missing document, or return None
+    """
+    key = (format, encoding)
+    document = _documents.get(key)
+    if document is None:
+        with _documents_lock:
+            document = _documents.get(key)
+            if document is None:
+                content = _load(format, encoding)
+                if content is None:
+                    if not generate:
+                        return None
+                    content = _generate_in_process()[format]
+                    if encoding is not None:
+                        content = compress(content, encoding, cached=True)
+                digest = hashlib.sha256(content).hexdigest()[:32]
+                document = _documents[key] = (content, f'"{digest}"')
+    return document
+
+
+def schema_file(request, format):
+    """Serve the schema, honouring If-None-Match."""
+    if format not in FORMATS:
+        raise Http404('Unknown schema format.')
+
+    encoding = negotiate_encoding(
+        request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    content, etag = get_document(format, encoding)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type=FORMATS[format])
+        if encoding is not None:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    # Revalidated on every use, which costs a 304 until the next deploy
+    response['Cache-Control'] = 'public, no-cache'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+_ui_views = {}
+
+
+def schema_ui(request, renderer):
+    """
+    Serve the swagger or redoc page. It loads the spec from schema_file,
+    so rendering it introspects nothing.
+    """
+    view = _ui_views.get(renderer)
+    if view is None:
+        from drf_yasg import openapi
+        from drf_yasg.views import get_schema_view
+        from rest_framework import permissions
+        from rest_framework.response import Response
+
+        class SchemaUIView(get_schema_view(
+                get_info(), public=True,
+                permission_classes=(permissions.AllowAny,))):
+            def get(self, request, version='', format=None):
+                # The pages only show the title and version
+                return Response(openapi.Swagger(
+                    info=get_info(), _prefix='/', paths=openapi.Paths({})))
+
+        view = _ui_views[renderer] = SchemaUIView.with_ui(renderer)
+    return view(request)
@@ -0,0 +1,31 @@
+# Loaded by gunicorn from the working directory (see bin/web)
+import os
+
+# Load the app in the master, which warms it up before binding the port,
+# so workers fork with everything imported and the router only sends
+# traffic once it is warm
+preload_app = True
+
+
+def on_starting(server):
+    """Warm up the preloaded app before listening."""
+    if server.cfg.preload_app:
+        from api import warmup
+        warmup.warm_process()
+
+
+def post_worker_init(worker):
+    """
+    Open each request thread's connections. The worker accepts no
+    request until this returns.
+    """
+    from api import warmup
+    warmup.warm_worker(
+        getattr(worker, 'tpool', None), worker.cfg.threads)
+
+
+def child_exit(server, worker):
+    """Drop an exited worker's samples from the live gauges."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
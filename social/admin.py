@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import WorkoutPost, Like, Comment
+from .models import WorkoutPost, Like, Comment, Notification, Follow
 
 
 @admin.register(WorkoutPost)
@@ -18,3 +18,16 @@ class LikeAdmin(admin.ModelAdmin):
 class CommentAdmin(admin.ModelAdmin):
     list_display = ['user', 'post', 'content', 'created_at', 'updated_at']
     search_fields = ['user__username', 'post__workout__title']
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ['recipient', 'actor', 'verb', 'post', 'created_at']
+    list_filter = ['verb']
+    search_fields = ['recipient__username', 'actor__username']
+
+
+@admin.register(Follow)
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ['follower', 'following', 'created_at']
+    search_fields = ['follower__username', 'following__username']
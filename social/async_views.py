@@ -0,0 +1,28 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from api.async_utils import acache_response, apaginate, async_read_view
+from .serializers import WorkoutPostSerializer
+from .views import (
+    WorkoutPostViewSet, get_feed_dependencies, get_feed_queryset,
+    get_feed_tags
+)
+
+
+@async_read_view(
+    WorkoutPostViewSet.as_view({'get': 'list', 'post': 'create'}))
+@acache_response(
+    settings.FEED_CACHE_TTL, 'feed', tags=get_feed_tags,
+    depends_on=get_feed_dependencies)
+async def feed_list(request):
+    """
+    Async version of WorkoutPostViewSet.list, serving the same cached
+    pages.
+    """
+    posts, page = await apaginate(request, get_feed_queryset())
+
+    # Nested serializer fields may still query, so render off the loop
+    page['results'] = await sync_to_async(
+        lambda: WorkoutPostSerializer(
+            posts, many=True, context={'request': request}).data
+    )()
+    return page
@@ -0,0 +1,54 @@
+from django.contrib.auth.models import User
+
+
+class UserLoader:
+    """
+    Request-scoped identity map of users with their profiles.
+    Serializers prime the ids they are about to render, and the first
+    load fetches every primed user and profile in one query.
+    """
+
+    def __init__(self):
+        self._users = {}
+        self._pending = set()
+
+    def prime(self, user_ids):
+        """Queue user ids to be fetched with the next batch."""
+        self._pending.update(
+            user_id for user_id in user_ids if user_id not in self._users)
+
+    def add(self, user):
+        """Reuse a user whose profile is already loaded."""
+        if User.profile.is_cached(user):
+            self._users.setdefault(user.pk, user)
+            self._pending.discard(user.pk)
+
+    def load(self, user):
+        """
+        Return the user's instance from the map, with its profile loaded,
+        or None if the user no longer exists.
+        """
+        self.add(user)
+        if user.pk not in self._users:
+            self._pending.add(user.pk)
+            self._fetch()
+        return self._users[user.pk]
+
+    def _fetch(self):
+        users = User.objects.select_related('profile').in_bulk(self._pending)
+        for user_id in self._pending:
+            self._users[user_id] = users.get(user_id)
+        self._pending.clear()
+
+
+def get_user_loader(context):
+    """
+    Return the loader shared by every serializer rendering the request,
+    falling back to the serializer context when there is no request.
+    """
+    request = context.get('request')
+    if request is None:
+        return context.setdefault('user_loader', UserLoader())
+    if not hasattr(request, '_user_loader'):
+        request._user_loader = UserLoader()
+    return request._user_loader
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from social.notifications import flush_windows
+
+
+class Command(BaseCommand):
+    help = (
+        'Push the likes and comments coalesced during each debounce '
+        'window that has closed. Run it more often than '
+        'NOTIFICATION_PUSH_DEBOUNCE, e.g. every minute from cron or a '
+        'scheduler.'
+    )
+
+    def handle(self, *args, **options):
+        closed = flush_windows()
+        self.stdout.write(f'Closed {closed} notification windows')
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-19 08:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0003_follow'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created_at'], name='social_noti_created_1bac91_idx'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from api.utils import invalidate_tags
 from workouts.models import Workout
 
 
@@ -49,3 +51,98 @@ class Comment(models.Model):
 
     def __str__(self):
         return f"{self.user.username}'s comment on {self.post}"
+
+
+class Notification(models.Model):
+    """
+    Append-only log of likes and comments on a user's posts.
+    Rows are never updated; they are coalesced into per-post digests
+    when read.
+    """
+    LIKE = 'like'
+    COMMENT = 'comment'
+
+    VERBS = [
+        (LIKE, 'Like'),
+        (COMMENT, 'Comment'),
+    ]
+
+    recipient = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='notifications')
+    actor = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+')
+    post = models.ForeignKey(
+        WorkoutPost, on_delete=models.CASCADE, related_name='notifications')
+    verb = models.CharField(max_length=20, choices=VERBS)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['recipient', 'id']),
+            # Recent events, whose debounce windows may need closing
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.actor.username} {self.verb} on {self.post}"
+
+
+class NotificationCursor(models.Model):
+    """Id of the newest notification a user has read."""
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='notification_cursor')
+    last_read_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} read up to {self.last_read_id}"
+
+
+class Follow(models.Model):
+    follower = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='following')
+    following = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='followers')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('follower', 'following')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.follower.username} follows {self.following.username}"
+
+
+def get_feed_tag(instance):
+    """Tag of the cached feed pages showing an object."""
+    if isinstance(instance, WorkoutPost):
+        return f'post:{instance.pk}'
+    if isinstance(instance, (Like, Comment)):
+        return f'post:{instance.post_id}'
+    if isinstance(instance, Workout):
+        return f'workout:{instance.pk}'
+    return f'profile:{instance.user_id}'
+
+
+def invalidate_feed(sender, instance, created=False, **kwargs):
+    """Signal to expire the cached feed pages showing a changed object."""
+    if sender is WorkoutPost and created:
+        # A new post shifts every page
+        invalidate_tags('feed')
+    else:
+        invalidate_tags(get_feed_tag(instance))
+
+
+def invalidate_feed_pages(sender, **kwargs):
+    """Signal to expire every feed page once a post is removed."""
+    invalidate_tags('feed')
+
+
+for model in (WorkoutPost, Like, Comment, Workout, 'api.UserProfile'):
+    post_save.connect(invalidate_feed, sender=model)
+# Receivers on likes and comments would make deleting a post fetch them
+# all, so the views removing them invalidate the feed themselves
+post_delete.connect(invalidate_feed_pages, sender=WorkoutPost)
+for model in (Workout, 'api.UserProfile'):
+    post_delete.connect(invalidate_feed, sender=model)
@@ -0,0 +1,219 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.dispatch import Signal
+from django.utils import timezone
+from .models import Notification, NotificationCursor
+
+# Sent on the first event for a post and verb, then at most once per
+# debounce window while events keep coming, with the digest accumulated
+# so far. Push providers connect to this signal. Windows are closed by
+# the flush_notifications command, run more often than the debounce.
+digest_ready = Signal()
+
+VERB_TEXT = {
+    Notification.LIKE: 'liked',
+    Notification.COMMENT: 'commented on',
+}
+
+
+def _unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def _push_key(user_id, post_id, verb):
+    return f'notifications:push:{user_id}:{post_id}:{verb}'
+
+
+def _last_read_id(user_id):
+    return NotificationCursor.objects.filter(
+        user_id=user_id
+    ).values_list('last_read_id', flat=True).first() or 0
+
+
+def _build_digest(notification, count):
+    """Build the digest for a post and verb from its latest event."""
+    workout_type = notification.post.workout.get_workout_type_display()
+    who = (
+        notification.actor.username if count == 1
+        else f"{count} people"
+    )
+    return {
+        'post': notification.post_id,
+        'verb': notification.verb,
+        'count': count,
+        'actor': notification.actor,
+        'message': (
+            f"{who} {VERB_TEXT[notification.verb]} "
+            f"your {workout_type.lower()} workout"
+        ),
+        'created_at': notification.created_at,
+    }
+
+
+def _window_ttl():
+    # Outlives the window, so a late flush still finds the pushed id
+    return settings.NOTIFICATION_PUSH_DEBOUNCE * 2
+
+
+def _open_window(key, notification_id):
+    """
+    Open a debounce window unless one is open, storing the id of the
+    event pushed and when
+    """
+    return cache.add(key, [notification_id, time.time()], _window_ttl())
+
+
+def _push(notification):
+    """Send the digest of the unread events of a notification's kind."""
+    count = Notification.objects.filter(
+        recipient_id=notification.recipient_id,
+        post_id=notification.post_id,
+        verb=notification.verb,
+        id__gt=_last_read_id(notification.recipient_id)
+    ).aggregate(count=Count('actor', distinct=True))['count']
+    digest_ready.send(
+        sender=Notification,
+        recipient_id=notification.recipient_id,
+        digest=_build_digest(notification, count)
+    )
+
+
+def _flush(recipient_id, post_id, verb, pushed_id):
+    """
+    Close a debounce window: push the events that arrived during it, which
+    opens the next window, or let the next event push straight away.
+    """
+    latest = Notification.objects.select_related(
+        'actor', 'post__workout'
+    ).filter(
+        recipient_id=recipient_id, post_id=post_id, verb=verb,
+        id__gt=pushed_id
+    ).order_by('-id').first()
+    key = _push_key(recipient_id, post_id, verb)
+    cache.delete(key)
+    if latest is not None and _open_window(key, latest.pk):
+        _push(latest)
+
+
+def flush_windows():
+    """
+    Close the debounce windows that have run their course, and return
+    how many. Windows belong to the posts and verbs with recent events,
+    since a window outlives its event by at most its TTL.
+    """
+    since = timezone.now() - timedelta(seconds=_window_ttl())
+    groups = list(
+        Notification.objects.filter(created_at__gte=since).values(
+            'recipient_id', 'post_id', 'verb').order_by().distinct())
+    keys = {
+        _push_key(group['recipient_id'], group['post_id'], group['verb']):
+            group
+        for group in groups
+    }
+    closes_before = time.time() - settings.NOTIFICATION_PUSH_DEBOUNCE
+    closed = 0
+    for key, window in cache.get_many(list(keys)).items():
+        pushed_id, pushed_at = window
+        if pushed_at <= closes_before:
+            group = keys[key]
+            _flush(
+                group['recipient_id'], group['post_id'], group['verb'],
+                pushed_id)
+            closed += 1
+    return closed
+
+
+def _notify_committed(notification):
+    try:
+        cache.incr(_unread_key(notification.recipient_id))
+    except ValueError:
+        # Not cached yet, the next read counts from the database
+        pass
+
+    # Later events in the window are pushed together when it closes
+    if _open_window(
+            _push_key(
+                notification.recipient_id, notification.post_id,
+                notification.verb),
+            notification.pk):
+        _push(notification)
+
+
+def notify(actor, post, verb):
+    """
+    Record a like or comment for the author of a post.
+    Each event is one append-only insert plus a cached counter increment,
+    once committed. Pushes are debounced per post and verb: the first
+    event is pushed at once, and the events of each following
+    NOTIFICATION_PUSH_DEBOUNCE window are pushed as one coalesced digest
+    once flush_windows closes it.
+    """
+    if actor.pk == post.user_id:
+        return None
+
+    notification = Notification.objects.create(
+        recipient_id=post.user_id,
+        actor=actor,
+        post=post,
+        verb=verb
+    )
+    transaction.on_commit(lambda: _notify_committed(notification))
+    return notification
+
+
+def get_digests(user, limit=20):
+    """
+    Coalesce the user's unread notifications into one digest per post
+    and verb, newest first.
+    """
+    groups = list(
+        Notification.objects.filter(
+            recipient=user,
+            id__gt=_last_read_id(user.pk)
+        ).values('post', 'verb').annotate(
+            count=Count('actor', distinct=True),
+            latest_id=Max('id')
+        ).order_by('-latest_id')[:limit]
+    )
+
+    latest = Notification.objects.select_related(
+        'actor__profile',
+        'post__workout'
+    ).in_bulk([group['latest_id'] for group in groups])
+
+    return [
+        _build_digest(latest[group['latest_id']], group['count'])
+        for group in groups
+    ]
+
+
+def unread_count(user):
+    """Return the number of unread notifications, cached per user."""
+    key = _unread_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(
+            recipient=user,
+            id__gt=_last_read_id(user.pk)
+        ).count()
+        cache.add(key, count, settings.CACHE_TTL)
+    return count
+
+
+def mark_read(user):
+    """Mark every notification the user has received as read."""
+    latest_id = Notification.objects.filter(
+        recipient=user
+    ).aggregate(latest_id=Max('id'))['latest_id'] or 0
+
+    NotificationCursor.objects.update_or_create(
+        user=user,
+        defaults={'last_read_id': latest_id}
+    )
+    # Counted afresh on the next read, as an increment could land
+    # between the update and a write of zero
+    cache.delete(_unread_key(user.pk))
@@ -1,8 +1,31 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from .loaders import get_user_loader
 from .models import WorkoutPost, Comment, Like
 from workouts.serializers import WorkoutSerializer
 
+# Edge length of the profile image variant shown next to posts
+AVATAR_IMAGE_SIZE = 64
+# Number of comments embedded in each post
+LATEST_COMMENTS_COUNT = 3
+
+
+def is_prefetched(obj, relation):
+    """Whether a relation's rows are already in the prefetch cache."""
+    return relation in getattr(obj, '_prefetched_objects_cache', {})
+
+
+class UserPrimingListSerializer(serializers.ListSerializer):
+    """
+    List serializer that queues every user the items will render with
+    the request's user loader, so their profiles load in one query.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        get_user_loader(self.context).prime(self.child.get_user_ids(items))
+        return super().to_representation(items)
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for user data in social interactions."""
@@ -14,8 +37,14 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_profile_image(self, obj):
         """Get the profile image URL if it exists."""
-        if hasattr(obj, 'profile') and obj.profile.profile_image:
-            return str(obj.profile.profile_image)
+        user = get_user_loader(self.context).load(obj)
+        profile = getattr(user, 'profile', None)
+        if profile is None:
+            return None
+        if profile.profile_image_variants:
+            return profile.profile_image_variants.get(str(AVATAR_IMAGE_SIZE))
+        if profile.profile_image:
+            return str(profile.profile_image)
         return None
 
 
@@ -30,6 +59,12 @@ class CommentSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['user', 'post']
+        list_serializer_class = UserPrimingListSerializer
+
+    @staticmethod
+    def get_user_ids(comments):
+        """Authors of the comments."""
+        return [comment.user_id for comment in comments]
 
 
 class WorkoutPostSerializer(serializers.ModelSerializer):
@@ -48,6 +83,17 @@ class WorkoutPostSerializer(serializers.ModelSerializer):
             'updated_at', 'likes_count', 'comments_count',
             'has_liked', 'latest_comments'
         ]
+        list_serializer_class = UserPrimingListSerializer
+
+    @staticmethod
+    def get_user_ids(posts):
+        """Authors and, when prefetched, the commenters of the posts."""
+        for post in posts:
+            yield post.user_id
+            if is_prefetched(post, 'comments'):
+                latest = post.comments.all()[:LATEST_COMMENTS_COUNT]
+                for comment in latest:
+                    yield comment.user_id
 
     def get_likes_count(self, obj):
         return obj.likes.count()
@@ -57,10 +103,29 @@ class WorkoutPostSerializer(serializers.ModelSerializer):
 
     def get_has_liked(self, obj):
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.likes.filter(user=request.user).exists()
-        return False
+        if not (request and request.user.is_authenticated):
+            return False
+        if is_prefetched(obj, 'likes'):
+            return any(
+                like.user_id == request.user.id for like in obj.likes.all())
+        return obj.likes.filter(user=request.user).exists()
 
     def get_latest_comments(self, obj):
-        latest = obj.comments.select_related('user')[:3]
-        return CommentSerializer(latest, many=True).data
+        comments = obj.comments.all()
+        if not is_prefetched(obj, 'comments'):
+            comments = comments.select_related('user')
+        return CommentSerializer(
+            comments[:LATEST_COMMENTS_COUNT],
+            many=True,
+            context=self.context
+        ).data
+
+
+class NotificationDigestSerializer(serializers.Serializer):
+    """Serializer for coalesced like and comment notifications."""
+    post = serializers.IntegerField()
+    verb = serializers.CharField()
+    count = serializers.IntegerField()
+    actor = UserSerializer()
+    message = serializers.CharField()
+    created_at = serializers.DateTimeField()
@@ -1,11 +1,28 @@
+import gzip
+import json
+import time
+from io import StringIO
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.cache import cache
 from django.utils import timezone
+from django.test import AsyncRequestFactory, TransactionTestCase
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase, APIClient
+from rest_framework.throttling import BaseThrottle
 from rest_framework import status
 from django.urls import reverse
 from workouts.models import Workout
-from .models import WorkoutPost, Like, Comment
-from django.db import transaction
+from . import async_views, notifications
+from .models import WorkoutPost, Like, Comment, Notification
+from .notifications import digest_ready
+from .views import WorkoutPostViewSet
+from django.db import DatabaseError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from api.testing import QueryBudgetMixin, create_activity
 
 
 class SocialModelTests(APITestCase):
@@ -159,4 +176,404 @@ class SocialViewTests(APITestCase):
         Like.objects.all().delete()
         WorkoutPost.objects.all().delete()
         Workout.objects.all().delete()
-        User.objects.all().delete()
\ No newline at end of file
+        User.objects.all().delete()
+
+
+class NotificationTests(APITestCase):
+    """Test suite for batched like and comment notifications."""
+
+    def setUp(self):
+        """Set up a post liked by several users."""
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author',
+            password='testpass123'
+        )
+        self.fans = [
+            User.objects.create_user(
+                username=f'fan{i}',
+                password='testpass123'
+            )
+            for i in range(3)
+        ]
+        self.workout = Workout.objects.create(
+            owner=self.author,
+            title="Long Run",
+            workout_type="cardio",
+            duration=60,
+            intensity="moderate",
+            date_logged=timezone.now().date()
+        )
+        self.workout_post = WorkoutPost.objects.create(
+            user=self.author,
+            workout=self.workout
+        )
+        self.pushes = []
+        digest_ready.connect(self._record_push)
+        self.clock = 0
+
+    def tearDown(self):
+        digest_ready.disconnect(self._record_push)
+
+    def _record_push(self, sender, recipient_id, digest, **kwargs):
+        self.pushes.append(digest)
+
+    def _like_as(self, user):
+        self.client.force_authenticate(user=user)
+        url = reverse('social:feed-like', kwargs={'pk': self.workout_post.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url)
+
+    def _close_window(self, elapsed=settings.NOTIFICATION_PUSH_DEBOUNCE):
+        """Run the flush command elapsed seconds after the last one."""
+        self.clock = max(self.clock, time.time()) + elapsed
+        with patch.object(notifications.time, 'time', return_value=self.clock):
+            call_command('flush_notifications', stdout=StringIO())
+
+    def test_likes_are_coalesced_into_one_digest(self):
+        """Test several likes on a post produce a single digest."""
+        for fan in self.fans:
+            self._like_as(fan)
+
+        self.assertEqual(
+            Notification.objects.filter(recipient=self.author).count(), 3)
+        self.client.force_authenticate(user=self.author)
+        response = self.client.get(reverse('social:notifications-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['count'], 3)
+        self.assertEqual(
+            response.data[0]['message'],
+            '3 people liked your cardio workout'
+        )
+
+    def test_pushes_are_debounced_per_post(self):
+        """Test likes in a window are pushed together when it closes."""
+        for fan in self.fans:
+            self._like_as(fan)
+
+        self.assertEqual(len(self.pushes), 1)
+        self.assertEqual(
+            self.pushes[0]['message'], 'fan0 liked your cardio workout')
+
+        # The window is still open
+        self._close_window(elapsed=0)
+        self.assertEqual(len(self.pushes), 1)
+
+        self._close_window()
+        self.assertEqual(len(self.pushes), 2)
+        self.assertEqual(
+            self.pushes[1]['message'], '3 people liked your cardio workout')
+
+        # A quiet window closes without a push, and the next like is
+        # pushed straight away
+        self._close_window()
+        self.assertEqual(len(self.pushes), 2)
+        self._like_as(User.objects.create_user(username='latecomer'))
+        self.assertEqual(len(self.pushes), 3)
+        self.assertEqual(
+            self.pushes[2]['message'], '4 people liked your cardio workout')
+
+    def test_rolled_back_events_are_not_counted(self):
+        """Test a rolled back event leaves the unread count alone."""
+        self.client.force_authenticate(user=self.author)
+        count_url = reverse('social:notifications-unread-count')
+        self.assertEqual(self.client.get(count_url).data['unread_count'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    notifications.notify(
+                        self.fans[0], self.workout_post,
+                        Notification.COMMENT)
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+
+        self.assertEqual(self.client.get(count_url).data['unread_count'], 0)
+        self.assertEqual(self.pushes, [])
+
+    def test_unread_count_and_mark_read(self):
+        """Test the cached unread count follows new events and reads."""
+        self.client.force_authenticate(user=self.author)
+        count_url = reverse('social:notifications-unread-count')
+        self.assertEqual(self.client.get(count_url).data['unread_count'], 0)
+
+        self._like_as(self.fans[0])
+        self.client.force_authenticate(user=self.fans[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('social:feed-comments',
+                        kwargs={'pk': self.workout_post.id}),
+                {'content': 'Nice pace!'},
+                format='json'
+            )
+
+        self.client.force_authenticate(user=self.author)
+        self.assertEqual(self.client.get(count_url).data['unread_count'], 2)
+        self.client.post(reverse('social:notifications-mark-read'))
+        self.assertEqual(self.client.get(count_url).data['unread_count'], 0)
+        response = self.client.get(reverse('social:notifications-list'))
+        self.assertEqual(response.data, [])
+
+    def test_own_activity_is_not_notified(self):
+        """Test liking your own post creates no notification."""
+        self._like_as(self.author)
+        self.assertFalse(Notification.objects.exists())
+
+
+class FeedUserLoaderTests(APITestCase):
+    """Test suite for batching nested users in the feed."""
+
+    def setUp(self):
+        self.viewer = User.objects.create_user(
+            username='viewer',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.viewer)
+
+    def create_posts(self, count):
+        for i in range(count):
+            author = User.objects.create_user(
+                username=f'author{count}_{i}', password='testpass123')
+            workout = Workout.objects.create(
+                owner=author,
+                workout_type='cardio',
+                duration=30,
+                date_logged=timezone.now().date()
+            )
+            post = WorkoutPost.objects.create(user=author, workout=workout)
+            for j in range(2):
+                commenter = User.objects.create_user(
+                    username=f'commenter{count}_{i}_{j}',
+                    password='testpass123'
+                )
+                Comment.objects.create(
+                    user=commenter, post=post, content='Nice')
+
+    def count_profile_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('social:feed-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sum(
+            1 for query in queries if 'api_userprofile' in query['sql'])
+
+    def test_profiles_load_in_one_query(self):
+        self.create_posts(2)
+        self.assertEqual(self.count_profile_queries(), 1)
+        self.create_posts(4)
+        self.assertEqual(self.count_profile_queries(), 1)
+
+    def test_nested_users_render_profile_images(self):
+        self.create_posts(1)
+        response = self.client.get(reverse('social:feed-list'))
+        post = response.data['results'][0]
+        self.assertEqual(len(post['latest_comments']), 2)
+        self.assertIn('profile_image', post['user'])
+        for comment in post['latest_comments']:
+            self.assertIn('profile_image', comment['user'])
+
+
+class FeedCacheTests(APITestCase):
+    """Tests for the pre-compressed feed page cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author', password='testpass123')
+        self.viewer = User.objects.create_user(
+            username='viewer', password='testpass123')
+        workout = Workout.objects.create(
+            owner=self.author, title='Run', workout_type='cardio',
+            duration=30, intensity='moderate',
+            date_logged=timezone.now().date())
+        self.post = WorkoutPost.objects.create(
+            user=self.author, workout=workout)
+        self.client.force_authenticate(user=self.viewer)
+        self.url = reverse('social:feed-list')
+
+    def get_feed(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        return json.loads(gzip.decompress(response.content))
+
+    def toggle_like(self):
+        self.client.post(
+            reverse('social:feed-like', kwargs={'pk': self.post.pk}))
+
+    def test_pages_are_served_compressed_from_cache(self):
+        feed = self.get_feed()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_feed(), feed)
+
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.json(), feed)
+
+    def test_changes_expire_cached_pages(self):
+        self.assertFalse(self.get_feed()['results'][0]['has_liked'])
+        self.toggle_like()
+        self.assertTrue(self.get_feed()['results'][0]['has_liked'])
+        self.toggle_like()
+        self.assertFalse(self.get_feed()['results'][0]['has_liked'])
+
+    def test_unrelated_changes_keep_cached_pages(self):
+        feed = self.get_feed()
+        other = User.objects.create_user(
+            username='other', password='testpass123')
+        Workout.objects.create(
+            owner=other, title='Swim', workout_type='cardio',
+            duration=20, intensity='low',
+            date_logged=timezone.now().date())
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_feed(), feed)
+
+        self.post.workout.save()
+        self.assertNotEqual(self.get_feed(), feed)
+
+    def test_pages_are_cached_per_user(self):
+        self.toggle_like()
+        self.assertTrue(self.get_feed()['results'][0]['has_liked'])
+        self.client.force_authenticate(user=self.author)
+        self.assertFalse(self.get_feed()['results'][0]['has_liked'])
+
+
+class AsyncFeedTests(TransactionTestCase):
+    """The async feed must share the cached pages and the view checks."""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(
+            username='author', password='testpass123')
+        viewer = User.objects.create_user(
+            username='viewer', password='testpass123')
+        self.workout = Workout.objects.create(
+            owner=author, title='Run', workout_type='cardio',
+            duration=30, intensity='moderate',
+            date_logged=timezone.now().date())
+        WorkoutPost.objects.create(user=author, workout=self.workout)
+        self.auth = f'Token {Token.objects.create(user=viewer).key}'
+        self.url = reverse('social:feed-list')
+
+    def get_async_feed(self, **headers):
+        request = AsyncRequestFactory().get(
+            self.url, headers={'Authorization': self.auth, **headers})
+        return async_to_sync(async_views.feed_list)(request)
+
+    def test_pages_are_shared_with_the_sync_view(self):
+        feed = self.client.get(
+            self.url, HTTP_AUTHORIZATION=self.auth,
+            HTTP_ACCEPT_ENCODING='gzip')
+        # Sends no signal, so the cached page is not expired
+        WorkoutPost.objects.bulk_create(
+            [WorkoutPost(user=self.workout.owner, workout=self.workout)])
+
+        response = self.get_async_feed(**{'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response.content, feed.content)
+        self.assertEqual(
+            len(json.loads(gzip.decompress(response.content))['results']),
+            1)
+
+    def test_view_checks_apply(self):
+        class Deny(BaseThrottle):
+            def allow_request(self, request, view):
+                return False
+
+            def wait(self):
+                return 30
+
+        with patch.object(WorkoutPostViewSet, 'throttle_classes', [Deny]):
+            response = self.get_async_feed()
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+
+        self.auth = ''
+        response = self.get_async_feed()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+
+class SocialQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """Query budgets of the social routes, against many rows."""
+
+    query_budgets = {
+        'social:api-root': 0,
+        'social:feed-list': 5,
+        'POST social:feed-list': 6,
+        'social:feed-detail': 5,
+        'DELETE social:feed-detail': 7,
+        'social:feed-like': 6,
+        'GET social:feed-comments': 3,
+        'POST social:feed-comments': 5,
+        'social:comments-list': 3,
+        'social:comments-detail': 2,
+        'PATCH social:comments-detail': 4,
+        'DELETE social:comments-detail': 3,
+        'social:notifications-list': 3,
+        'social:notifications-unread-count': 2,
+        'social:notifications-mark-read': 3,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user(
+            username='viewer', password='testpass123')
+        cls.friends = create_activity(cls.viewer)
+        cls.post = WorkoutPost.objects.get(user=cls.viewer)
+        cls.friend_post = WorkoutPost.objects.get(user=cls.friends[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.viewer)
+
+    def test_every_route_has_a_budget(self):
+        self.assertRoutesBudgeted('social')
+
+    def test_feed(self):
+        url = reverse('social:feed-list')
+        response = self.assertQueryBudget('GET', url)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertTrue(response.data['results'][0]['has_liked'])
+        self.assertQueryBudget('GET', f'{url}?page=2')
+        self.assertQueryBudget('GET', reverse('social:api-root'))
+
+    def test_post(self):
+        url = reverse('social:feed-detail', args=[self.post.pk])
+        self.assertQueryBudget('GET', url)
+        workout = self.viewer.workouts.last()
+        self.assertQueryBudget(
+            'POST', reverse('social:feed-list'), {'workout_id': workout.pk})
+        self.assertQueryBudget('DELETE', url)
+
+    def test_like_and_comment(self):
+        like_url = reverse('social:feed-like', args=[self.friend_post.pk])
+        self.assertQueryBudget('POST', like_url)
+        self.assertQueryBudget('POST', like_url)
+        comments_url = reverse(
+            'social:feed-comments', args=[self.friend_post.pk])
+        response = self.assertQueryBudget('GET', comments_url)
+        self.assertEqual(len(response.data), 13)
+        self.assertQueryBudget('POST', comments_url, {'content': 'Again'})
+
+    def test_comments(self):
+        response = self.assertQueryBudget(
+            'GET', reverse('social:comments-list'))
+        self.assertEqual(response.data['count'], 13)
+        comment = Comment.objects.filter(user=self.viewer).first()
+        detail = reverse('social:comments-detail', args=[comment.pk])
+        self.assertQueryBudget('GET', detail)
+        self.assertQueryBudget('PATCH', detail, {'content': 'Hello'})
+        self.assertQueryBudget('DELETE', detail)
+
+    def test_notifications(self):
+        response = self.assertQueryBudget(
+            'GET', reverse('social:notifications-list'))
+        self.assertEqual(len(response.data), 2)
+        self.assertQueryBudget(
+            'GET', reverse('social:notifications-unread-count'))
+        self.assertQueryBudget(
+            'POST', reverse('social:notifications-mark-read'))
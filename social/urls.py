@@ -1,17 +1,31 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import WorkoutPostViewSet, CommentViewSet
+from .views import WorkoutPostViewSet, CommentViewSet, NotificationViewSet
 
 app_name = 'social'
 
 router = DefaultRouter()
 router.register(r'feed', WorkoutPostViewSet, basename='feed')
 router.register(r'comments', CommentViewSet, basename='comments')
+router.register(
+    r'notifications', NotificationViewSet, basename='notifications')
 
 urlpatterns = [
     path('feed/<int:pk>/like/', WorkoutPostViewSet.as_view(
         {'post': 'like'}), name='feed-like'),
     path('feed/<int:pk>/comments/', WorkoutPostViewSet.as_view({
-        'post': 'comments'}), name='feed-comments'),
+        'get': 'comments', 'post': 'comments'}), name='feed-comments'),
+]
+
+if settings.ASGI_MODE:
+    from . import async_views
+
+    # Shadow the feed list with its async version, under the same name
+    urlpatterns += [
+        path('feed/', async_views.feed_list, name='feed-list'),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
 ]
@@ -1,16 +1,54 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from .models import WorkoutPost, Like, Comment
-from .serializers import WorkoutPostSerializer, CommentSerializer
+from django.db.models import Prefetch
+from . import notifications
+from .models import WorkoutPost, Like, Comment, Notification, get_feed_tag
+from .serializers import (
+    WorkoutPostSerializer, CommentSerializer, NotificationDigestSerializer
+)
+from api.utils import cache_response, invalidate_tags
 from workouts.models import Workout
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def get_feed_queryset():
+    """Return the workout post queryset used to render the feed."""
+    return WorkoutPost.objects.select_related(
+        'user',
+        'workout__owner'
+    ).prefetch_related(
+        'likes',
+        Prefetch('comments', Comment.objects.select_related('user'))
+    ).order_by('-created_at')
+
+
+def get_feed_tags(request):
+    """Tag expiring every cached feed page, when posts are added or removed."""
+    return ['feed']
+
+
+def get_feed_dependencies(data):
+    """
+    Tags of what a feed page shows, so a like, comment, workout or
+    profile change only expires the pages showing it.
+    """
+    tags = set()
+    for post in data['results']:
+        tags.add(f"post:{post['id']}")
+        tags.add(f"workout:{post['workout']['id']}")
+        for user in (
+                post['user'],
+                *(comment['user'] for comment in post['latest_comments'])):
+            tags.add(f"profile:{user['id']}")
+    return sorted(tags)
+
+
 class WorkoutPostViewSet(viewsets.ModelViewSet):
     """ViewSet for managing workout posts and their interactions."""
     serializer_class = WorkoutPostSerializer
@@ -18,14 +56,21 @@ class WorkoutPostViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Return optimized queryset for workout posts."""
-        return WorkoutPost.objects.select_related(
-            'user',
-            'workout'
-        ).prefetch_related(
-            'likes',
-            'comments',
-            'comments__user'
-        ).order_by('-created_at')
+        if self.action in ('like', 'comments'):
+            # These render no post, so skip the feed prefetches
+            return WorkoutPost.objects.select_related('workout')
+        return get_feed_queryset()
+
+    @cache_response(
+        settings.FEED_CACHE_TTL, 'feed', tags=get_feed_tags,
+        depends_on=get_feed_dependencies)
+    def list(self, request):
+        """
+        List the feed. Pages are cached per user, already compressed,
+        until a post is added or removed, or a like, comment, workout or
+        profile they show changes.
+        """
+        return super().list(request)
 
     @transaction.atomic
     def create(self, request):
@@ -38,8 +83,9 @@ class WorkoutPostViewSet(viewsets.ModelViewSet):
             )
 
         try:
-            workout = get_object_or_404(Workout, id=workout_id)
-            if workout.owner != request.user:
+            workout = get_object_or_404(
+                Workout.objects.select_related('owner'), id=workout_id)
+            if workout.owner_id != request.user.id:
                 return Response(
                     {'error': 'Permission denied'},
                     status=status.HTTP_403_FORBIDDEN
@@ -71,8 +117,10 @@ class WorkoutPostViewSet(viewsets.ModelViewSet):
 
             if not created:
                 like.delete()
+                invalidate_tags(get_feed_tag(like))
                 return Response({'status': 'unliked'})
 
+            notifications.notify(request.user, post, Notification.LIKE)
             return Response({'status': 'liked'})
 
         except Exception as e:
@@ -89,15 +137,19 @@ class WorkoutPostViewSet(viewsets.ModelViewSet):
 
         if request.method == 'GET':
             comments = post.comments.select_related('user')
-            serializer = CommentSerializer(comments, many=True)
+            serializer = CommentSerializer(
+                comments, many=True, context={'request': request})
             return Response(serializer.data)
 
         try:
             with transaction.atomic():
                 serializer = CommentSerializer(
-                    data={'content': request.data.get('content')})
+                    data={'content': request.data.get('content')},
+                    context={'request': request})
                 if serializer.is_valid():
                     serializer.save(user=request.user, post=post)
+                    notifications.notify(
+                        request.user, post, Notification.COMMENT)
                     return Response(
                         serializer.data, status=status.HTTP_201_CREATED)
                 return Response(
@@ -120,6 +172,9 @@ class CommentViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Return comments belonging to the authenticated user."""
+        if getattr(self, 'swagger_fake_view', False):
+            # Introspected by the schema generator, without a user
+            return Comment.objects.none()
         return Comment.objects.select_related(
             'user',
             'post'
@@ -148,3 +203,33 @@ class CommentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         return super().destroy(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        """Delete a comment and expire the feed pages showing it."""
+        instance.delete()
+        invalidate_tags(get_feed_tag(instance))
+
+
+class NotificationViewSet(viewsets.ViewSet):
+    """ViewSet for likes and comments on the user's posts."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        """List unread notifications coalesced per post."""
+        digests = notifications.get_digests(request.user)
+        serializer = NotificationDigestSerializer(
+            digests, many=True, context={'request': request})
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['GET'])
+    def unread_count(self, request):
+        """Get the number of unread notifications."""
+        return Response({
+            'unread_count': notifications.unread_count(request.user)
+        })
+
+    @action(detail=False, methods=['POST'])
+    def mark_read(self, request):
+        """Mark all notifications as read."""
+        notifications.mark_read(request.user)
+        return Response({'unread_count': 0})
@@ -0,0 +1,122 @@
+from datetime import timedelta
+from django.db.models import Avg, Count, Q, Sum
+from django.utils import timezone
+from django.conf import settings
+from api.async_utils import (
+    aget_or_compute, apaginate, async_read_view, gather_queries
+)
+from .models import Workout
+from .serializers import WorkoutSerializer
+from .views import (
+    WorkoutViewSet, get_statistics_key, get_summary_key, summarize_streaks
+)
+
+ORDERING_FIELDS = {
+    'id', 'title', 'workout_type', 'date_logged', 'duration',
+    'intensity', 'created_at', 'updated_at',
+}
+
+
+def _get_ordering(request):
+    """Return the valid ``?ordering=`` terms, like DRF's OrderingFilter."""
+    terms = [
+        term.strip() for term in request.GET.get('ordering', '').split(',')
+    ]
+    return [term for term in terms if term.lstrip('-') in ORDERING_FIELDS]
+
+
+@async_read_view(WorkoutViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def workout_list(request):
+    """Async version of WorkoutViewSet.list."""
+    queryset = Workout.objects.filter(
+        owner=request.user).select_related('owner')
+    ordering = _get_ordering(request)
+    if ordering:
+        queryset = queryset.order_by(*ordering)
+
+    workouts, page = await apaginate(request, queryset)
+    page['results'] = WorkoutSerializer(
+        workouts, many=True, context={'request': request}).data
+    return page
+
+
+@async_read_view(WorkoutViewSet.as_view({'get': 'statistics'}))
+async def workout_statistics(request):
+    """
+    Async version of WorkoutViewSet.statistics.
+    The totals, both breakdowns and the streak dates are independent,
+    so they are fetched concurrently.
+    """
+    queryset = Workout.objects.filter(owner=request.user)
+    today = timezone.now().date()
+    week_start = today - timedelta(days=today.weekday())
+
+    async def compute():
+        totals, workout_types, intensity_distribution, dates = \
+            await gather_queries(
+                lambda: queryset.aggregate(
+                    total_workouts=Count('id'),
+                    total_duration=Sum('duration'),
+                    avg_duration=Avg('duration'),
+                    workouts_this_week=Count(
+                        'id', filter=Q(date_logged__gte=week_start)),
+                ),
+                lambda: list(queryset.values('workout_type').annotate(
+                    count=Count('id'),
+                    total_duration=Sum('duration'),
+                    avg_duration=Avg('duration')
+                )),
+                lambda: list(queryset.values('intensity').annotate(
+                    count=Count('id')
+                )),
+                lambda: list(
+                    queryset.order_by('date_logged')
+                    .values_list('date_logged', flat=True)
+                    .distinct()
+                ),
+            )
+
+        stats = {
+            'total_workouts': totals['total_workouts'],
+            'total_duration': totals['total_duration'] or 0,
+            'avg_duration': round(totals['avg_duration'] or 0, 2),
+            'workouts_this_week': totals['workouts_this_week'],
+            'workout_types': workout_types,
+            'intensity_distribution': intensity_distribution,
+        }
+        stats.update(summarize_streaks(dates))
+        return stats
+
+    return await aget_or_compute(
+        lambda: get_statistics_key(request.user.id, today),
+        compute, settings.CACHE_TTL, settings.CACHE_STALE_TTL)
+
+
+@async_read_view(WorkoutViewSet.as_view({'get': 'summary'}))
+async def workout_summary(request):
+    """Async version of WorkoutViewSet.summary."""
+    queryset = Workout.objects.filter(owner=request.user)
+
+    async def compute():
+        totals, recent_workouts = await gather_queries(
+            lambda: queryset.aggregate(
+                total_workouts=Count('id'),
+                total_duration=Sum('duration'),
+                avg_duration=Avg('duration')
+            ),
+            lambda: list(
+                queryset.select_related('owner').order_by('-date_logged')[:5]
+            ),
+        )
+
+        return {
+            'total_workouts': totals['total_workouts'],
+            'total_duration': totals['total_duration'] or 0,
+            'avg_duration': round(totals['avg_duration'] or 0, 2),
+            'recent_workouts': WorkoutSerializer(
+                recent_workouts, many=True).data
+        }
+
+    return await aget_or_compute(
+        lambda: get_summary_key(request.user.id),
+        compute, settings.CACHE_TTL, settings.CACHE_STALE_TTL)
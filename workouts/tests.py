@@ -1,7 +1,14 @@
+import json
+from datetime import timedelta
+from asgiref.sync import async_to_sync
 from django.contrib.auth.models import User
+from django.test import AsyncRequestFactory, TransactionTestCase
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.urls import reverse
+from api.testing import QueryBudgetMixin, create_activity
+from workouts import async_views
 from workouts.models import Workout
 from django.utils import timezone
 
@@ -132,4 +139,112 @@ class WorkoutTests(APITestCase):
     def tearDown(self):
         """Clean up after tests."""
         User.objects.all().delete()
-        Workout.objects.all().delete()
\ No newline at end of file
+        Workout.objects.all().delete()
+
+
+class AsyncWorkoutViewTests(TransactionTestCase):
+    """The async read views must answer exactly like the viewset."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='owneruser',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.owner)
+        today = timezone.now().date()
+        for days_ago, workout_type in enumerate(
+                ['cardio', 'strength', 'cardio', 'sports']):
+            Workout.objects.create(
+                owner=self.owner,
+                workout_type=workout_type,
+                duration=30 + days_ago,
+                date_logged=today - timedelta(days=days_ago)
+            )
+        self.factory = AsyncRequestFactory()
+        self.headers = {'Authorization': f'Token {self.token.key}'}
+
+    def _compare(self, async_view, url_name):
+        request = self.factory.get(
+            reverse(url_name), headers=self.headers)
+        async_response = async_to_sync(async_view)(request)
+        sync_response = self.client.get(
+            reverse(url_name), headers=self.headers)
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(async_response.content),
+            json.loads(sync_response.content)
+        )
+
+    def test_list_matches_viewset(self):
+        self._compare(async_views.workout_list, 'workouts:workout-list')
+
+    def test_statistics_matches_viewset(self):
+        self._compare(
+            async_views.workout_statistics, 'workouts:workout-statistics')
+
+    def test_summary_matches_viewset(self):
+        self._compare(
+            async_views.workout_summary, 'workouts:workout-summary')
+
+    def test_requires_authentication(self):
+        request = self.factory.get(
+            reverse('workouts:workout-statistics'),
+            headers={'Authorization': 'Token invalid'}
+        )
+        response = async_to_sync(async_views.workout_statistics)(request)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class WorkoutQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """Query budgets of the workout routes, against many rows."""
+
+    query_budgets = {
+        # Shadowed by the workout list, which shares its URL
+        'workouts:api-root': 0,
+        'workouts:workout-list': 2,
+        'POST workouts:workout-list': 1,
+        'workouts:workout-detail': 1,
+        'PUT workouts:workout-detail': 2,
+        'DELETE workouts:workout-detail': 3,
+        'workouts:workout-statistics': 7,
+        'workouts:workout-summary': 3,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='owneruser', password='testpass123')
+        create_activity(cls.owner)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.owner)
+
+    def test_every_route_has_a_budget(self):
+        self.assertRoutesBudgeted('workouts')
+
+    def test_list(self):
+        url = reverse('workouts:workout-list')
+        response = self.assertQueryBudget('GET', url)
+        self.assertEqual(response.data['count'], 12)
+        self.assertQueryBudget('GET', f'{url}?page=2')
+
+    def test_write(self):
+        response = self.assertQueryBudget(
+            'POST', reverse('workouts:workout-list'),
+            {'workout_type': 'cardio', 'duration': 30,
+             'date_logged': timezone.now().date()})
+        url = reverse('workouts:workout-detail', args=[response.data['id']])
+        self.assertQueryBudget('GET', url)
+        self.assertQueryBudget(
+            'PUT', url, {
+                'workout_type': 'sports', 'duration': 45,
+                'date_logged': timezone.now().date()})
+        self.assertQueryBudget('DELETE', url)
+
+    def test_statistics_and_summary(self):
+        response = self.assertQueryBudget(
+            'GET', reverse('workouts:workout-statistics'))
+        self.assertEqual(response.data['total_workouts'], 12)
+        response = self.assertQueryBudget(
+            'GET', reverse('workouts:workout-summary'))
+        self.assertEqual(len(response.data['recent_workouts']), 5)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import WorkoutViewSet
@@ -7,6 +8,23 @@ app_name = 'workouts'
 router = DefaultRouter()
 router.register(r'', WorkoutViewSet, basename='workout')
 
-urlpatterns = [
+urlpatterns = []
+
+if settings.ASGI_MODE:
+    from . import async_views
+
+    # Shadow the hot read endpoints with their async versions, under the
+    # same names so reverse() and per-view metrics are unaffected
+    urlpatterns += [
+        path('', async_views.workout_list, name='workout-list'),
+        path(
+            'statistics/', async_views.workout_statistics,
+            name='workout-statistics'),
+        path(
+            'summary/', async_views.workout_summary,
+            name='workout-summary'),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
 ]
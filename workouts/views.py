@@ -1,12 +1,14 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.conf import settings
 from django.db.models import Sum, Avg, Count
 from django.utils import timezone
 from datetime import timedelta
 from .models import Workout
 from .serializers import WorkoutSerializer
 from config.permissions import IsOwnerOrReadOnly
+from api.utils import get_or_compute, tagged_key
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,9 +29,13 @@ class WorkoutViewSet(viewsets.ModelViewSet):
         Return all workouts for detail views and restricted queryset for
         list views.
         """
+        queryset = Workout.objects.select_related('owner')
+        if getattr(self, 'swagger_fake_view', False):
+            # Introspected by the schema generator, without a user
+            return queryset.none()
         if self.action in ['list', 'create', 'statistics', 'summary']:
-            return Workout.objects.filter(owner=self.request.user)
-        return Workout.objects.all()
+            return queryset.filter(owner=self.request.user)
+        return queryset
 
     def perform_create(self, serializer):
         """
@@ -52,34 +58,11 @@ class WorkoutViewSet(viewsets.ModelViewSet):
         queryset = self.get_queryset()
         try:
             today = timezone.now().date()
-            week_start = today - timedelta(days=today.weekday())
-
-            stats = {
-                'total_workouts': queryset.count(),
-                'total_duration': queryset.aggregate(
-                    Sum('duration')
-                )['duration__sum'] or 0,
-                'avg_duration': round(
-                    queryset.aggregate(
-                        Avg('duration'))['duration__avg'] or 0, 2
-                ),
-                'workouts_this_week': queryset.filter(
-                    date_logged__gte=week_start
-                ).count(),
-                'workout_types': queryset.values('workout_type').annotate(
-                    count=Count('id'),
-                    total_duration=Sum('duration'),
-                    avg_duration=Avg('duration')
-                ),
-                'intensity_distribution': queryset.values(
-                    'intensity').annotate(
-                    count=Count('id')
-                ),
-            }
-
-            streak_data = self._calculate_streaks(queryset)
-            stats.update(streak_data)
-
+            stats = get_or_compute(
+                get_statistics_key(request.user.id, today),
+                lambda: self._compute_statistics(queryset, today),
+                settings.CACHE_TTL, settings.CACHE_STALE_TTL
+            )
             return Response(stats, status=status.HTTP_200_OK)
         except ValueError as ve:
             logger.error(f"Value error during statistics calculation: {ve}")
@@ -103,21 +86,12 @@ class WorkoutViewSet(viewsets.ModelViewSet):
         """
         queryset = self.get_queryset()
         try:
-            total_workouts = queryset.count()
-            stats = queryset.aggregate(
-                total_duration=Sum('duration'),
-                avg_duration=Avg('duration')
+            summary = get_or_compute(
+                get_summary_key(request.user.id),
+                lambda: self._compute_summary(queryset),
+                settings.CACHE_TTL, settings.CACHE_STALE_TTL
             )
-
-            return Response({
-                'total_workouts': total_workouts,
-                'total_duration': stats['total_duration'] or 0,
-                'avg_duration': round(stats['avg_duration'] or 0, 2),
-                'recent_workouts': WorkoutSerializer(
-                    queryset.order_by('-date_logged')[:5],
-                    many=True
-                ).data
-            }, status=status.HTTP_200_OK)
+            return Response(summary, status=status.HTTP_200_OK)
         except Exception as e:
             logger.error(f"Error getting summary: {str(e)}")
             return Response(
@@ -125,6 +99,60 @@ class WorkoutViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def _compute_statistics(self, queryset, today):
+        """
+        Aggregate the statistics of a queryset of workouts.
+
+        Args:
+            queryset: QuerySet of the user's workouts
+            today: Date the current streak and week are counted to
+
+        Returns:
+            dict: Totals, per type and intensity breakdowns and streaks.
+        """
+        week_start = today - timedelta(days=today.weekday())
+        stats = {
+            'total_workouts': queryset.count(),
+            'total_duration': queryset.aggregate(
+                Sum('duration')
+            )['duration__sum'] or 0,
+            'avg_duration': round(
+                queryset.aggregate(
+                    Avg('duration'))['duration__avg'] or 0, 2
+            ),
+            'workouts_this_week': queryset.filter(
+                date_logged__gte=week_start
+            ).count(),
+            'workout_types': list(queryset.values('workout_type').annotate(
+                count=Count('id'),
+                total_duration=Sum('duration'),
+                avg_duration=Avg('duration')
+            )),
+            'intensity_distribution': list(queryset.values(
+                'intensity').annotate(
+                count=Count('id')
+            )),
+        }
+        stats.update(self._calculate_streaks(queryset))
+        return stats
+
+    def _compute_summary(self, queryset):
+        """Totals and the five most recent workouts of a queryset."""
+        total_workouts = queryset.count()
+        stats = queryset.aggregate(
+            total_duration=Sum('duration'),
+            avg_duration=Avg('duration')
+        )
+        return {
+            'total_workouts': total_workouts,
+            'total_duration': stats['total_duration'] or 0,
+            'avg_duration': round(stats['avg_duration'] or 0, 2),
+            'recent_workouts': WorkoutSerializer(
+                queryset.order_by('-date_logged')[:5],
+                many=True
+            ).data
+        }
+
     def _calculate_streaks(self, queryset):
         """
         Calculate workout streaks (current and longest).
@@ -142,37 +170,61 @@ class WorkoutViewSet(viewsets.ModelViewSet):
             .values_list('date_logged', flat=True)
             .distinct()
         )
+        return summarize_streaks(dates)
 
-        if not dates:
-            return {
-                'current_streak': 0,
-                'longest_streak': 0,
-                'first_workout': None,
-                'last_workout': None,
-                'total_active_days': 0
-            }
 
-        current_streak = 1
-        longest_streak = 1
-        current_count = 1
+def get_statistics_key(user_id, today):
+    """Cache key for a user's statistics, versioned by workout changes."""
+    return tagged_key(
+        f'workout_statistics:{user_id}:{today.isoformat()}', f'user:{user_id}')
 
-        for i in range(len(dates) - 1):
-            if (dates[i + 1] - dates[i]).days == 1:
-                current_count += 1
-                current_streak = max(current_streak, current_count)
-            else:
-                longest_streak = max(longest_streak, current_count)
-                current_count = 1
 
-        longest_streak = max(longest_streak, current_count)
+def get_summary_key(user_id):
+    """Cache key for a user's summary, versioned by workout changes."""
+    return tagged_key(f'workout_summary:{user_id}', f'user:{user_id}')
 
-        if (timezone.now().date() - dates[-1]).days > 1:
-            current_streak = 0
 
+def summarize_streaks(dates):
+    """
+    Summarize streaks from distinct workout dates in ascending order.
+
+    Args:
+        dates: Sorted list of distinct dates with logged workouts
+
+    Returns:
+        dict: Contains current_streak, longest_streak, and other
+        streak-related data.
+    """
+    if not dates:
         return {
-            'current_streak': current_streak,
-            'longest_streak': longest_streak,
-            'first_workout': dates[0].isoformat(),
-            'last_workout': dates[-1].isoformat(),
-            'total_active_days': len(dates)
+            'current_streak': 0,
+            'longest_streak': 0,
+            'first_workout': None,
+            'last_workout': None,
+            'total_active_days': 0
         }
+
+    current_streak = 1
+    longest_streak = 1
+    current_count = 1
+
+    for i in range(len(dates) - 1):
+        if (dates[i + 1] - dates[i]).days == 1:
+            current_count += 1
+            current_streak = max(current_streak, current_count)
+        else:
+            longest_streak = max(longest_streak, current_count)
+            current_count = 1
+
+    longest_streak = max(longest_streak, current_count)
+
+    if (timezone.now().date() - dates[-1]).days > 1:
+        current_streak = 0
+
+    return {
+        'current_streak': current_streak,
+        'longest_streak': longest_streak,
+        'first_workout': dates[0].isoformat(),
+        'last_workout': dates[-1].isoformat(),
+        'total_active_days': len(dates)
+    }